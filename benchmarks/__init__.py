@@ -0,0 +1,5 @@
+"""
+benchmarks
+Synthetic data generators and timing harnesses for the Ideal Function Assignment pipeline.
+Run from the repository root, e.g. `python -m benchmarks.bench_pipeline --help`.
+"""
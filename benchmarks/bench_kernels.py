@@ -0,0 +1,118 @@
+"""
+bench_kernels.py
+Benchmark of the assignment decision: the vectorized engine (all deviations, then a mask)
+against the fused first-hit kernels of src/kernels.py, on a synthetic grid with many matched
+functions. Every kernel is checked against the vectorized result before it is timed:
+
+    python -m benchmarks.bench_kernels --grid-points 2000 --functions 64 --test-points 2000000
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from src.kernels import numba_available
+from src.test_assigner import AssignmentGrid
+
+
+def make_grid(grid_points, functions, test_points, hit_rate=0.8, seed=0):
+    """
+    Returns (grid, x, y): a grid with `functions` matched functions and test points on it.
+    hit_rate of the points lie within tolerance of a randomly chosen function (so first hits
+    are spread over all functions); the rest lie far away from every function.
+    """
+    rng = np.random.default_rng(seed)
+    grid_x = np.linspace(-20.0, 20.0, grid_points)
+    candidate_y = rng.normal(scale=10.0, size=(grid_points, functions))
+    tolerance = np.abs(rng.normal(scale=0.5, size=(grid_points, functions))) + 0.1
+    grid = AssignmentGrid(grid_x, candidate_y, tolerance, [f'y{i + 1}' for i in range(functions)])
+
+    pos = rng.integers(0, grid_points, test_points)
+    target = rng.integers(0, functions, test_points)
+    y = candidate_y[pos, target] + rng.uniform(-0.1, 0.1, test_points)
+    misses = rng.random(test_points) >= hit_rate
+    y[misses] = 1e6
+    return grid, grid_x[pos], y
+
+
+def _time(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def run_benchmark(grid_points=2000, functions=64, test_points=1000000, hit_rate=0.8, seed=0, repeat=3):
+    """
+    Times the vectorized assignment and each available fused kernel on the same input.
+    Returns a JSON-serialisable dict; a kernel whose results differ raises AssertionError.
+    """
+    grid, x, y = make_grid(grid_points, functions, test_points, hit_rate, seed)
+    kernels = [None, 'numpy'] + (['numba'] if numba_available() else [])
+    expected, records = None, []
+    for kernel in kernels:
+        grid.kernel = kernel
+        if kernel == 'numba':
+            grid.assign(x[:10], y[:10])  # compile outside the timing
+        result, seconds = _time(lambda: grid.assign(x, y), repeat)
+        if expected is None:
+            expected = result
+        elif not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+            raise AssertionError(f"Kernel '{kernel}' disagrees with the vectorized engine")
+        records.append({
+            'kernel': kernel or 'vectorized',
+            'seconds': seconds,
+            'points_per_second': test_points / seconds if seconds > 0 else None,
+            'speedup': records[0]['seconds'] / seconds if records and seconds > 0 else 1.0,
+        })
+    return {
+        'config': {'grid_points': grid_points, 'functions': functions, 'test_points': test_points,
+                   'hit_rate': hit_rate, 'seed': seed, 'repeat': repeat},
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'numba': numba_available(), 'platform': platform.platform()},
+        'matched_points': int(len(expected[0])),
+        'kernels': records,
+    }
+
+
+def print_report(result):
+    print(f"Kernel benchmark config: {result['config']}")
+    for record in result['kernels']:
+        print(f"  {record['kernel']:<10} {record['seconds']:10.4f} s  "
+              f"{record['points_per_second']:14,.0f} points/s  {record['speedup']:6.2f}x")
+    if not result['environment']['numba']:
+        print("  numba is not installed; only the NumPy fallback was timed")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fused first-hit assignment kernels.")
+    parser.add_argument('--grid-points', type=int, default=2000, help="x grid size")
+    parser.add_argument('--functions', type=int, default=64, help="number of matched functions")
+    parser.add_argument('--test-points', type=int, default=1000000, help="number of test points")
+    parser.add_argument('--hit-rate', type=float, default=0.8, help="share of points within tolerance")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per kernel; the fastest is kept")
+    parser.add_argument('-o', '--output', help="write the result JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(grid_points=args.grid_points, functions=args.functions, test_points=args.test_points,
+                           hit_rate=args.hit_rate, seed=args.seed, repeat=args.repeat)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
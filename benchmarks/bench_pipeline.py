@@ -0,0 +1,196 @@
+"""
+bench_pipeline.py
+Benchmark harness for the load -> match -> assign -> persist pipeline on synthetic data.
+Each stage is timed separately and reports wall time, throughput and peak traced memory; the
+timing and the memory tracing are done in separate runs of the stage, so tracemalloc's
+overhead never shows up in the timings.
+Results are saved as JSON so runs can be compared and regressions caught:
+
+    python -m benchmarks.bench_pipeline --rows 2000 --candidates 500 --test-points 200000 -o new.json
+    python -m benchmarks.bench_pipeline ... -o new.json --compare baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_datasets
+from src.data_loader import load_csv
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+from src.database_writer import DatabaseWriter
+
+# A stage counts as a regression when it is this much slower than the baseline.
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+
+def measure(name, func, items):
+    """
+    Runs func twice and returns (result of the first run, stage record).
+    The first run is timed with tracemalloc off; peak memory is what tracemalloc sees during
+    the second run (NumPy buffers included), so func must be repeatable.
+    `items` is the number of rows/points the stage processes, used for throughput.
+    """
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {
+        'stage': name,
+        'seconds': seconds,
+        'items': items,
+        'items_per_second': items / seconds if seconds > 0 else None,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_benchmark(rows=400, candidates=50, test_points=100, noise=0.3, seed=0, repeat=1,
+                  matcher_mode='loop', engine='vectorized', workdir=None):
+    """
+    Generates synthetic data and times every pipeline stage `repeat` times.
+    Returns a JSON-serialisable dict with the configuration, environment and the best
+    (fastest) measurement of each stage.
+    """
+    config = {
+        'rows': rows, 'candidates': candidates, 'test_points': test_points, 'noise': noise,
+        'seed': seed, 'repeat': repeat, 'matcher_mode': matcher_mode, 'engine': engine,
+    }
+    with tempfile.TemporaryDirectory(prefix='ideal_bench_', dir=workdir) as directory:
+        paths, planted = write_datasets(directory, n_rows=rows, n_candidates=candidates,
+                                        n_test=test_points, noise=noise, seed=seed)
+        best = {}
+        for run in range(repeat):
+            records = []
+            (train, ideal, test), record = measure(
+                'load', lambda: tuple(load_csv(paths[name]) for name in ('train', 'ideal', 'test')),
+                rows + test_points)
+            records.append(record)
+
+            matches, record = measure(
+                'match', lambda: FunctionMatcher(train, ideal, mode=matcher_mode).best_ideal_matches(),
+                len(planted) * candidates)
+            records.append(record)
+
+            assigner = TestAssigner(test, ideal, matches, train, engine=engine)
+            matched, record = measure('assign', assigner.assign, test_points)
+            records.append(record)
+
+            # Both runs of the stage write into a fresh database.
+            db_paths = (os.path.join(directory, f'bench_{run}_{i}.db') for i in itertools.count())
+            _, record = measure('persist', lambda: _persist(next(db_paths), train, ideal, matched),
+                                len(train) + len(ideal) + len(matched))
+            records.append(record)
+
+            for record in records:
+                if record['stage'] not in best or record['seconds'] < best[record['stage']]['seconds']:
+                    best[record['stage']] = record
+
+    recovered = sum(match['ideal_col'] == planted[match['train_col']] for match in matches)
+    return {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+        },
+        'stages': [best[name] for name in ('load', 'match', 'assign', 'persist')],
+        'quality': {
+            'planted_functions_recovered': recovered,
+            'planted_functions': len(planted),
+            'matched_points': len(matched),
+        },
+    }
+
+
+def _persist(db_path, train, ideal, matched):
+    db_writer = DatabaseWriter(db_path=db_path, bulk=True)
+    db_writer.write_training_data(train)
+    db_writer.write_ideal_functions(ideal)
+    db_writer.write_matched_points(matched)
+
+
+def compare_results(current, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compares two benchmark results stage by stage.
+    Returns a list of dicts with the time ratio (current / baseline) and a regression flag.
+    """
+    baseline_stages = {stage['stage']: stage for stage in baseline['stages']}
+    comparison = []
+    for stage in current['stages']:
+        previous = baseline_stages.get(stage['stage'])
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = stage['seconds'] / previous['seconds']
+        comparison.append({
+            'stage': stage['stage'],
+            'baseline_seconds': previous['seconds'],
+            'seconds': stage['seconds'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    return comparison
+
+
+def print_report(result, comparison=None):
+    print(f"Benchmark config: {result['config']}")
+    for stage in result['stages']:
+        rate = stage['items_per_second']
+        print(f"  {stage['stage']:<8} {stage['seconds']:10.4f} s  "
+              f"{rate if rate is not None else float('nan'):14,.0f} items/s  "
+              f"peak {stage['peak_memory_bytes'] / 1024 ** 2:9.1f} MiB")
+    for row in comparison or []:
+        flag = "  REGRESSION" if row['regression'] else ""
+        print(f"  {row['stage']:<8} {row['ratio']:.2f}x baseline{flag}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ideal function pipeline on synthetic data.")
+    parser.add_argument('--rows', type=int, default=400, help="x grid size of training/ideal data")
+    parser.add_argument('--candidates', type=int, default=50, help="number of ideal functions")
+    parser.add_argument('--test-points', type=int, default=100, help="number of test points")
+    parser.add_argument('--noise', type=float, default=0.3, help="std. deviation of the added noise")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per stage; the fastest is kept")
+    parser.add_argument('--matcher-mode', default='loop', choices=FunctionMatcher.MODES)
+    parser.add_argument('--engine', default='vectorized', choices=TestAssigner.ENGINES)
+    parser.add_argument('-o', '--output', help="write the result JSON to this file")
+    parser.add_argument('--compare', help="baseline result JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="relative slowdown that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(rows=args.rows, candidates=args.candidates, test_points=args.test_points,
+                           noise=args.noise, seed=args.seed, repeat=args.repeat,
+                           matcher_mode=args.matcher_mode, engine=args.engine)
+    comparison = None
+    if args.compare:
+        with open(args.compare) as f:
+            comparison = compare_results(result, json.load(f), args.threshold)
+        result['comparison'] = comparison
+    print_report(result, comparison)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 1 if comparison and any(row['regression'] for row in comparison) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+synthetic.py
+Generators for synthetic training, ideal-function and test datasets of any size.
+The datasets have the same layout as data/train.csv, data/ideal.csv and data/test.csv, and the
+training functions are noisy copies of known ("planted") candidate columns, so benchmarks can
+also check that the matcher still recovers the right functions.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def make_ideal_functions(n_rows, n_candidates, rng, x_range=(-20.0, 20.0)):
+    """
+    Builds a candidate catalog: an x grid plus n_candidates columns y1..yN.
+    Each column is a random mix of a sine wave, a line and a parabola.
+    """
+    x = np.round(np.linspace(x_range[0], x_range[1], n_rows), 6)
+    amplitude = rng.uniform(0.5, 10.0, n_candidates)
+    frequency = rng.uniform(0.1, 2.0, n_candidates)
+    phase = rng.uniform(0.0, 2 * np.pi, n_candidates)
+    slope = rng.uniform(-3.0, 3.0, n_candidates)
+    curvature = rng.uniform(-0.2, 0.2, n_candidates)
+    offset = rng.uniform(-20.0, 20.0, n_candidates)
+    values = (amplitude * np.sin(np.outer(x, frequency) + phase)
+              + np.outer(x, slope) + np.outer(x ** 2, curvature) + offset)
+    columns = {'x': x}
+    columns.update({f'y{i + 1}': values[:, i] for i in range(n_candidates)})
+    return pd.DataFrame(columns)
+
+
+def make_datasets(n_rows=400, n_candidates=50, n_test=100, noise=0.3, n_train=4, outlier_fraction=0.2, seed=0):
+    """
+    Generates (training_data, candidate_models, test_data, planted).
+    planted maps each training column to the candidate column it was derived from.
+    Test points lie on the x grid; outlier_fraction of them are pushed far away from
+    every planted function so a realistic share of points stays unassigned.
+    """
+    if n_train > n_candidates:
+        raise ValueError("n_train cannot exceed n_candidates")
+    rng = np.random.default_rng(seed)
+    ideal = make_ideal_functions(n_rows, n_candidates, rng)
+    x = ideal['x'].to_numpy()
+
+    planted_idx = rng.choice(n_candidates, size=n_train, replace=False)
+    planted = {f'y{i + 1}': f'y{j + 1}' for i, j in enumerate(planted_idx)}
+    train = pd.DataFrame({'x': x})
+    for train_col, ideal_col in planted.items():
+        train[train_col] = ideal[ideal_col].to_numpy() + rng.normal(0.0, noise, n_rows)
+
+    rows = rng.integers(0, n_rows, n_test)
+    source = ideal[list(planted.values())].to_numpy()[rows, rng.integers(0, n_train, n_test)]
+    test_y = source + rng.normal(0.0, noise, n_test)
+    outliers = rng.random(n_test) < outlier_fraction
+    test_y[outliers] += rng.choice([-1.0, 1.0], outliers.sum()) * rng.uniform(50.0, 100.0, outliers.sum())
+    test = pd.DataFrame({'x': x[rows], 'y': test_y})
+    return train, ideal, test, planted
+
+
+def write_datasets(directory, **kwargs):
+    """
+    Generates datasets with make_datasets and writes train.csv, ideal.csv and test.csv to directory.
+    Returns the three file paths and the planted mapping.
+    """
+    train, ideal, test, planted = make_datasets(**kwargs)
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f'{name}.csv') for name in ('train', 'ideal', 'test')}
+    train.to_csv(paths['train'], index=False)
+    ideal.to_csv(paths['ideal'], index=False)
+    test.to_csv(paths['test'], index=False)
+    return paths, planted
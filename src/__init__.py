@@ -1,5 +1,34 @@
 """
 __init__.py
 Marks the 'src' directory as a Python package for the Ideal Function Assignment project.
-No imports are required here.
+The main entry points can be imported from the package itself (`from src import FunctionMatcher`);
+each is imported from its module on first access, so importing the package loads nothing else.
 """
+
+import importlib
+
+# Public name -> module that defines it.
+_EXPORTS = {
+    'run_pipeline': 'src.main',
+    'TrainingDataHandler': 'src.data_handler',
+    'IdealFunctionHandler': 'src.data_handler',
+    'TestDataHandler': 'src.data_handler',
+    'DataLoadError': 'src.data_handler',
+    'FunctionMatcher': 'src.function_matcher',
+    'TestAssigner': 'src.test_assigner',
+    'DatabaseWriter': 'src.database_writer',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'src' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
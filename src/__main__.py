@@ -0,0 +1,10 @@
+"""
+__main__.py
+Runs the pipeline command line interface as `python -m src` (same as `python src/main.py`).
+"""
+
+import sys
+
+from src.main import main
+
+sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+batch_runner.py
+Runs one ideal-function catalog against many training/test dataset pairs.
+The catalog is loaded once into a contiguous array, together with what matching needs from it
+(the centred float64 values and norms of every candidate in matrix mode, the candidate index in
+indexed mode), and written to the database once.
+Worker processes inherit it when they are forked instead of re-reading ideal.csv. Each job
+matches its training data, assigns its test data and writes the matched points into the shared
+database under its own run ID; the `runs` table records which datasets a run ID stands for.
+
+    python -m src.batch_runner manifest.csv --ideal data/ideal.csv --db db/batch.db --workers 8
+
+The manifest is a CSV file with `train` and `test` columns and optional `name` and `run_id`
+columns, or a JSON list of objects with the same keys. Relative paths are resolved against the
+manifest's directory.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+if __package__ in (None, ''):
+    # Allow `python src/batch_runner.py` as well as `python -m src.batch_runner` from the repository root.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.candidate_index import index_path_for, load_or_build_index
+from src.compact import as_frame
+from src.data_handler import TrainingDataHandler, IdealFunctionHandler, TestDataHandler, DataLoadError
+from src.data_loader import dataset_fingerprint
+from src.database_writer import IDEAL_FORMATS, DatabaseWriter, generate_run_id
+from src.function_matcher import CandidateMatrix, FunctionMatcher
+from src.test_assigner import TestAssigner
+
+DEFAULT_IDEAL_PATH = "data/ideal.csv"
+DEFAULT_DB_PATH = "db/ideal.db"
+
+# Per-process state set up by _init_worker.
+_worker_state = {}
+
+
+def read_manifest(path):
+    """
+    Returns the jobs of a CSV or JSON manifest as dicts with 'name', 'train', 'test' and
+    'run_id' (generated if not given). Raises ValueError for entries without train or test.
+    """
+    with open(path, newline='') as f:
+        entries = json.load(f) if path.endswith('.json') else list(csv.DictReader(f))
+    return prepare_jobs(entries, base_dir=os.path.dirname(os.path.abspath(path)))
+
+
+def prepare_jobs(entries, base_dir=None):
+    """Validates manifest entries, resolves relative paths against base_dir and fills in names and run IDs."""
+    jobs = []
+    for i, entry in enumerate(entries):
+        if not entry.get('train') or not entry.get('test'):
+            raise ValueError(f"Manifest entry {i + 1} needs 'train' and 'test' paths")
+        paths = {key: entry[key] if base_dir is None else os.path.join(base_dir, entry[key])
+                 for key in ('train', 'test')}
+        jobs.append({
+            'name': entry.get('name') or f"job-{i + 1}",
+            'run_id': entry.get('run_id') or generate_run_id(),
+            **paths,
+        })
+    return jobs
+
+
+class CandidateCatalog:
+    """
+    The candidate models shared by all jobs of a batch: one CompactTable (a single contiguous
+    values array), its content fingerprint and the precomputed matching state: a CandidateMatrix
+    for matcher_mode='matrix', the attached CandidateIndex for 'indexed'. Built once per batch
+    by load().
+    """
+    def __init__(self, candidate_models, fingerprint, index=None, matrix=None):
+        self.candidate_models = candidate_models
+        self.fingerprint = fingerprint
+        self.index = index
+        self.matrix = matrix
+
+    @classmethod
+    def load(cls, ideal_path, matcher_mode='matrix', num_functions=50, dtype=np.float64, index_path=None):
+        """
+        Loads the ideal CSV once; in indexed mode the index is loaded from index_path (default:
+        next to the CSV) or rebuilt there when the catalog changed. Raises DataLoadError.
+        """
+        handler = IdealFunctionHandler(ideal_path, num_functions=num_functions)
+        candidate_models = handler.load_compact(dtype)
+        fingerprint = dataset_fingerprint(candidate_models)
+        index, matrix = None, None
+        if matcher_mode == 'indexed':
+            index = load_or_build_index(index_path or index_path_for(ideal_path), candidate_models,
+                                        fingerprint=fingerprint)
+        elif matcher_mode == 'matrix':
+            matrix = CandidateMatrix(candidate_models)
+        return cls(candidate_models, fingerprint, index, matrix)
+
+
+def run_job(job, catalog, db_path, matcher_mode='matrix', engine='vectorized'):
+    """
+    Matches and assigns one training/test pair against the catalog and writes its matched
+    points and run record under job['run_id']. Returns a result dict; if the job fails (e.g.
+    a dataset cannot be loaded or does not fit the catalog), the dict holds an 'error' message
+    instead of counts, so one bad pair does not stop the batch.
+    """
+    result = {'name': job['name'], 'run_id': job['run_id'], 'train': job['train'], 'test': job['test']}
+    try:
+        result.update(_match_and_write(job, catalog, db_path, matcher_mode, engine))
+    except Exception as e:
+        result['error'] = str(e) if isinstance(e, DataLoadError) else f"{type(e).__name__}: {e}"
+    return result
+
+
+def _match_and_write(job, catalog, db_path, matcher_mode, engine):
+    start = time.perf_counter()
+    train_manager = TrainingDataHandler(job['train'])
+    train_manager.load()
+    test_manager = TestDataHandler(job['test'])
+    test_manager.load()
+    training_data, test_data = train_manager.data, test_manager.data
+
+    matcher = FunctionMatcher(training_data, catalog.candidate_models, mode=matcher_mode, index=catalog.index,
+                              candidate_matrix=catalog.matrix)
+    best_matches = matcher.best_ideal_matches()
+    # The assignment grid takes just the matched columns from the shared catalog.
+    assigner = TestAssigner(test_data, catalog.candidate_models, best_matches, training_data, engine=engine)
+    matched_points = assigner.assign()
+
+    db_writer = DatabaseWriter(db_path=db_path, concurrent=True, run_id=job['run_id'])
+    try:
+        db_writer.write_matched_points(matched_points)
+        db_writer.write_run(train_path=job['train'], test_path=job['test'], best_matches=best_matches,
+                            total_test_points=len(test_data), matched_points=len(matched_points))
+    finally:
+        # Pool workers exit without running atexit hooks, so the queued rows are committed here.
+        db_writer.close()
+    return {
+        'best_matches': best_matches,
+        'total_test_points': len(test_data),
+        'matched_points': len(matched_points),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _init_worker(catalog, db_path, job_options):
+    # With fork the catalog is inherited, not pickled; with spawn it is sent once per worker.
+    _worker_state.update(catalog=catalog, db_path=db_path, job_options=job_options)
+
+
+def _run_pooled_job(job):
+    return run_job(job, _worker_state['catalog'], _worker_state['db_path'], **_worker_state['job_options'])
+
+
+def _report_job(result, report):
+    if 'error' in result:
+        report(f"{result['name']}: FAILED ({result['error']})")
+    else:
+        report(f"{result['name']}: {result['matched_points']}/{result['total_test_points']} test points matched "
+               f"in {result['seconds']:.2f} s (run {result['run_id']})")
+
+
+def run_batch(jobs, ideal_path=DEFAULT_IDEAL_PATH, db_path=DEFAULT_DB_PATH, workers=1, matcher_mode='matrix',
+              engine='vectorized', ideal_format='wide', num_functions=50, candidate_index_path=None, report=print):
+    """
+    Runs all jobs (a manifest path or a list of manifest entries) against one catalog.
+    The catalog is loaded and written to the database once; jobs run in manifest order, on
+    `workers` processes when workers > 1. Returns a dict with the per-job results (in manifest
+    order), the number of failed jobs and the seconds spent loading the catalog and in total.
+    Raises DataLoadError if the catalog cannot be loaded.
+    """
+    if ideal_format not in IDEAL_FORMATS:
+        raise ValueError(f"Unknown ideal format '{ideal_format}', expected one of {IDEAL_FORMATS}")
+    start = time.perf_counter()
+    jobs = read_manifest(jobs) if isinstance(jobs, str) else prepare_jobs(jobs)
+
+    catalog = CandidateCatalog.load(ideal_path, matcher_mode=matcher_mode, num_functions=num_functions,
+                                    index_path=candidate_index_path)
+    # Incremental mode skips the write when the same catalog is already stored.
+    catalog_writer = DatabaseWriter(db_path=db_path, bulk=True, incremental=True)
+    ideal_frame = as_frame(catalog.candidate_models)
+    if ideal_format in ('wide', 'both'):
+        catalog_writer.write_ideal_functions(ideal_frame)
+    if ideal_format in ('long', 'both'):
+        catalog_writer.write_ideal_functions_long(ideal_frame)
+    del ideal_frame
+    # No open connections may be inherited by the forked workers.
+    catalog_writer.engine.dispose()
+    catalog_seconds = time.perf_counter() - start
+    report(f"Catalog {ideal_path}: {len(catalog.candidate_models.columns) - 1} functions loaded "
+           f"in {catalog_seconds:.2f} s; running {len(jobs)} jobs on {max(1, min(workers, len(jobs)))} workers")
+
+    job_options = {'matcher_mode': matcher_mode, 'engine': engine}
+    results = []
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            results.append(run_job(job, catalog, db_path, **job_options))
+            _report_job(results[-1], report)
+    else:
+        with multiprocessing.Pool(min(workers, len(jobs)), initializer=_init_worker,
+                                  initargs=(catalog, db_path, job_options)) as pool:
+            # imap keeps the results in manifest order.
+            for result in pool.imap(_run_pooled_job, jobs):
+                results.append(result)
+                _report_job(result, report)
+
+    return {
+        'jobs': results,
+        'failed': sum('error' in result for result in results),
+        'catalog_seconds': catalog_seconds,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run one ideal function catalog against many training/test pairs.")
+    parser.add_argument('manifest', help="CSV (train,test[,name,run_id]) or JSON manifest of dataset pairs")
+    parser.add_argument('--ideal', default=DEFAULT_IDEAL_PATH, help="ideal functions (candidate models) CSV")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite database shared by all jobs")
+    parser.add_argument('--workers', type=int, default=1, help="jobs run in parallel")
+    parser.add_argument('--matcher-mode', default='matrix', choices=FunctionMatcher.MODES)
+    parser.add_argument('--candidate-index', help="candidate index file for --matcher-mode indexed")
+    parser.add_argument('--engine', default='vectorized', choices=TestAssigner.ENGINES)
+    parser.add_argument('--ideal-format', default='wide', choices=IDEAL_FORMATS,
+                        help="store the catalog wide (one column per function), long or both")
+    parser.add_argument('--num-functions', type=int, default=50,
+                        help="number of functions required in the ideal CSV (0: any)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        summary = run_batch(args.manifest, args.ideal, args.db, workers=args.workers, matcher_mode=args.matcher_mode,
+                            engine=args.engine, ideal_format=args.ideal_format,
+                            num_functions=args.num_functions or None, candidate_index_path=args.candidate_index)
+    except DataLoadError as e:
+        print("Failed to load the ideal functions.")
+        print(e)
+        return 1
+    print(f"{len(summary['jobs']) - summary['failed']} of {len(summary['jobs'])} jobs completed "
+          f"in {summary['seconds']:.2f} s")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
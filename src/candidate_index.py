@@ -0,0 +1,162 @@
+"""
+candidate_index.py
+Pruning index for matching against very large candidate catalogs.
+Every candidate column is summarised by its coordinates in a small orthonormal basis (the
+constant vector, i.e. the mean, plus the leading principal components of the catalog) and the
+norm of what the basis does not capture. For a training column a and candidate b,
+
+    ||a - b||^2 >= ||P'a - P'b||^2 + (||r_a|| - ||r_b||)^2
+
+where P is the basis and r the residuals, so candidates are scored exactly in order of this
+lower bound and the search stops once no remaining bound can beat the best SSE found. The
+result is the same as the exhaustive search, including SSE values and tie-breaking.
+"""
+
+import os
+
+import numpy as np
+
+from src.data_loader import dataset_fingerprint
+from src.function_matcher import _function_columns
+
+# Principal components kept in addition to the constant vector.
+DEFAULT_DIMENSIONS = 8
+# Candidates used to estimate the principal components; the bound holds for any basis.
+PCA_SAMPLE_SIZE = 4096
+# Candidates scored exactly per step of the search.
+SCORE_CHUNK_SIZE = 256
+# Bounds are lowered by this fraction of ||a||^2 + ||b||^2 to absorb floating point rounding.
+BOUND_SLACK = 1e-9
+
+
+def index_path_for(data_path):
+    """Default index location next to the candidate CSV: data/ideal.csv -> data/ideal.index.npz."""
+    return os.path.splitext(data_path)[0] + '.index.npz'
+
+
+class CandidateIndex:
+    """
+    Projection summaries of the candidate columns plus the fingerprint of the data they
+    describe. attach() supplies the candidate values needed for exact scoring.
+    """
+    def __init__(self, columns, basis, projections, residual_norms, squared_norms, fingerprint):
+        self.columns = list(columns)
+        self.basis = basis                    # orthonormal, shape (n_rows, d)
+        self.projections = projections        # candidate coordinates, shape (n_candidates, d)
+        self.residual_norms = residual_norms  # shape (n_candidates,)
+        self.squared_norms = squared_norms    # shape (n_candidates,)
+        self.fingerprint = fingerprint
+        self.values = None
+        self.scored = 0
+
+    @classmethod
+    def build(cls, candidate_models, dimensions=DEFAULT_DIMENSIONS, fingerprint=None):
+        """Builds the index for the function columns of candidate_models (NaN columns are never matched)."""
+        columns = _function_columns(candidate_models)
+        values = candidate_models[columns].to_numpy(dtype=float)
+        n_rows = values.shape[0]
+        finite = np.nonzero(np.isfinite(values).all(axis=0))[0]
+
+        constant = np.full((n_rows, 1), 1.0 / np.sqrt(n_rows)) if n_rows else np.empty((0, 1))
+        sample = finite[np.linspace(0, len(finite) - 1, min(len(finite), PCA_SAMPLE_SIZE)).astype(np.intp)] \
+            if len(finite) else finite
+        centered = values[:, sample] - values[:, sample].mean(axis=0)
+        components = np.linalg.svd(centered, full_matrices=False)[0][:, :dimensions] if len(sample) else \
+            np.empty((n_rows, 0))
+        # QR re-orthonormalises the constant vector together with the components.
+        basis = np.linalg.qr(np.hstack([constant, components]))[0][:, :min(n_rows, 1 + components.shape[1])]
+
+        projections = values.T @ basis
+        squared_norms = np.einsum('ij,ij->j', values, values)
+        residual_norms = np.linalg.norm(values - basis @ projections.T, axis=0)
+        return cls(columns, basis, projections, residual_norms, squared_norms,
+                   fingerprint or dataset_fingerprint(candidate_models))
+
+    def attach(self, candidate_models):
+        """
+        Keeps the candidate values in their own dtype (compact tables stay compact; scored
+        chunks are widened to float64); returns self.
+        """
+        self.values = candidate_models[self.columns].to_numpy()
+        return self
+
+    def lower_bounds(self, train_y):
+        """Returns the (slack-adjusted) SSE lower bound of train_y against every candidate."""
+        train_proj = train_y @ self.basis
+        train_residual = np.linalg.norm(train_y - self.basis @ train_proj)
+        bounds = (np.sum((self.projections - train_proj) ** 2, axis=1)
+                  + (self.residual_norms - train_residual) ** 2)
+        return bounds - BOUND_SLACK * (np.dot(train_y, train_y) + self.squared_norms)
+
+    def query(self, train_y, k=1):
+        """
+        Returns the positions and exact SSEs of the k closest candidates, best first, ties
+        broken by column position. Only candidates whose bound can still reach the k-th best
+        SSE are scored; the number of scored candidates is added to self.scored. Only finite
+        SSEs are returned, so there are fewer than k (none for a train_y with missing values)
+        when fewer candidates have one.
+        """
+        if self.values is None:
+            raise ValueError("Call attach() with the candidate models before querying the index")
+        train_y = np.asarray(train_y, dtype=float)
+        if len(train_y) != self.values.shape[0]:
+            raise ValueError(
+                f"Training data has {len(train_y)} rows but candidate models have {self.values.shape[0]}; "
+                "rows must be aligned on x"
+            )
+        best_idx = np.empty(0, dtype=np.intp)
+        best_sse = np.empty(0)
+        if not np.isfinite(train_y).all():
+            return best_idx, best_sse
+        bounds = self.lower_bounds(train_y)
+        # NaN bounds belong to candidates with missing values; their SSE is never finite.
+        order = np.argsort(bounds, kind='stable')[:np.count_nonzero(~np.isnan(bounds))]
+        kth = np.inf
+        for start in range(0, len(order), SCORE_CHUNK_SIZE):
+            ids = order[start:start + SCORE_CHUNK_SIZE]
+            ids = ids[bounds[ids] <= kth]
+            if len(ids) == 0:
+                break
+            # Contiguous rows summed like the loop mode, so the SSEs are bit-identical.
+            rows = np.ascontiguousarray(self.values[:, ids].T, dtype=float)
+            sse = np.sum((train_y - rows) ** 2, axis=1)
+            self.scored += len(ids)
+            keep = sse < np.inf
+            best_idx = np.concatenate([best_idx, ids[keep]])
+            best_sse = np.concatenate([best_sse, sse[keep]])
+            top = np.lexsort((best_idx, best_sse))[:k]
+            best_idx, best_sse = best_idx[top], best_sse[top]
+            if len(best_sse) == k:
+                kth = best_sse[-1]
+        return best_idx, best_sse
+
+    def save(self, path):
+        """Saves the summaries (not the candidate values) as a compressed .npz file."""
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, columns=np.array(self.columns), basis=self.basis, projections=self.projections,
+                                residual_norms=self.residual_norms, squared_norms=self.squared_norms,
+                                fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls([str(col) for col in data['columns']], data['basis'], data['projections'],
+                       data['residual_norms'], data['squared_norms'], str(data['fingerprint']))
+
+
+def load_or_build_index(path, candidate_models, dimensions=DEFAULT_DIMENSIONS, fingerprint=None):
+    """
+    Returns the index saved at path if it was built from the same candidate data (by content
+    fingerprint); otherwise builds it and saves it there (path may be None to skip saving).
+    Pass fingerprint if dataset_fingerprint(candidate_models) is already known.
+    The returned index is attached to candidate_models.
+    """
+    fingerprint = fingerprint or dataset_fingerprint(candidate_models)
+    if path and os.path.exists(path):
+        index = CandidateIndex.load(path)
+        if index.fingerprint == fingerprint:
+            return index.attach(candidate_models)
+    index = CandidateIndex.build(candidate_models, dimensions, fingerprint=fingerprint)
+    if path:
+        index.save(path)
+    return index.attach(candidate_models)
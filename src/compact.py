@@ -0,0 +1,164 @@
+"""
+compact.py
+Compact in-memory representation of the training, ideal and test datasets.
+A CompactTable keeps the shared x axis as float64 (it is the join key between the tables) and all
+function columns in one contiguous array of a smaller dtype, float32 by default. The matcher and
+assigner accept CompactTables wherever they accept DataFrames; values are widened to float64
+block by block, so sums of squared errors are still accumulated in float64.
+"""
+
+import numpy as np
+
+from src.function_matcher import FunctionMatcher
+from src.lazy_imports import lazy_import
+from src.test_assigner import TestAssigner
+
+pd = lazy_import('pandas')
+
+DEFAULT_COMPACT_DTYPE = np.float32
+
+
+class CompactTable:
+    """
+    An x axis plus function columns stored column-major in a single (n_rows, k) array.
+
+    Indexing follows the DataFrame calls used by the pipeline: table['x'] and table['y3']
+    return 1-D NumPy arrays (views), table[[...]] returns a CompactTable with the listed
+    function columns (and the same x axis), and to_numpy() returns the function values.
+    """
+    def __init__(self, x, values, names):
+        self.x = np.ascontiguousarray(x, dtype=float)
+        # Column-major, so every function is one contiguous run of memory.
+        self.values = np.asfortranarray(values)
+        self.names = list(names)
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        if self.values.shape != (len(self.x), len(self.names)):
+            raise ValueError(f"Values of shape {self.values.shape} do not match {len(self.x)} rows "
+                             f"and {len(self.names)} columns")
+
+    @classmethod
+    def from_frame(cls, df, dtype=DEFAULT_COMPACT_DTYPE):
+        """Converts a DataFrame with an 'x' column; every other column becomes a function column."""
+        names = [col for col in df.columns if col != 'x']
+        values = np.empty((len(df), len(names)), dtype=dtype, order='F')
+        for i, name in enumerate(names):
+            values[:, i] = df[name].to_numpy()
+        return cls(df['x'].to_numpy(dtype=float), values, names)
+
+    @classmethod
+    def read_csv(cls, filepath, dtype=DEFAULT_COMPACT_DTYPE, expected_columns=None):
+        """
+        Reads a CSV straight into the compact dtype (x is always parsed as float64), so the
+        float64 frame is never materialised. Raises ValueError if expected columns are missing.
+        """
+        header = pd.read_csv(filepath, nrows=0).columns
+        if expected_columns:
+            missing = set(expected_columns) - set(header)
+            if missing:
+                raise ValueError(f"Missing columns: {missing}")
+        if 'x' not in header:
+            raise ValueError("Missing columns: {'x'}")
+        dtypes = {col: (np.float64 if col == 'x' else dtype) for col in header}
+        return cls.from_frame(pd.read_csv(filepath, dtype=dtypes), dtype)
+
+    @property
+    def columns(self):
+        return ['x'] + self.names
+
+    @property
+    def shape(self):
+        return len(self.x), len(self.names) + 1
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.values.nbytes
+
+    @property
+    def empty(self):
+        return len(self.x) == 0
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key == 'x':
+                return self.x
+            return self.values[:, self._positions[key]]
+        names = [name for name in key if name != 'x']
+        return CompactTable(self.x, self.values[:, [self._positions[name] for name in names]], names)
+
+    def to_numpy(self, dtype=None):
+        """Returns the function values as an (n_rows, k) array, converted to dtype if given."""
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    def to_frame(self, dtype=float):
+        """Returns a DataFrame with 'x' and the function columns (float64 by default)."""
+        frame = pd.DataFrame(self.values.astype(dtype, copy=False), columns=self.names)
+        frame.insert(0, 'x', self.x)
+        return frame
+
+
+def as_frame(data):
+    """Returns data as a DataFrame, converting CompactTables (for writers and plots)."""
+    return data.to_frame() if isinstance(data, CompactTable) else data
+
+
+def frame_nbytes(data):
+    # Memory held by a DataFrame or CompactTable, excluding Python object overhead.
+    if isinstance(data, CompactTable):
+        return data.nbytes
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def compare_with_float64(training_data, candidate_models, test_data, dtype=DEFAULT_COMPACT_DTYPE,
+                         matcher_mode='loop'):
+    """
+    Runs matching (with the FunctionMatcher mode of the run being compared) and assignment on
+    float64 DataFrames and on their compact copies and reports the memory saved and how far the
+    compact results deviate from the float64 ones.
+    """
+    compact = [CompactTable.from_frame(df, dtype) for df in (training_data, candidate_models, test_data)]
+    full_bytes = sum(frame_nbytes(df) for df in (training_data, candidate_models, test_data))
+    compact_bytes = sum(table.nbytes for table in compact)
+
+    results = []
+    for train, ideal, test in ((training_data, candidate_models, test_data), compact):
+        matches = FunctionMatcher(train, ideal, mode=matcher_mode).best_ideal_matches()
+        grid = TestAssigner(test, ideal, matches, train).grid
+        rows, func_idx, delta = grid.assign(np.asarray(test['x'], dtype=float), np.asarray(test['y'], dtype=float))
+        assigned = np.full(len(test), None, dtype=object)
+        assigned[rows] = np.asarray(grid.ideal_cols, dtype=object)[func_idx]
+        deltas = np.full(len(test), np.nan)
+        deltas[rows] = delta
+        results.append((matches, assigned, deltas))
+
+    (full_matches, full_assigned, full_deltas), (compact_matches, compact_assigned, compact_deltas) = results
+    sse_errors = [abs(c['min_sse'] - f['min_sse']) / max(abs(f['min_sse']), np.finfo(float).tiny)
+                  for f, c in zip(full_matches, compact_matches)]
+    both = ~np.isnan(full_deltas) & ~np.isnan(compact_deltas)
+    return {
+        'dtype': np.dtype(dtype).name,
+        'float64_bytes': full_bytes,
+        'compact_bytes': compact_bytes,
+        'bytes_saved': full_bytes - compact_bytes,
+        'same_matches': [f['ideal_col'] for f in full_matches] == [c['ideal_col'] for c in compact_matches],
+        'max_sse_relative_error': max(sse_errors, default=0.0),
+        'assignment_differences': int(np.count_nonzero(full_assigned != compact_assigned)),
+        'max_delta_y_difference': float(np.max(np.abs(full_deltas[both] - compact_deltas[both]), initial=0.0)),
+    }
+
+
+def print_compact_report(report):
+    """Prints the result of compare_with_float64."""
+    saved = report['bytes_saved'] / report['float64_bytes'] if report['float64_bytes'] else 0.0
+    print(f"Compact mode ({report['dtype']}): {report['compact_bytes'] / 1024 ** 2:.2f} MiB instead of "
+          f"{report['float64_bytes'] / 1024 ** 2:.2f} MiB ({saved:.0%} saved)")
+    print("Same best matches as float64:", report['same_matches'])
+    print(f"Max relative SSE error: {report['max_sse_relative_error']:.3g}")
+    print("Test points assigned differently:", report['assignment_differences'])
+    print(f"Max delta_y difference: {report['max_delta_y_difference']:.3g}")
@@ -4,7 +4,8 @@ Classes for managing training, candidate, and test datasets.
 Each handler loads and validates its respective dataset, raising a custom error if loading fails.
 """
 
-from src.data_loader import load_csv
+from src.data_loader import load_csv, iter_csv_chunks
+from src.compact import DEFAULT_COMPACT_DTYPE, CompactTable
 
 class DataLoadError(Exception):
     """Custom exception for data loading errors to make error handling explicit."""
@@ -14,36 +15,68 @@ class TrainingDataHandler:
     """
     Handles loading and validation of training data.
     Using a class allows for future extension (e.g., preprocessing, feature engineering).
+    Pass cache_dir to keep a memory-mapped binary copy of the CSV between runs.
+    load_compact() loads a float32 (or other dtype) CompactTable instead of a DataFrame.
     """
-    def __init__(self, filepath):
+    def __init__(self, filepath, cache_dir=None):
         self.filepath = filepath
+        self.cache_dir = cache_dir
         self.data = None
 
     def load(self):
         # Load training data and validate expected columns.
         try:
-            self.data = load_csv(self.filepath, expected_columns=['x', 'y1', 'y2', 'y3', 'y4'])
+            self.data = load_csv(self.filepath, expected_columns=['x', 'y1', 'y2', 'y3', 'y4'], cache_dir=self.cache_dir)
         except Exception as e:
             # Raise a custom error for clarity in main workflow.
             raise DataLoadError(f"Training data load failed: {e}")
 
+    def load_compact(self, dtype=DEFAULT_COMPACT_DTYPE):
+        # Load training data as a CompactTable (shared float64 x, functions in dtype).
+        try:
+            self.data = CompactTable.read_csv(self.filepath, dtype, expected_columns=['x', 'y1', 'y2', 'y3', 'y4'])
+        except Exception as e:
+            raise DataLoadError(f"Training data load failed: {e}")
+        return self.data
+
 class IdealFunctionHandler:
     """
     Handles loading and validation of candidate models (ideal functions).
     This class can be extended for model selection or filtering.
+    Pass cache_dir to keep a memory-mapped binary copy of the CSV between runs.
+    num_functions sets how many y1..yN columns are required; with None, any catalog with
+    an 'x' column and at least one function column is accepted.
     """
-    def __init__(self, filepath):
+    def __init__(self, filepath, cache_dir=None, num_functions=50):
         self.filepath = filepath
+        self.cache_dir = cache_dir
+        self.num_functions = num_functions
         self.data = None
 
     def load(self):
         # Load candidate models and validate expected columns.
-        expected_cols = ['x'] + [f'y{i}' for i in range(1, 51)]
         try:
-            self.data = load_csv(self.filepath, expected_columns=expected_cols)
+            self.data = load_csv(self.filepath, expected_columns=self._expected_columns(), cache_dir=self.cache_dir)
+            if len(self.data.columns) < 2:
+                raise ValueError("No function columns found")
         except Exception as e:
             raise DataLoadError(f"Candidate models load failed: {e}")
 
+    def load_compact(self, dtype=DEFAULT_COMPACT_DTYPE):
+        # Load candidate models as a CompactTable (shared float64 x, functions in dtype).
+        try:
+            self.data = CompactTable.read_csv(self.filepath, dtype, expected_columns=self._expected_columns())
+            if len(self.data.columns) < 2:
+                raise ValueError("No function columns found")
+        except Exception as e:
+            raise DataLoadError(f"Candidate models load failed: {e}")
+        return self.data
+
+    def _expected_columns(self):
+        if self.num_functions is None:
+            return ['x']
+        return ['x'] + [f'y{i}' for i in range(1, self.num_functions + 1)]
+
 class TestDataHandler:
     """
     Handles loading and validation of test data.
@@ -58,4 +91,22 @@ class TestDataHandler:
         try:
             self.data = load_csv(self.filepath, expected_columns=['x', 'y'])
         except Exception as e:
-            raise DataLoadError(f"Test data load failed: {e}")
\ No newline at end of file
+            raise DataLoadError(f"Test data load failed: {e}")
+
+    def load_compact(self, dtype=DEFAULT_COMPACT_DTYPE):
+        # Load test data as a CompactTable; test['y'] then holds the values in dtype.
+        try:
+            self.data = CompactTable.read_csv(self.filepath, dtype, expected_columns=['x', 'y'])
+        except Exception as e:
+            raise DataLoadError(f"Test data load failed: {e}")
+        return self.data
+
+    def iter_chunks(self, chunk_size):
+        """
+        Yields the test data in DataFrames of at most chunk_size rows.
+        Used by the streaming pipeline so test feeds larger than RAM can be processed.
+        """
+        try:
+            yield from iter_csv_chunks(self.filepath, chunk_size, expected_columns=['x', 'y'])
+        except Exception as e:
+            raise DataLoadError(f"Test data load failed: {e}")
@@ -4,16 +4,79 @@ Utility functions for loading CSV data with error handling and validation.
 These functions centralize data loading logic for maintainability and reuse.
 """
 
-import pandas as pd  # Pandas is used for data manipulation and analysis.
+import glob
+import hashlib
+import json
+import os
 
-def load_csv(filepath, expected_columns=None):
+import numpy as np
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')  # Pandas is used for data manipulation and analysis.
+
+# Default location of the binary CSV cache (see load_csv).
+DEFAULT_CACHE_DIR = "data/.cache"
+
+def _cache_paths(filepath, cache_dir):
+    """
+    Returns the cache file prefix for a CSV and the .npy/.json paths for its current version.
+    The prefix identifies the source path; mtime and size identify the version, so an edited
+    CSV simply misses the cache.
+    """
+    source = os.path.abspath(filepath)
+    stat = os.stat(source)
+    prefix = os.path.join(cache_dir, hashlib.sha1(source.encode('utf-8')).hexdigest()[:16])
+    stem = f"{prefix}-{stat.st_mtime_ns}-{stat.st_size}"
+    return prefix, stem + ".npy", stem + ".json"
+
+def _read_cached(npy_path, json_path):
+    # Columns are stored one per row of a C-ordered array, so the transposed memory map
+    # becomes a single pandas block without copying.
+    with open(json_path) as f:
+        columns = json.load(f)['columns']
+    # Copy-on-write: edits to the frame stay private to this process and never reach the cache file.
+    values = np.load(npy_path, mmap_mode='c')
+    return pd.DataFrame(values.T, columns=columns, copy=False)
+
+def _write_cache(df, prefix, npy_path, json_path):
+    """
+    Stores a DataFrame in the columnar cache and removes stale versions of the same source.
+    Only frames whose columns share one numeric dtype are cached, so a cached load returns
+    exactly the frame pd.read_csv would.
+    """
+    dtypes = set(df.dtypes)
+    if len(dtypes) != 1 or not np.issubdtype(dtypes.pop(), np.number):
+        return
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    for stale in glob.glob(glob.escape(prefix) + "-*"):
+        os.remove(stale)
+    # Write to temporary names first so a concurrent reader never sees a partial file.
+    tmp_npy, tmp_json = npy_path + ".tmp.npy", json_path + ".tmp"
+    np.save(tmp_npy, np.ascontiguousarray(df.to_numpy().T))
+    with open(tmp_json, 'w') as f:
+        json.dump({'columns': [str(col) for col in df.columns]}, f)
+    os.replace(tmp_npy, npy_path)
+    os.replace(tmp_json, json_path)
+
+def load_csv(filepath, expected_columns=None, cache_dir=None):
     """
     Loads a CSV file and validates columns if provided.
     Returns a pandas DataFrame.
     Raises an error if columns are missing or file cannot be read.
+
+    With cache_dir set, the parsed data is kept as a binary columnar .npy file keyed by the
+    source path, mtime and size. Later loads memory-map that file instead of parsing text.
     """
     try:
-        df = pd.read_csv(filepath)
+        df = None
+        if cache_dir:
+            prefix, npy_path, json_path = _cache_paths(filepath, cache_dir)
+            if os.path.exists(npy_path) and os.path.exists(json_path):
+                df = _read_cached(npy_path, json_path)
+        if df is None:
+            df = pd.read_csv(filepath)
+            if cache_dir:
+                _write_cache(df, prefix, npy_path, json_path)
         if expected_columns:
             missing = set(expected_columns) - set(df.columns)
             if missing:
@@ -24,6 +87,41 @@ def load_csv(filepath, expected_columns=None):
         print(f"Error loading {filepath}: {e}")
         raise
 
+def iter_csv_chunks(filepath, chunk_size, expected_columns=None):
+    """
+    Reads a CSV file lazily in DataFrames of at most chunk_size rows.
+    Memory use is bounded by the chunk size rather than the file size.
+    Columns are validated on the first chunk, like load_csv does for the whole file.
+    """
+    try:
+        reader = pd.read_csv(filepath, chunksize=chunk_size)
+    except Exception as e:
+        print(f"Error loading {filepath}: {e}")
+        raise
+    with reader:
+        for chunk_number, chunk in enumerate(reader):
+            if chunk_number == 0 and expected_columns:
+                missing = set(expected_columns) - set(chunk.columns)
+                if missing:
+                    raise ValueError(f"Missing columns: {missing}")
+            yield chunk
+
+def dataset_fingerprint(df):
+    """
+    Returns a hex digest of a DataFrame's column names, dtypes and values.
+    Two frames with the same content get the same fingerprint regardless of where they came from.
+    CompactTables (compact.py) are accepted too; their float32 values hash differently from float64.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for column in df.columns:
+        values = np.asarray(df[column])
+        digest.update(f"{column}:{values.dtype.str}:{len(values)};".encode('utf-8'))
+        if values.dtype.hasobject:
+            digest.update(json.dumps(values.tolist(), default=str).encode('utf-8'))
+        else:
+            digest.update(values.tobytes(order='C'))
+    return digest.hexdigest()
+
 def preview_data(df, num_rows=5):
     """
     Prints a preview of the DataFrame for quick inspection.
@@ -0,0 +1,79 @@
+"""
+database_reader.py
+Reads ideal functions back from the long-format table written by DatabaseWriter.
+Only the requested functions are fetched, each with one range scan over the (func_id, x)
+primary key, so an assignment run touches the handful of matched functions instead of the
+whole catalog.
+"""
+
+import numpy as np
+
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+class IdealFunctionStore:
+    """
+    Loads selected ideal functions from `ideal_functions_long` into NumPy arrays or a DataFrame.
+    Use the engine of a DatabaseWriter (or any SQLAlchemy engine for the same database file).
+    """
+    TABLE = 'ideal_functions_long'
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def function_ids(self):
+        """Returns the IDs of all stored functions in sorted order."""
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            # DISTINCT over the leading primary key column is answered from the index.
+            cursor.execute(f"SELECT DISTINCT func_id FROM {self.TABLE} ORDER BY func_id")
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            raw_conn.close()
+
+    def load_arrays(self, func_ids):
+        """
+        Returns (x, values) for the requested functions: the sorted x grid, shape (m,), and
+        their y values, shape (m, k), in the order of func_ids. Functions stored on different
+        x values are aligned on the union grid with NaN where a function has no value.
+        Raises ValueError for IDs that are not stored.
+        """
+        func_ids = list(dict.fromkeys(func_ids))
+        series = []
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            for func_id in func_ids:
+                cursor.execute(f"SELECT x, y FROM {self.TABLE} WHERE func_id = ? ORDER BY x", (func_id,))
+                series.append(np.array(cursor.fetchall(), dtype=float).reshape(-1, 2))
+        finally:
+            raw_conn.close()
+        missing = [func_id for func_id, rows in zip(func_ids, series) if len(rows) == 0]
+        if missing:
+            raise ValueError(f"Unknown ideal functions: {missing}")
+        if not series:
+            return np.empty(0), np.empty((0, 0))
+
+        x = series[0][:, 0]
+        if all(np.array_equal(rows[:, 0], x) for rows in series[1:]):
+            # Usual case: one shared grid, so the columns can be stacked directly.
+            return x, np.column_stack([rows[:, 1] for rows in series])
+        x = np.unique(np.concatenate([rows[:, 0] for rows in series]))
+        values = np.full((len(x), len(series)), np.nan)
+        for col, rows in enumerate(series):
+            values[np.searchsorted(x, rows[:, 0]), col] = rows[:, 1]
+        return x, values
+
+    def load_frame(self, func_ids):
+        """
+        Returns the requested functions as an `['x', <func_id>...]` DataFrame, which can be
+        passed to TestAssigner as candidate_models.
+        """
+        func_ids = list(dict.fromkeys(func_ids))
+        x, values = self.load_arrays(func_ids)
+        frame = pd.DataFrame(values, columns=func_ids)
+        frame.insert(0, 'x', x)
+        return frame
@@ -4,21 +4,428 @@ Class for writing training data, candidate models, and matched test points to an
 Handles table creation and data insertion with error handling and debug output.
 """
 
+import atexit
+import json
 import os
-from sqlalchemy import create_engine, Column, Float, String, MetaData, Table
-from sqlalchemy.orm import sessionmaker
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# SQLAlchemy is imported where engines and tables are created, so importing this module (e.g.
+# for IDEAL_FORMATS or generate_run_id) does not load it.
+from src.data_loader import dataset_fingerprint
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# Rows handed to a single executemany call in bulk mode.
+DEFAULT_CHUNK_SIZE = 10000
+
+# Storage layouts for the ideal functions: one column per function, one row per (function, x), or both.
+IDEAL_FORMATS = ('wide', 'long', 'both')
+
+# Concurrent mode: connections kept per database and process, how long SQLite waits for a lock
+# held by another process, and how many rows / seconds the writer thread collects per commit.
+POOL_SIZE = 4
+BUSY_TIMEOUT_SECONDS = 30.0
+BUSY_RETRIES = 10
+DEFAULT_COMMIT_ROWS = 50000
+DEFAULT_COMMIT_DELAY = 0.05
+# First and longest sleep (seconds) between retries of a locked database.
+BUSY_BACKOFF_SECONDS = 0.05
+BUSY_BACKOFF_MAX = 2.0
+
+# Shared per (process, database file); see shared_engine() and BatchedWriter.
+_shared_engines = {}
+_batched_writers = {}
+_shared_lock = threading.Lock()
+# Databases whose schema this process has already created or migrated.
+_initialized_schemas = set()
+
+
+def _database_key(db_path):
+    # The pid keeps forked workers from reusing their parent's connections and threads.
+    return os.getpid(), os.path.abspath(db_path)
+
+
+def generate_run_id():
+    """Returns a new run ID: start time plus a random suffix, e.g. 20240101T120000-1a2b3c4d."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    # WAL lets readers and one writer work concurrently; NORMAL skips the fsync per commit.
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_SECONDS * 1000)}")
+    # Switching a fresh database to WAL can fail at once instead of waiting for the busy timeout
+    # when other processes open it at the same time.
+    _retry_when_busy(lambda: cursor.execute("PRAGMA journal_mode=WAL"))
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def shared_engine(db_path):
+    """
+    Returns the pooled engine shared by all concurrent-mode writers of db_path in this process.
+    At most POOL_SIZE connections are opened; each uses WAL and waits up to
+    BUSY_TIMEOUT_SECONDS for locks held by other processes.
+    """
+    from sqlalchemy import create_engine, event
+
+    key = _database_key(db_path)
+    with _shared_lock:
+        engine = _shared_engines.get(key)
+        if engine is None:
+            engine = create_engine(f"sqlite:///{key[1]}", pool_size=POOL_SIZE, max_overflow=0,
+                                   connect_args={'timeout': BUSY_TIMEOUT_SECONDS, 'check_same_thread': False})
+            event.listen(engine, 'connect', _configure_connection)
+            _shared_engines[key] = engine
+        return engine
+
+
+def create_schema(metadata, engine, attempts=BUSY_RETRIES):
+    """
+    Creates the tables and indexes of metadata that do not exist yet, also when other processes
+    create the same schema at the same time: every statement is CREATE ... IF NOT EXISTS and all
+    of them run in one BEGIN IMMEDIATE transaction, so only one process at a time creates the
+    schema. Also creates indexes added to tables that already existed, which create_all skips.
+    A database that stays locked is retried with exponential backoff, up to `attempts` times.
+    """
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    tables = metadata.sorted_tables
+    statements = [CreateTable(table, if_not_exists=True) for table in tables]
+    statements += [CreateIndex(index, if_not_exists=True) for table in tables for index in table.indexes]
+    statements = [str(statement.compile(dialect=engine.dialect)) for statement in statements]
+
+    def create():
+        raw_conn = engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for statement in statements:
+                cursor.execute(statement)
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+    _retry_when_busy(create, attempts)
+
+
+def _retry_when_busy(operation, attempts=BUSY_RETRIES):
+    """
+    Returns operation(), called again with exponential backoff while it fails because the
+    database is locked, at most `attempts` times.
+    """
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == attempts - 1:
+                raise
+        time.sleep(_backoff_delay(attempt))
+
+
+def _is_busy(error):
+    # SQLite reports a lock held by another connection as "database is locked" (or "busy").
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def _backoff_delay(attempt):
+    # Exponential backoff with jitter, so processes that collided do not retry in lockstep.
+    return min(BUSY_BACKOFF_MAX, BUSY_BACKOFF_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _insert_sql(table, upsert=False):
+    """
+    Builds the INSERT statement for all columns of table. With upsert=True, rows whose primary
+    key exists are updated instead, and only if a value actually changed.
+    """
+    columns = [column.name for column in table.columns]
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})"
+    if upsert:
+        keys = [column.name for column in table.primary_key.columns]
+        values = [col for col in columns if col not in keys]
+        assignments = ", ".join(f"{col} = excluded.{col}" for col in values)
+        changed = " OR ".join(f"{table.name}.{col} IS NOT excluded.{col}" for col in values)
+        sql += f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {assignments} WHERE {changed}"
+    return sql
+
+
+def _row_chunks(df, columns, chunk_size):
+    # Column-backed tuples, chunk_size rows at a time; missing columns are written as NULL.
+    frame = df.reindex(columns=columns)
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size]
+        yield zip(*(chunk[col].to_numpy().tolist() for col in columns))
+
+
+def _delete_absent_rows(cursor, table, keys, chunk_size):
+    """
+    Deletes the rows of table whose primary key is not in keys (a DataFrame of the key columns),
+    on the caller's cursor and transaction. Returns the number of deleted rows.
+    """
+    key_columns = [column.name for column in table.primary_key.columns]
+    cursor.execute("DROP TABLE IF EXISTS temp.incoming_keys")
+    cursor.execute(f"CREATE TEMP TABLE incoming_keys ({', '.join(key_columns)}, "
+                   f"PRIMARY KEY ({', '.join(key_columns)}))")
+    placeholders = ", ".join("?" for _ in key_columns)
+    for rows in _row_chunks(keys, key_columns, chunk_size):
+        cursor.executemany(f"INSERT OR IGNORE INTO temp.incoming_keys VALUES ({placeholders})", rows)
+    match = " AND ".join(f"incoming_keys.{col} = {table.name}.{col}" for col in key_columns)
+    cursor.execute(f"DELETE FROM {table.name} WHERE NOT EXISTS "
+                   f"(SELECT 1 FROM temp.incoming_keys WHERE {match})")
+    deleted = cursor.rowcount
+    cursor.execute("DROP TABLE temp.incoming_keys")
+    return deleted
+
+
+class BatchedWriter:
+    """
+    The single writer thread of a database in concurrent mode.
+    Any number of producers (DatabaseWriter instances, threads) queue DataFrames; the thread
+    combines everything queued within commit_delay seconds, up to commit_rows rows, into one
+    transaction. Time spent waiting for the write lock and commit latencies are recorded and
+    returned by metrics().
+
+    A failed write is reported only to the producers whose rows it lost: each submit() names
+    the list its errors are appended to, and flush() with the same list re-raises (and clears)
+    them. If a combined commit fails, its submissions are retried one per commit, so only the
+    bad one fails; the thread keeps serving later batches.
+    """
+    def __init__(self, engine, chunk_size=DEFAULT_CHUNK_SIZE, commit_rows=DEFAULT_COMMIT_ROWS,
+                 commit_delay=DEFAULT_COMMIT_DELAY):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.commit_rows = commit_rows
+        self.commit_delay = commit_delay
+        self.queue = queue.Queue()
+        # Errors of submissions made without their own failures list; see submit().
+        self.failures = []
+        self.commits = 0
+        self.rows = 0
+        self.submissions = 0
+        self.failed_submissions = 0
+        # Retries of BEGIN IMMEDIATE over all commits, a metric only; each commit has its own limit.
+        self.busy_retries = 0
+        self.lock_waits = []
+        self.commit_latencies = []
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sqlite-batched-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, table, df, upsert=False, failures=None, prune=False):
+        """
+        Queues df for insertion into table and returns the number of queued rows. If the write
+        fails, the error is appended to failures (default: self.failures). Raises an earlier
+        error still pending in failures instead of queueing. With prune=True, df holds the key
+        columns of table, and the rows whose key is not among them are deleted instead.
+        """
+        failures = self.failures if failures is None else failures
+        _raise_pending(failures)
+        self.queue.put((table, df, upsert, prune, failures))
+        return len(df)
+
+    def flush(self, failures=None):
+        """
+        Blocks until everything queued so far is committed; then re-raises and clears the first
+        error pending in failures (default: self.failures), if any.
+        """
+        self.queue.join()
+        _raise_pending(self.failures if failures is None else failures)
+
+    def metrics(self):
+        """Commit and lock statistics (seconds) since the writer was started."""
+        with self._stats_lock:
+            lock_waits = list(self.lock_waits)
+            latencies = list(self.commit_latencies)
+            commits, rows, submissions, retries = self.commits, self.rows, self.submissions, self.busy_retries
+            failed = self.failed_submissions
+
+        def percentile(values, q):
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+        return {
+            'submissions': submissions,
+            'commits': commits,
+            'rows': rows,
+            'busy_retries': retries,
+            'failed_submissions': failed,
+            'lock_wait_total': sum(lock_waits),
+            'lock_wait_max': max(lock_waits, default=0.0),
+            'commit_latency_p50': percentile(latencies, 0.5),
+            'commit_latency_p99': percentile(latencies, 0.99),
+            'commit_latency_max': max(latencies, default=0.0),
+        }
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            rows = len(batch[0][1])
+            deadline = time.monotonic() + self.commit_delay
+            # Group whatever the producers queue within the delay into the same commit.
+            while rows < self.commit_rows:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[1])
+            try:
+                self._commit_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _commit_batch(self, batch):
+        try:
+            self._commit(batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # Nothing was written; one commit per submission finds the ones that fail.
+                for item in batch:
+                    self._commit_batch([item])
+                return
+            # Reported to the producer of the submission by its next submit() or flush().
+            table, df, _, _, failures = batch[0]
+            print(f"Failed to write {len(df)} rows to {table.name} table: {e}")
+            failures.append(e)
+            with self._stats_lock:
+                self.failed_submissions += 1
+
+    def _commit(self, batch):
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            started = time.perf_counter()
+            for attempt in range(BUSY_RETRIES + 1):
+                try:
+                    # Takes the write lock up front; busy_timeout makes SQLite wait for other writers.
+                    cursor.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if not _is_busy(e) or attempt == BUSY_RETRIES:
+                        raise
+                    with self._stats_lock:
+                        self.busy_retries += 1
+                    time.sleep(_backoff_delay(attempt))
+            lock_wait = time.perf_counter() - started
+            started = time.perf_counter()
+            try:
+                written = 0
+                for table, df, upsert, prune, _ in batch:
+                    if prune:
+                        _delete_absent_rows(cursor, table, df, self.chunk_size)
+                        continue
+                    sql = _insert_sql(table, upsert)
+                    for rows in _row_chunks(df, [column.name for column in table.columns], self.chunk_size):
+                        cursor.executemany(sql, rows)
+                    written += len(df)
+                raw_conn.commit()
+            except Exception:
+                raw_conn.rollback()
+                raise
+            commit_latency = time.perf_counter() - started
+        finally:
+            raw_conn.close()
+        with self._stats_lock:
+            self.commits += 1
+            self.rows += written
+            self.submissions += len(batch)
+            self.lock_waits.append(lock_wait)
+            self.commit_latencies.append(commit_latency)
+
+
+def _raise_pending(failures):
+    # Raises the first error in failures; the list is cleared, so each error is raised once.
+    if failures:
+        error = failures[0]
+        del failures[:]
+        raise error
+
+
+def batched_writer(db_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns the BatchedWriter shared by all concurrent-mode writers of db_path in this process."""
+    key = _database_key(db_path)
+    engine = shared_engine(db_path)
+    with _shared_lock:
+        writer = _batched_writers.get(key)
+        if writer is None:
+            writer = _batched_writers[key] = BatchedWriter(engine, chunk_size=chunk_size)
+        return writer
+
+
+@atexit.register
+def _flush_batched_writers():
+    # Rows still queued at interpreter exit are committed instead of dropped.
+    for key, writer in list(_batched_writers.items()):
+        if key[0] == os.getpid():
+            try:
+                writer.flush()
+            except Exception as e:
+                print(f"Failed to write queued rows to {key[1]}: {e}")
 
 class DatabaseWriter:
     """
     Handles writing results to the SQLite database.
     Each method inserts data and prints row counts for debugging.
+
+    With bulk=True, DataFrames are streamed column-wise into SQLite with executemany in
+    chunks of chunk_size rows, inside one transaction, and the inserted row count is taken
+    from the cursor instead of reading the table back. Its connections use WAL with
+    synchronous=NORMAL, which avoids an fsync per commit.
+
+    With incremental=True, repeated runs against the same database are idempotent:
+    training/ideal rows are upserted on x and rows whose key is no longer in the data are
+    deleted, tables whose content fingerprint is unchanged are skipped entirely, and matched
+    points are appended under run_id (generated if not given).
+
+    write_ideal_functions_long() stores the ideal functions normalized as (func_id, x, y) rows,
+    which is not limited to 50 functions and lets readers fetch single functions via the
+    composite primary key (see database_reader.py).
+
+    write_run() records which datasets and matches a run_id stands for in the `runs` table.
+
+    With concurrent=True (implies bulk), for several jobs sharing one database file: all
+    writers of a process share one pooled WAL engine with a busy timeout, training/ideal rows
+    are upserted so identical data never collides, and every write is queued to one
+    BatchedWriter thread that groups rows from all producers into large commits. Call flush()
+    (or close()) before reading the results back; write_metrics() returns lock wait and commit
+    latency statistics.
     """
 
-    def __init__(self, db_path="db/ideal.db"):
+    def __init__(self, db_path="db/ideal.db", bulk=False, chunk_size=DEFAULT_CHUNK_SIZE, incremental=False,
+                 run_id=None, concurrent=False):
+        from sqlalchemy import create_engine, event, Column, Float, Integer, String, Text, MetaData, Table, Index
+
         # Ensure the 'db' directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
         self.db_path = db_path
-        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        self.concurrent = concurrent
+        self.bulk = bulk or concurrent
+        self.chunk_size = chunk_size
+        self.incremental = incremental
+        if incremental and run_id is None:
+            run_id = generate_run_id()
+        self.run_id = run_id
+        if concurrent:
+            self.engine = shared_engine(db_path)
+        else:
+            self.engine = create_engine(f"sqlite:///{self.db_path}")
+            if self.bulk or incremental:
+                # WAL and synchronous=NORMAL are set once per connection, not on every bulk insert.
+                event.listen(self.engine, 'connect', _configure_connection)
         self.metadata = MetaData()
 
         # Define training data table schema
@@ -38,19 +445,57 @@ class DatabaseWriter:
             *(Column(f'y{i}', Float) for i in range(1, 51))
         )
 
-        # Define matched points table schema
+        # Long-format ideal functions; the (func_id, x) key doubles as the per-function index
+        self.ideal_functions_long = Table(
+            'ideal_functions_long', self.metadata,
+            Column('func_id', String, primary_key=True),
+            Column('x', Float, primary_key=True),
+            Column('y', Float)
+        )
+
+        # Define matched points table schema; run_id groups the points of one pipeline run
         self.matched_points = Table(
             'matched_points', self.metadata,
             Column('x', Float),
             Column('y', Float),
             Column('ideal_func', String),
-            Column('delta_y', Float)
+            Column('delta_y', Float),
+            Column('run_id', String),
+            Index('ix_matched_points_run_id_ideal_func', 'run_id', 'ideal_func'),
+            Index('ix_matched_points_x', 'x')
         )
 
-        # Create all tables in the database
-        self.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
-        print("Writing to DB file:", os.path.abspath("db/ideal.db"))
+        # One row per run: the datasets behind a run_id and the matches it used
+        self.runs = Table(
+            'runs', self.metadata,
+            Column('run_id', String, primary_key=True),
+            Column('train_path', String),
+            Column('test_path', String),
+            Column('best_matches', Text),
+            Column('total_test_points', Integer),
+            Column('matched_points', Integer),
+            Column('created_at', Float)
+        )
+
+        # Content fingerprints of the tables written in incremental mode
+        self.table_fingerprints = Table(
+            'table_fingerprints', self.metadata,
+            Column('table_name', String, primary_key=True),
+            Column('fingerprint', String),
+            Column('updated_at', Float)
+        )
+
+        # Create all tables in the database (once per process and database file)
+        schema_key = _database_key(db_path)
+        with _shared_lock:
+            if schema_key not in _initialized_schemas or not os.path.exists(db_path):
+                self._add_missing_columns(self.matched_points)
+                create_schema(self.metadata, self.engine)
+                _initialized_schemas.add(schema_key)
+        self.batched_writer = batched_writer(db_path, chunk_size) if concurrent else None
+        # Errors of this writer's queued rows, raised by its next write or flush().
+        self._write_failures = []
+        print("Writing to DB file:", os.path.abspath(db_path))
 
     def write_training_data(self, train_df):
         """
@@ -60,6 +505,10 @@ class DatabaseWriter:
         if train_df.empty:
             print("Training DataFrame is empty. Nothing to write.")
             return
+        if self.incremental:
+            return self._write_incremental(self.training_data, train_df)
+        if self.bulk:
+            return self._bulk_insert(self.training_data, train_df, upsert=self.concurrent)
         data_to_insert = [
             {
                 'x': row['x'],
@@ -83,6 +532,10 @@ class DatabaseWriter:
         if ideal_df.empty:
             print("Ideal Function DataFrame is empty. Nothing to write.")
             return
+        if self.incremental:
+            return self._write_incremental(self.ideal_functions, ideal_df)
+        if self.bulk:
+            return self._bulk_insert(self.ideal_functions, ideal_df, upsert=self.concurrent)
         data_to_insert = []
         for _, row in ideal_df.iterrows():
             entry = {'x': row['x']}
@@ -95,24 +548,183 @@ class DatabaseWriter:
             result = conn.execute(self.ideal_functions.select())
             print("Rows in ideal_functions table after insert:", len(result.fetchall()))
 
-    def write_matched_points(self, matched_points_df):
+    def write_ideal_functions_long(self, ideal_df):
+        """
+        Inserts candidate models into the long-format table, one row per function and x value.
+        Every column except 'x' is treated as a function; missing (NaN) values are not stored.
+        Returns the number of inserted (or changed, in incremental mode) rows.
+        """
+        if ideal_df.empty:
+            print("Ideal Function DataFrame is empty. Nothing to write.")
+            return
+        # One function at a time, so the long layout never exists in memory as a whole.
+        frames = (
+            ideal_df[['x', col]].rename(columns={col: 'y'}).assign(func_id=col).dropna(subset=['y'])
+            for col in ideal_df.columns if col != 'x'
+        )
+        if self.incremental:
+            return self._write_incremental(self.ideal_functions_long, ideal_df, frames=frames)
+        return self._bulk_insert_frames(self.ideal_functions_long, frames, upsert=self.concurrent)
+
+    def write_matched_points(self, matched_points_df, run_id=None):
         """
         Inserts matched test points into the database.
         Prints the number of rows inserted for verification.
+        Points are tagged with run_id (default: the writer's run_id, if any).
         """
         if matched_points_df.empty:
             print("Matched Points DataFrame is empty. Nothing to write.")
             return
+        run_id = run_id or self.run_id
+        if run_id is not None:
+            matched_points_df = matched_points_df.assign(run_id=run_id)
+        if self.bulk or self.incremental:
+            return self._bulk_insert(self.matched_points, matched_points_df)
         data_to_insert = [
             {
                 'x': row['x'],
                 'y': row['y'],
                 'ideal_func': row['ideal_func'],
-                'delta_y': row['delta_y']
+                'delta_y': row['delta_y'],
+                'run_id': row.get('run_id')
             }
             for _, row in matched_points_df.iterrows()
         ]
         with self.engine.begin() as conn:
             conn.execute(self.matched_points.insert(), data_to_insert)
             result = conn.execute(self.matched_points.select())
-            print("Rows in matched_points table after insert:", len(result.fetchall()))
\ No newline at end of file
+            print("Rows in matched_points table after insert:", len(result.fetchall()))
+
+    def write_run(self, run_id=None, train_path=None, test_path=None, best_matches=None, total_test_points=None,
+                  matched_points=None):
+        """
+        Records a run in the `runs` table (upserted on run_id, default: the writer's run_id), so
+        the matched points of a run_id can be traced back to their datasets and matches.
+        """
+        run_id = run_id or self.run_id
+        if run_id is None:
+            raise ValueError("A run_id is needed to record a run")
+        row = pd.DataFrame([{
+            'run_id': run_id,
+            'train_path': train_path,
+            'test_path': test_path,
+            'best_matches': json.dumps(best_matches, default=float) if best_matches is not None else None,
+            'total_test_points': total_test_points,
+            'matched_points': matched_points,
+            'created_at': time.time(),
+        }])
+        return self._bulk_insert(self.runs, row, upsert=True)
+
+    def flush(self):
+        """Waits until all rows queued in concurrent mode are committed (no-op otherwise)."""
+        if self.batched_writer is not None:
+            self.batched_writer.flush(self._write_failures)
+
+    def close(self):
+        """Flushes queued rows. The shared engine and writer thread stay available to other writers."""
+        self.flush()
+
+    def write_metrics(self):
+        """
+        Lock wait and commit latency statistics of the batched writer (concurrent mode), in
+        seconds and shared by all writers of this database in the process; None otherwise.
+        """
+        return self.batched_writer.metrics() if self.batched_writer is not None else None
+
+    def _add_missing_columns(self, table):
+        """
+        Adds columns introduced after a database was created (e.g. matched_points.run_id),
+        so existing database files keep working with the current schema.
+        """
+        from sqlalchemy import inspect, text
+
+        inspector = inspect(self.engine)
+        if not inspector.has_table(table.name):
+            return
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        with self.engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+    def _write_incremental(self, table, df, frames=None):
+        """
+        Upserts a DataFrame unless its content fingerprint matches the one stored for the table,
+        and deletes the rows whose key is not in it, so the table holds exactly the new data.
+        frames optionally gives the rows to write when they are derived from df (long format).
+        Returns the number of inserted, changed or deleted rows.
+        """
+        fingerprint = dataset_fingerprint(df)
+        with self.engine.connect() as conn:
+            stored = conn.execute(
+                self.table_fingerprints.select().where(self.table_fingerprints.c.table_name == table.name)
+            ).first()
+        if stored is not None and stored.fingerprint == fingerprint:
+            print(f"{table.name} table is unchanged. Nothing to write.")
+            return 0
+        written = self._bulk_insert_frames(table, [df] if frames is None else frames, upsert=True, prune=True)
+        # The fingerprint must never be committed ahead of the rows it describes.
+        self.flush()
+        with self.engine.begin() as conn:
+            conn.execute(self.table_fingerprints.delete().where(self.table_fingerprints.c.table_name == table.name))
+            conn.execute(self.table_fingerprints.insert(),
+                         {'table_name': table.name, 'fingerprint': fingerprint, 'updated_at': time.time()})
+        return written
+
+    def _bulk_insert(self, table, df, upsert=False):
+        """
+        Inserts a DataFrame into a table with executemany on column-backed tuples.
+        Columns missing from the DataFrame are written as NULL, like the row-wise path.
+        With upsert=True, rows whose primary key exists are updated instead, and only if a
+        value actually changed, so unchanged rows cost no writes.
+        Returns the number of inserted (or changed) rows as reported by the cursor.
+        """
+        return self._bulk_insert_frames(table, [df], upsert=upsert)
+
+    @staticmethod
+    def _concat_keys(keys, key_columns):
+        return pd.concat(keys, ignore_index=True) if keys else pd.DataFrame(columns=key_columns)
+
+    def _bulk_insert_frames(self, table, frames, upsert=False, prune=False):
+        # Same as _bulk_insert for a sequence of DataFrames, all written in one transaction.
+        # With prune=True, rows whose key is in none of the frames are deleted in that transaction.
+        # In concurrent mode the frames are queued to the batched writer instead, and the
+        # number of queued rows is returned.
+        key_columns = [column.name for column in table.primary_key.columns]
+        keys = []
+        if prune:
+            # The key columns of every frame are collected as the frame is written.
+            frames = (keys.append(df[key_columns]) or df for df in frames)
+        if self.batched_writer is not None:
+            queued = sum(self.batched_writer.submit(table, df, upsert, self._write_failures) for df in frames)
+            if prune:
+                # Queued after the frames, so it runs after their upserts.
+                self.batched_writer.submit(table, self._concat_keys(keys, key_columns), failures=self._write_failures,
+                                           prune=True)
+            return queued
+        columns = [column.name for column in table.columns]
+        sql = _insert_sql(table, upsert)
+
+        inserted = 0
+        deleted = 0
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            # All chunks share one implicit transaction that is committed once at the end.
+            for df in frames:
+                for rows in _row_chunks(df, columns, self.chunk_size):
+                    cursor.executemany(sql, rows)
+                    inserted += cursor.rowcount
+            if prune:
+                deleted = _delete_absent_rows(cursor, table, self._concat_keys(keys, key_columns), self.chunk_size)
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+        print(f"Rows written to {table.name} table:", inserted)
+        if deleted:
+            print(f"Rows deleted from {table.name} table:", deleted)
+        return inserted + deleted
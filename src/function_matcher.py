@@ -4,25 +4,97 @@ Matches each training function to the closest candidate model using least square
 Encapsulates matching logic for clarity and future extensibility.
 """
 
+import time
+
 import numpy as np
 
+from src.match_metrics import get_metric
+
+# Default working-set size for one block of candidate columns in matrix mode (bytes).
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2
+
+
+def _function_columns(data):
+    # Function columns are named y1, y2, ...; 'x' is the shared axis.
+    return [col for col in data.columns if col.startswith('y')]
+
+
+class CandidateMatrix:
+    """
+    The float64 candidate values of a catalog, centred on their per-row mean, with the squared
+    norm of every centred column: what matrix mode computes for each block of candidates.
+    Built once and passed to several FunctionMatchers (candidate_matrix=...) so jobs sharing a
+    catalog (batch_runner.py) do not recompute them.
+    """
+    def __init__(self, candidate_models):
+        self.columns = _function_columns(candidate_models)
+        self.values = candidate_models[self.columns].to_numpy(dtype=float)
+        finite = np.isfinite(self.values)
+        self.center = np.where(finite, self.values, 0.0).sum(axis=1) / np.maximum(finite.sum(axis=1), 1)
+        self.centered = self.values - self.center[:, None]
+        self.norms = np.einsum('ij,ij->j', self.centered, self.centered)
+
+
 class FunctionMatcher:
     """
     Matches training functions to candidate models using least squares.
     Designed for modularity and easy replacement of matching logic.
+
+    mode='loop' (default) scores candidates one column at a time.
+    mode='matrix' scores all training columns against blocks of candidate columns at once
+    using ||a||^2 + ||b||^2 - 2 a.b, so large catalogs are handled by a few BLAS calls while
+    each block stays within memory_budget bytes. The expansion only shortlists candidates:
+    values are centred on a per-row mean first (of the training data, or of the candidates
+    with a CandidateMatrix), every candidate within the rounding error bound of the k-th best
+    is kept, and the shortlist is rescored exactly.
+    mode='indexed' uses a CandidateIndex (candidate_index.py) to score only the candidates whose
+    SSE lower bound can still win; pass a prebuilt/loaded index, otherwise one is built here.
+    A CandidateMatrix of candidate_models can be passed to matrix mode to reuse its values and norms.
+    All modes return the same matches.
+    training_data and candidate_models may also be CompactTables (compact.py).
+    rank_by_metrics() ranks the candidates under several metrics (match_metrics.py) at once.
     """
-    def __init__(self, training_data, candidate_models):
+    MODES = ('loop', 'matrix', 'indexed')
+
+    def __init__(self, training_data, candidate_models, mode='loop', memory_budget=DEFAULT_MEMORY_BUDGET,
+                 index=None, candidate_matrix=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown matcher mode '{mode}', expected one of {self.MODES}")
         self.training_data = training_data
         self.candidate_models = candidate_models
+        self.mode = mode
+        self.memory_budget = memory_budget
+        if mode == 'indexed' and index is None:
+            from src.candidate_index import CandidateIndex
+            index = CandidateIndex.build(candidate_models)
+        if index is not None and index.values is None:
+            index.attach(candidate_models)
+        self.index = index
+        self.candidate_matrix = candidate_matrix
+        self.metric_timings = {}
+
+    @property
+    def training_columns(self):
+        return _function_columns(self.training_data)
+
+    @property
+    def candidate_columns(self):
+        return _function_columns(self.candidate_models)
 
     def select_closest_function(self):
         """
         For each training function, finds the candidate model with the lowest sum of squared errors.
-        Returns a list of dicts with match info.
+        Returns a list of dicts with match info; ideal_col is None (and min_sse inf) when no
+        candidate has a finite SSE, e.g. for a training column with missing values.
         """
+        if self.mode in ('matrix', 'indexed'):
+            return [
+                {'train_col': top['train_col'], 'ideal_col': top['ideal_cols'][0] if top['ideal_cols'] else None,
+                 'min_sse': top['sses'][0] if top['sses'] else float('inf')}
+                for top in self.top_k_matches(k=1)
+            ]
         matches = []
-        for i in range(1, 5):
-            train_col = f'y{i}'
+        for train_col in self.training_columns:
             best_candidate, min_sse = self._find_best_candidate(train_col)
             matches.append({
                 'train_col': train_col,
@@ -35,18 +107,182 @@ class FunctionMatcher:
         # For compatibility with main.py; both names supported.
         return self.select_closest_function()
 
+    def top_k_matches(self, k=3):
+        """
+        Returns the k closest candidate models for every training column, best first.
+        Each entry is a dict with 'train_col', 'ideal_cols' and 'sses'.
+        Ties are broken by candidate column order, like the loop mode. Only candidates with a
+        finite SSE are listed, so a training column with missing values gets empty lists.
+        """
+        if self.mode == 'indexed':
+            return self._top_k_indexed(k)
+        train_cols = self.training_columns
+        matrix = self.candidate_matrix
+        candidate_cols = matrix.columns if matrix is not None else self.candidate_columns
+        train = self.training_data[train_cols].to_numpy(dtype=float)
+        if len(self.candidate_models) != len(train):
+            raise ValueError(
+                f"Training data has {len(train)} rows but candidate models have {len(self.candidate_models)}; "
+                "rows must be aligned on x"
+            )
+        k = min(k, len(candidate_cols))
+        # Subtracting a per-row offset leaves every SSE unchanged but keeps the norms small, so
+        # the expansion does not cancel away differences between near-tied candidates.
+        if matrix is not None:
+            center = matrix.center
+        else:
+            finite = np.isfinite(train)
+            center = np.where(finite, train, 0.0).sum(axis=1) / np.maximum(finite.sum(axis=1), 1)
+        centered = train - center[:, None]
+        train_norms = np.einsum('ij,ij->j', centered, centered)
+
+        best_sse = np.full((len(train_cols), 0), np.inf)
+        best_idx = np.empty((len(train_cols), 0), dtype=np.intp)
+        block_cols = self._block_size(len(train), len(train_cols), copies=0 if matrix is not None else 3)
+        for start in range(0, len(candidate_cols), block_cols):
+            if matrix is not None:
+                cols = slice(start, start + block_cols)
+                block, block_centered = matrix.values[:, cols], matrix.centered[:, cols]
+                block_norms = matrix.norms[cols]
+            else:
+                block = self.candidate_models[candidate_cols[start:start + block_cols]].to_numpy(dtype=float)
+                block_centered = block - center[:, None]
+                block_norms = np.einsum('ij,ij->j', block_centered, block_centered)
+            idx, sse = self._score_block(train, centered, train_norms, block, block_centered, block_norms, k)
+            best_idx = np.concatenate([best_idx, idx + start], axis=1)
+            best_sse = np.concatenate([best_sse, sse], axis=1)
+            best_idx, best_sse = self._keep_top_k(best_idx, best_sse, k)
+
+        finite = np.isfinite(best_sse)
+        return [
+            {
+                'train_col': train_col,
+                'ideal_cols': [candidate_cols[j] for j in best_idx[i][finite[i]]],
+                'sses': list(best_sse[i][finite[i]]),
+            }
+            for i, train_col in enumerate(train_cols)
+        ]
+
+    def rank_by_metrics(self, metrics=('sse',), k=3):
+        """
+        Ranks the candidate models for every training column under each metric in one blocked
+        pass: the deviations of a block of candidates are computed once and shared by all
+        metrics. metrics holds registered names or Metric instances.
+        Returns {metric name: [{'train_col', 'ideal_cols', 'scores'}, ...]}, best first, ties
+        broken by candidate column order. Seconds spent per metric (and on the shared
+        'deviations') are stored in self.metric_timings.
+        """
+        metrics = [get_metric(metric) for metric in metrics]
+        train_cols = self.training_columns
+        candidate_cols = self.candidate_columns
+        train = self.training_data[train_cols].to_numpy(dtype=float)
+        if len(self.candidate_models) != len(train):
+            raise ValueError(
+                f"Training data has {len(train)} rows but candidate models have {len(self.candidate_models)}; "
+                "rows must be aligned on x"
+            )
+        k = min(k, len(candidate_cols))
+        timings = dict.fromkeys(['deviations'] + [metric.name for metric in metrics], 0.0)
+        best = {metric.name: (np.empty((len(train_cols), 0), dtype=np.intp), np.empty((len(train_cols), 0)))
+                for metric in metrics}
+
+        # Per candidate column: its float64 copy, the deviations and one temporary per metric.
+        block_cols = max(1, int(self.memory_budget // (8 * len(train) * (1 + 3 * len(train_cols)))))
+        for start in range(0, len(candidate_cols), block_cols):
+            block = self.candidate_models[candidate_cols[start:start + block_cols]].to_numpy(dtype=float)
+            started = time.perf_counter()
+            diff = np.ascontiguousarray((train[:, :, None] - block[:, None, :]).transpose(1, 2, 0))
+            idx = np.broadcast_to(np.arange(start, start + block.shape[1]), diff.shape[:2])
+            timings['deviations'] += time.perf_counter() - started
+            for metric in metrics:
+                started = time.perf_counter()
+                scores = metric.reduce(diff)
+                scores = np.where(np.isnan(scores), np.inf, scores)
+                best_idx, best_scores = best[metric.name]
+                best[metric.name] = self._keep_top_k(np.concatenate([best_idx, idx], axis=1),
+                                                     np.concatenate([best_scores, scores], axis=1), k)
+                timings[metric.name] += time.perf_counter() - started
+        self.metric_timings = timings
+
+        return {
+            name: [
+                {
+                    'train_col': train_col,
+                    'ideal_cols': [candidate_cols[j] for j in best_idx[i]],
+                    'scores': list(best_scores[i]),
+                }
+                for i, train_col in enumerate(train_cols)
+            ]
+            for name, (best_idx, best_scores) in best.items()
+        }
+
+    def _top_k_indexed(self, k):
+        matches = []
+        for train_col in self.training_columns:
+            idx, sse = self.index.query(np.asarray(self.training_data[train_col], dtype=float), k)
+            matches.append({
+                'train_col': train_col,
+                'ideal_cols': [self.index.columns[j] for j in idx],
+                'sses': list(sse),
+            })
+        return matches
+
+    def _block_size(self, n_rows, n_train, copies=3):
+        # Per candidate column: `copies` float64 columns of the block (the selected frame, its
+        # array and the centred array; none with a CandidateMatrix), two for the exact rescoring
+        # of a fully shortlisted block, and per training column the expanded SSE, its error
+        # bound, their sum and the partitioned copy (plus temporaries) and two boolean masks.
+        bytes_per_column = 8 * n_rows * (copies + 2) + n_train * (8 * 6 + 2)
+        return max(1, int(self.memory_budget // bytes_per_column))
+
+    @staticmethod
+    def _score_block(train, centered, train_norms, block, block_centered, block_norms, k):
+        """
+        Scores one block of candidate columns against all training columns.
+        The expanded SSE matrix (on centred values) is only used to shortlist candidates: every
+        one whose expanded SSE may be within rounding error of the k-th best is rescored
+        exactly, so the result and the reported SSEs match the loop mode.
+        """
+        approx = train_norms[:, None] + block_norms[None, :] - 2.0 * (centered.T @ block_centered)
+        # Bound on the rounding error of the expansion: n-term dot products and norms.
+        error = (len(block) + 2) * np.finfo(float).eps * (train_norms[:, None] + block_norms[None, :])
+        invalid = np.isnan(approx) | np.isnan(error)
+        approx[invalid], error[invalid] = np.inf, 0.0
+        k_block = min(k, block.shape[1])
+        threshold = np.partition(approx + error, k_block - 1, axis=1)[:, k_block - 1]
+        shortlist = approx - error <= threshold[:, None]
+
+        idx = np.empty((len(train_norms), k_block), dtype=np.intp)
+        sse = np.empty((len(train_norms), k_block))
+        for i in range(len(train_norms)):
+            cand = np.nonzero(shortlist[i])[0]
+            # Exact rescoring, summed along contiguous rows like the loop mode.
+            diff = np.ascontiguousarray(train[:, i][None, :] - block[:, cand].T)
+            exact = np.sum(diff ** 2, axis=-1)
+            exact[np.isnan(exact)] = np.inf
+            order = np.lexsort((cand, exact))[:k_block]
+            idx[i], sse[i] = cand[order], exact[order]
+        return idx, sse
+
+    @staticmethod
+    def _keep_top_k(idx, sse, k):
+        # Sort by SSE, then by candidate position, and keep the first k per training column.
+        order = np.lexsort((idx, sse), axis=1)[:, :k]
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(sse, order, axis=1)
+
     def _find_best_candidate(self, train_col):
         """
         Helper to find the closest candidate model for a given training column.
         Uses sum of squared errors as the matching criterion.
+        Columns are widened to float64 first, so compact (float32) inputs accumulate in float64.
         """
         min_sse = float('inf')
         best_candidate = None
-        train_y = self.training_data[train_col].values
-        for candidate_col in [col for col in self.candidate_models.columns if col.startswith('y')]:
-            candidate_y = self.candidate_models[candidate_col].values
+        train_y = np.asarray(self.training_data[train_col], dtype=float)
+        for candidate_col in self.candidate_columns:
+            candidate_y = np.asarray(self.candidate_models[candidate_col], dtype=float)
             sse = np.sum((train_y - candidate_y) ** 2)
             if sse < min_sse:
                 min_sse = sse
                 best_candidate = candidate_col
-        return best_candidate, min_sse
\ No newline at end of file
+        return best_candidate, min_sse
@@ -0,0 +1,131 @@
+"""
+instrumentation.py
+Stage-level instrumentation for the pipeline.
+Each stage records wall time, CPU time, rows processed and peak memory, and is emitted as one
+JSON line so runs can be collected and compared by machines instead of read from prints.
+An optional cProfile hook writes one .prof file per stage, and an optional MemoryProfiler
+(memory_profile.py) records the allocation sites of each stage.
+"""
+
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource  # Not available on Windows; peak RSS is then reported as None.
+except ImportError:
+    resource = None
+
+
+def peak_rss_bytes():
+    """Returns the peak resident set size of this process so far, or None if unknown."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageRecord:
+    """
+    Metrics of one pipeline stage.
+    `rows` can be set inside the stage once the number of processed rows is known.
+    """
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_memory_bytes = None
+        self.peak_rss_bytes = None
+
+    def to_dict(self):
+        return {
+            'stage': self.name,
+            'rows': self.rows,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'peak_rss_bytes': self.peak_rss_bytes,
+        }
+
+
+class StageMetrics:
+    """
+    Collects StageRecords and writes each one as a JSON line to `sink`
+    (a file path, an open text stream, or None to only keep them in `records`).
+
+    trace_memory uses tracemalloc to measure the peak memory allocated inside each stage.
+    profile_dir enables cProfile per stage and writes `<profile_dir>/<stage>.prof`.
+    memory_profiler (a MemoryProfiler) takes tracemalloc snapshots around each stage.
+    Stages are meant to run one after another, not nested.
+    """
+    def __init__(self, sink=None, trace_memory=True, profile_dir=None, run_id=None, memory_profiler=None):
+        self.sink = sink
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.memory_profiler = memory_profiler
+        self.run_id = run_id
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # The memory profiler clears the traces first, so the peak below is measured after it.
+        with self.memory_profiler.stage(name) if self.memory_profiler is not None else nullcontext():
+            with self._measure(name, rows) as record:
+                yield record
+
+    @contextmanager
+    def _measure(self, name, rows):
+        record = StageRecord(name, rows)
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+        profiler = cProfile.Profile() if self.profile_dir else None
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.process_time() - cpu_start
+            if self.trace_memory:
+                # Peak above what was already allocated when the stage started.
+                _, peak = tracemalloc.get_traced_memory()
+                record.peak_memory_bytes = max(0, peak - baseline)
+                if started_tracing:
+                    tracemalloc.stop()
+            record.peak_rss_bytes = peak_rss_bytes()
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+            self._emit(record)
+
+    def _emit(self, record):
+        self.records.append(record)
+        if self.sink is None:
+            return
+        entry = record.to_dict()
+        if self.run_id is not None:
+            entry['run_id'] = self.run_id
+        line = json.dumps(entry) + "\n"
+        if isinstance(self.sink, (str, os.PathLike)):
+            with open(self.sink, 'a') as f:
+                f.write(line)
+        else:
+            self.sink.write(line)
+            self.sink.flush()
+
+    def summary(self):
+        """Returns all recorded stages as a list of dicts."""
+        return [record.to_dict() for record in self.records]
@@ -0,0 +1,97 @@
+"""
+kernels.py
+Fused first-hit kernels for the assignment decision.
+For every test point on the grid, the matched functions are visited in best_matches order and
+the first one whose deviation is within tolerance is taken, as in TestAssigner._find_assignment.
+The default vectorized engine computes the deviation against every matched function and masks
+afterwards. These kernels stop at the first hit instead and never build (points, functions)
+arrays:
+
+- 'numba': one compiled loop per point over the matched functions (needs the optional numba
+  package; compiled on first use and cached on disk).
+- 'numpy': one pass per matched function over the points that are still unassigned, so each
+  function only touches the remaining points.
+
+Both return exactly the rows, functions and deviations of AssignmentGrid.assign().
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+KERNEL_BACKENDS = ('auto', 'numba', 'numpy')
+
+_compiled_kernel = None
+
+
+def _first_hit_loop(y, pos, candidate_y, tolerance, func_idx, delta):
+    # Compiled by numba; pos < 0 marks points that are not on the grid.
+    for i in range(y.shape[0]):
+        p = pos[i]
+        if p < 0:
+            continue
+        for j in range(candidate_y.shape[1]):
+            d = abs(y[i] - candidate_y[p, j])
+            if d <= tolerance[p, j]:
+                func_idx[i] = j
+                delta[i] = d
+                break
+
+
+def _numba_kernel():
+    global _compiled_kernel
+    if _compiled_kernel is None:
+        import numba
+        _compiled_kernel = numba.njit(cache=True, nogil=True)(_first_hit_loop)
+    return _compiled_kernel
+
+
+@lru_cache(maxsize=None)
+def numba_available():
+    """True if the numba backend can be used (checked once per process)."""
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _first_hit_numpy(y, pos, candidate_y, tolerance, func_idx, delta):
+    active = np.nonzero(pos >= 0)[0]
+    for j in range(candidate_y.shape[1]):
+        if len(active) == 0:
+            break
+        rows = pos[active]
+        d = np.abs(y[active] - candidate_y[rows, j])
+        hit = d <= tolerance[rows, j]
+        func_idx[active[hit]] = j
+        delta[active[hit]] = d[hit]
+        active = active[~hit]
+
+
+def resolve_backend(backend='auto'):
+    """Returns the backend used for `backend`: 'auto' picks numba when it is installed."""
+    if backend not in KERNEL_BACKENDS:
+        raise ValueError(f"Unknown kernel backend '{backend}', expected one of {KERNEL_BACKENDS}")
+    if backend == 'auto':
+        return 'numba' if numba_available() else 'numpy'
+    return backend
+
+
+def first_hit(y, pos, candidate_y, tolerance, backend='auto'):
+    """
+    Assigns test values y at grid positions pos (-1 where the x value is not on the grid).
+    candidate_y and tolerance have shape (grid points, matched functions).
+    Returns (rows, func_idx, delta) for the matched points, rows in ascending order.
+    """
+    y = np.ascontiguousarray(y, dtype=float)
+    pos = np.ascontiguousarray(pos, dtype=np.intp)
+    func_idx = np.full(len(y), -1, dtype=np.intp)
+    delta = np.empty(len(y))
+    if resolve_backend(backend) == 'numba':
+        # asarray turns memory maps (parallel workers) into plain arrays without copying.
+        _numba_kernel()(y, pos, np.asarray(candidate_y), np.asarray(tolerance), func_idx, delta)
+    else:
+        _first_hit_numpy(y, pos, candidate_y, tolerance, func_idx, delta)
+    rows = np.nonzero(func_idx >= 0)[0]
+    return rows, func_idx[rows], delta[rows]
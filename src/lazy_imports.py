@@ -0,0 +1,28 @@
+"""
+lazy_imports.py
+Deferred imports of heavy dependencies.
+lazy_import('pandas') returns a module object that is only executed on its first attribute
+access (importlib.util.LazyLoader), so modules can keep `pd = lazy_import('pandas')` at the top
+and use `pd.read_csv(...)` as usual, while importing the src package, `--help` and jobs that
+never touch pandas skip its import cost.
+LazyLoader is not thread-safe before Python 3.12, so the first access should not race between
+threads; in this project it happens on the main thread while loading the datasets.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Returns module `name`, executed on first attribute access (at once if already imported)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
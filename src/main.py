@@ -7,194 +7,415 @@ This script orchestrates the workflow:
 - Matches each training function to its closest candidate model using least squares.
 - Assigns test points to candidate models based on a configurable tolerance.
 - Stores all results in a SQLite database using SQLAlchemy.
-- Visualizes results using Matplotlib (static) and Bokeh (interactive).
+- Visualizes results using Matplotlib (static) and Bokeh (interactive) when requested.
 - Prints efficiency metrics and summary statistics.
+- Emits per-stage timing and memory metrics as JSON lines, optionally with allocation sites.
+
+The workflow is available as the importable function run_pipeline() and as a command line
+tool (`python src/main.py --help`). Plotting libraries are only imported when plots are
+requested, so headless batch runs skip their cost entirely.
 
 All modules are designed for clarity, modularity, and extensibility.
 """
 
+import argparse
+import os
 import sys
-import matplotlib.pyplot as plt
-import statistics
-from data_handler import TrainingDataHandler, IdealFunctionHandler, TestDataHandler, DataLoadError
-from function_matcher import FunctionMatcher
-from test_assigner import TestAssigner
-from database_writer import DatabaseWriter
-
-# Utility function for configurable tolerance
-def calculate_tolerance(max_deviation):
-    """
-    Returns the tolerance for assignment based on max deviation.
-    This makes the assignment logic flexible for future changes.
-    """
-    return (2 ** 0.5) * max_deviation
 
-def load_datasets():
+if __package__ in (None, ''):
+    # Allow `python src/main.py` as well as `python -m src.main` from the repository root.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_handler import TrainingDataHandler, IdealFunctionHandler, TestDataHandler, DataLoadError
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner, calculate_tolerance
+from src.database_writer import IDEAL_FORMATS, DatabaseWriter, generate_run_id
+from src.database_reader import IdealFunctionStore
+from src.instrumentation import StageMetrics
+from src.memory_profile import DEFAULT_TOP_SITES, DEFAULT_TRACE_FRAMES, MemoryProfiler
+from src.tolerance import TOLERANCE_MODES, load_or_build_tolerance_table
+from src.match_cache import DEFAULT_MAX_ENTRIES, MatchCache
+from src.match_metrics import METRICS
+from src.candidate_index import index_path_for, load_or_build_index
+from src.reporting import ResultSummary
+from src.compact import CompactTable, as_frame, compare_with_float64, frame_nbytes, print_compact_report
+
+DEFAULT_TRAIN_PATH = "data/train.csv"
+DEFAULT_IDEAL_PATH = "data/ideal.csv"
+DEFAULT_TEST_PATH = "data/test.csv"
+DEFAULT_DB_PATH = "db/ideal.db"
+PLOT_CHOICES = ('none', 'matplotlib', 'bokeh', 'all')
+
+def load_datasets(train_path=DEFAULT_TRAIN_PATH, ideal_path=DEFAULT_IDEAL_PATH, test_path=DEFAULT_TEST_PATH,
+                  cache_dir=None, num_functions=50, dtype=None):
     """
     Loads all required datasets using custom managers.
     This modular approach makes error handling and future changes easier.
+    Pass test_path=None to skip the test data (streaming mode reads it in chunks later).
+    num_functions is the number of y1..yN columns required in the ideal CSV (None: any).
+    With dtype (e.g. 'float32') the datasets are loaded as CompactTables of that dtype.
+    Raises DataLoadError if any dataset cannot be loaded.
     """
-    try:
-        train_manager = TrainingDataHandler("data/train.csv")
-        train_manager.load()
-        training_data = train_manager.data
+    train_manager = TrainingDataHandler(train_path, cache_dir=cache_dir)
+    train_manager.load_compact(dtype) if dtype else train_manager.load()
+    training_data = train_manager.data
 
-        candidate_manager = IdealFunctionHandler("data/ideal.csv")
-        candidate_manager.load()
-        candidate_models = candidate_manager.data
+    candidate_manager = IdealFunctionHandler(ideal_path, cache_dir=cache_dir, num_functions=num_functions)
+    candidate_manager.load_compact(dtype) if dtype else candidate_manager.load()
+    candidate_models = candidate_manager.data
 
-        test_manager = TestDataHandler("data/test.csv")
-        test_manager.load()
+    test_data = None
+    if test_path is not None:
+        test_manager = TestDataHandler(test_path)
+        test_manager.load_compact(dtype) if dtype else test_manager.load()
         test_data = test_manager.data
-    except DataLoadError as e:
-        print("Failed to load one or more datasets. Please check file paths and formats.")
-        sys.exit(1)
     return training_data, candidate_models, test_data
 
-def visualize_with_matplotlib(training_data, candidate_models, best_matches):
+def print_summary(total_test_points, matched_points=None, matched_points_count=None, summary=None):
     """
-    Visualizes training functions vs. candidate models and deviation histogram.
-    This helps users understand the matching and assignment quality.
+    Prints efficiency metrics and summary statistics from a ResultSummary, which is built
+    from matched_points if not given. In streaming mode without a summary only counts are known.
     """
-    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
-    axes = axes.flatten()
-    for i in range(1, 5):
-        ax = axes[i-1]
-        train_col = f'y{i}'
-        ax.plot(training_data['x'], training_data[train_col], 'o-', label=f'Training {train_col}')
-        ideal_info = best_matches[i-1]
-        candidate_col = ideal_info.get('ideal_col')
-        if candidate_col and candidate_col in candidate_models.columns:
-            ax.plot(candidate_models['x'], candidate_models[candidate_col], '--', label=f'Candidate {candidate_col}')
-            ax.set_title(f'Matplotlib Overlay: {train_col} vs. {candidate_col}')
+    if summary is None:
+        summary = ResultSummary()
+        if matched_points is not None:
+            summary.update(matched_points, total_test_points)
         else:
-            ax.set_title(f"Column {candidate_col} not found")
-            continue
-        ax.set_xlabel('x')
-        ax.set_ylabel('y')
-        ax.legend()
-    plt.tight_layout()
-    plt.show()
-
-def visualize_deviation_histogram(matched_points):
+            summary.total_points, summary.matched_points = total_test_points, matched_points_count
+    print(f"\nModel Efficiency Metrics:")
+    print(f"Matching Rate: {summary.matching_rate:.2f}% "
+          f"({summary.matched_points}/{summary.total_points} test points matched)")
+
+    if summary.deviations:
+        print(f"Mean deviation: {summary.mean_deviation:.4f}")
+        print(f"Max deviation: {summary.max_deviation:.4f}")
+        print(f"Min deviation: {summary.min_deviation:.4f}")
+
+    if summary.function_counts:
+        print("\nMatched Candidate Model Counts:")
+        for func, count in sorted(summary.function_counts.items(), key=lambda item: (-item[1], item[0])):
+            print(f"{func:<12}{count}")
+
+def print_metric_rankings(rankings, timings):
+    """Prints the best candidates per training function under each metric and the time per metric."""
+    for name, ranking in rankings.items():
+        print(f"\nRanking by {name} ({timings.get(name, 0.0) * 1000:.2f} ms):")
+        for entry in ranking:
+            ranked = ", ".join(f"{col} ({score:.4g})" for col, score in zip(entry['ideal_cols'], entry['scores']))
+            print(f"  {entry['train_col']}: {ranked}")
+    print(f"Shared deviation computation: {timings.get('deviations', 0.0) * 1000:.2f} ms")
+
+def run_pipeline(train_path=DEFAULT_TRAIN_PATH, ideal_path=DEFAULT_IDEAL_PATH, test_path=DEFAULT_TEST_PATH,
+                 db_path=DEFAULT_DB_PATH, plots='none', output_dir=".", show=False, chunk_size=None, workers=1,
+                 matcher_mode='loop', engine='vectorized', interpolate=False, tolerance_mode='pointwise',
+                 tolerance_table_path=None, cache_dir=None, bulk=False, incremental=False, run_id=None,
+                 use_match_cache=True, clear_match_cache=False, match_cache_size=DEFAULT_MAX_ENTRIES,
+                 ideal_format='wide', num_functions=50, candidate_index_path=None, dtype=None, compact_report=False,
+                 rank_metrics=None, concurrent_writes=False, export_dir=None, metrics=None):
     """
-    Plots histogram of deviations to show assignment quality.
+    Runs the full workflow and returns a dict with the best matches, the matched points
+    (None in streaming mode), point counts and the paths of any written plots.
+
+    plots selects 'none', 'matplotlib', 'bokeh' or 'all'; show=True opens windows/browsers.
+    chunk_size enables streaming assignment of the test CSV; workers > 1 assigns in parallel.
+    interpolate=True also assigns test points whose x lies between grid values.
+    tolerance_mode selects 'pointwise' or 'global' tolerances; tolerance_table_path stores the
+    precomputed table next to the match results and reuses it while the matches are unchanged.
+    use_match_cache looks up matches and tolerances by content hash in the database, so
+    unchanged training/ideal data skip straight to assignment; clear_match_cache empties it first.
+    incremental=True makes repeated runs against one database idempotent (upserts, unchanged
+    tables skipped) and tags matched points with run_id, which is recorded in the `runs` table.
+    ideal_format stores the ideal functions 'wide' (one column each, at most 50), 'long'
+    (func_id, x, y rows) or 'both'; with 'long' the assigner reads the matched functions back
+    from the database (IdealFunctionStore). num_functions is passed on to the ideal CSV validation.
+    matcher_mode='indexed' loads the candidate pruning index from candidate_index_path (default:
+    next to the ideal CSV), rebuilding it when the ideal data changed.
+    dtype='float32' keeps the datasets in compact float32 arrays (SSEs are still accumulated in
+    float64); compact_report=True also runs the float64 path and prints memory saved and result drift.
+    rank_metrics (e.g. ['sse', 'linf', 'l1']) additionally ranks the candidates under each metric in
+    one pass and prints the rankings with the time spent per metric; matching itself stays SSE-based.
+    concurrent_writes=True is meant for several runs sharing one database: pooled WAL connections,
+    upserted training/ideal rows and batched commits from a writer thread; lock waits and commit
+    latencies are printed at the end and returned as 'db_metrics'.
+    export_dir additionally writes matched points (partitioned by ideal_func), best matches and
+    run metadata as Parquet files there (requires pyarrow; see parquet_export.py).
     """
-    if 'delta_y' in matched_points.columns:
-        plt.figure(figsize=(7, 4))
-        plt.hist(matched_points['delta_y'], bins=30, color='skyblue', edgecolor='black')
-        plt.title('Matplotlib Histogram: Test Point Deviations')
-        plt.xlabel('Deviation (|y_test - y_candidate|)')
-        plt.ylabel('Count')
-        plt.tight_layout()
-        plt.show()
+    if plots not in PLOT_CHOICES:
+        raise ValueError(f"Unknown plots option '{plots}', expected one of {PLOT_CHOICES}")
+    if dtype and engine == 'rowwise':
+        raise ValueError("Compact datasets require the vectorized engine")
+    if ideal_format not in IDEAL_FORMATS:
+        raise ValueError(f"Unknown ideal format '{ideal_format}', expected one of {IDEAL_FORMATS}")
+    metrics = metrics or StageMetrics(trace_memory=False)
+    streaming = chunk_size is not None
+
+    # STEP 1: Load all CSV files using OOP managers
+    with metrics.stage("load_datasets") as stage:
+        training_data, candidate_models, test_data = load_datasets(
+            train_path, ideal_path, None if streaming else test_path, cache_dir=cache_dir,
+            num_functions=num_functions, dtype=dtype)
+        stage.rows = len(training_data) + len(candidate_models) + (0 if streaming else len(test_data))
+    if dtype:
+        print(f"Compact {dtype} datasets: "
+              f"{sum(frame_nbytes(d) for d in (training_data, candidate_models, test_data) if d is not None):,} bytes")
+        if compact_report and not streaming:
+            frames = load_datasets(train_path, ideal_path, test_path, cache_dir=cache_dir, num_functions=num_functions)
+            print_compact_report(compare_with_float64(*frames, dtype=dtype, matcher_mode=matcher_mode))
+            del frames
+
+    exporter = None
+    if export_dir:
+        from src.parquet_export import ParquetExporter
+        # The exported files and the database rows share one run ID.
+        run_id = run_id or generate_run_id()
+        exporter = ParquetExporter(export_dir, run_id=run_id)
+
+    db_writer = DatabaseWriter(db_path=db_path, bulk=bulk or streaming, incremental=incremental, run_id=run_id,
+                               concurrent=concurrent_writes)
+    match_cache, cached, cache_hashes = None, None, None
+    if use_match_cache:
+        match_cache = MatchCache(db_writer.engine, max_entries=match_cache_size)
+        if clear_match_cache:
+            match_cache.invalidate()
+        with metrics.stage("match_cache_lookup", rows=len(training_data) + len(candidate_models)):
+            cache_hashes = match_cache.hashes(training_data, candidate_models)
+            cached = match_cache.get(training_data, candidate_models, hashes=cache_hashes,
+                                     tolerance_func=calculate_tolerance)
+
+    # STEP 2: Match training functions to candidate models using least squares
+    if cached is not None:
+        best_matches = cached.best_matches
+        print("Best matches (from cache):", best_matches)
     else:
-        print("Column 'delta_y' not found in matched_points. Histogram skipped.")
-
-# STEP 1: Load all CSV files using OOP managers
-training_data, candidate_models, test_data = load_datasets()
-
-# STEP 2: Match training functions to candidate models using least squares
-matcher = FunctionMatcher(training_data, candidate_models)
-best_matches = matcher.best_ideal_matches()  # If you rename in function_matcher.py, use select_closest_function()
-print("Best matches:", best_matches)
-
-# STEP 3: Assign test points to candidate models based on deviation criterion
-assigner = TestAssigner(test_data, candidate_models, best_matches, training_data)
-matched_points = assigner.assign()
-
-# STEP 4: Write all results to the database using SQLAlchemy
-db_writer = DatabaseWriter(db_path="db/ideal.db")
-
-print("Training data shape:", training_data.shape)
-print(training_data.head())
-print("Candidate models shape:", candidate_models.shape)
-print(candidate_models.head())
-print("Matched test points shape:", matched_points.shape)
-print(matched_points.head())
-
-db_writer.write_training_data(training_data)
-db_writer.write_ideal_functions(candidate_models)
-db_writer.write_matched_points(matched_points)
-
-# STEP 5: Visualize results using Matplotlib
-visualize_with_matplotlib(training_data, candidate_models, best_matches)
-visualize_deviation_histogram(matched_points)
-
-# STEP 6: Interactive visualization using Bokeh
-from bokeh.plotting import figure, show, output_file
-from bokeh.layouts import gridplot, column
-from bokeh.palettes import Category10
-from bokeh.models import ColumnDataSource, Div
-import numpy as np
-
-output_file("ideal_function_bokeh_visualizations.html")
-
-plots = []
-for i in range(1, 5):
-    train_col = f'y{i}'
-    ideal_info = best_matches[i-1]
-    candidate_col = ideal_info.get('ideal_col')
-    p = figure(title=f"Bokeh Overlay: {train_col} vs. {candidate_col}", width=400, height=300, x_axis_label='x', y_axis_label='y')
-    p.line(training_data['x'], training_data[train_col], legend_label=f"Training {train_col}", color="blue", line_width=2)
-    if candidate_col and candidate_col in candidate_models.columns:
-        p.line(candidate_models['x'], candidate_models[candidate_col], legend_label=f"Candidate {candidate_col}", color="red", line_dash="dashed", line_width=2)
-    p.legend.location = "top_left"
-    plots.append(p)
-grid = gridplot([[plots[0], plots[1]], [plots[2], plots[3]]])
-
-if 'ideal_func' in matched_points.columns:
-    unique_funcs = matched_points['ideal_func'].unique()
-    color_map = {func: Category10[10][i % 10] for i, func in enumerate(unique_funcs)}
-    colors = matched_points['ideal_func'].map(color_map)
-    source = ColumnDataSource(data=dict(
-        x=matched_points['x'],
-        y=matched_points['y'],
-        ideal_func=matched_points['ideal_func'],
-        color=colors
-    ))
-    p_scatter = figure(title="Bokeh Scatter: Test Point Assignments", width=600, height=400, x_axis_label='x', y_axis_label='y', tools="pan,wheel_zoom,box_zoom,reset,hover")
-    p_scatter.scatter('x', 'y', color='color', legend_field='ideal_func', source=source, size=8)
-    p_scatter.legend.title = "Candidate Model"
-    p_scatter.legend.location = "top_left"
-else:
-    p_scatter = Div(text="<b>Bokeh Scatter: Test Point Assignments</b><br>Column 'ideal_func' not found in matched_points. Scatter plot skipped.")
-
-if 'delta_y' in matched_points.columns:
-    hist, edges = np.histogram(matched_points['delta_y'], bins=30)
-    p_hist = figure(title="Bokeh Histogram: Test Point Deviations", width=600, height=400, x_axis_label='Deviation', y_axis_label='Count')
-    p_hist.quad(top=hist, bottom=0, left=edges[:-1], right=edges[1:], fill_color="skyblue", line_color="black")
-else:
-    p_hist = Div(text="<b>Bokeh Histogram: Test Point Deviations</b><br>Column 'delta_y' not found in matched_points. Histogram skipped.")
-
-show(column(
-    Div(text="<h2>Bokeh Overlay: Training vs. Candidate Models</h2>"),
-    grid,
-    Div(text="<h2>Bokeh Scatter: Test Point Assignments</h2>"),
-    p_scatter,
-    Div(text="<h2>Bokeh Histogram: Test Point Deviations</h2>"),
-    p_hist
-))
-
-# STEP 7: Print efficiency metrics and summary
-total_test_points = len(test_data)
-matched_points_count = len(matched_points)
-matching_rate = matched_points_count / total_test_points * 100
-print(f"\nModel Efficiency Metrics:")
-print(f"Matching Rate: {matching_rate:.2f}% ({matched_points_count}/{total_test_points} test points matched)")
-
-if 'delta_y' in matched_points.columns:
-    mean_deviation = statistics.mean(matched_points['delta_y'])
-    max_deviation = max(matched_points['delta_y'])
-    min_deviation = min(matched_points['delta_y'])
-    print(f"Mean deviation: {mean_deviation:.4f}")
-    print(f"Max deviation: {max_deviation:.4f}")
-    print(f"Min deviation: {min_deviation:.4f}")
-
-if 'ideal_func' in matched_points.columns:
-    print("\nMatched Candidate Model Counts:")
-    print(matched_points['ideal_func'].value_counts())
-
-print("All steps completed successfully. Results have been written to the database.")
+        index = None
+        if matcher_mode == 'indexed':
+            with metrics.stage("candidate_index", rows=len(candidate_models.columns) - 1):
+                index = load_or_build_index(candidate_index_path or index_path_for(ideal_path), candidate_models,
+                                            fingerprint=cache_hashes[1] if cache_hashes else None)
+        with metrics.stage("match", rows=len(training_data)):
+            matcher = FunctionMatcher(training_data, candidate_models, mode=matcher_mode, index=index)
+            best_matches = matcher.best_ideal_matches()
+        print("Best matches:", best_matches)
+
+    metric_rankings = None
+    if rank_metrics:
+        with metrics.stage("rank_metrics", rows=len(candidate_models.columns) - 1):
+            ranker = FunctionMatcher(training_data, candidate_models)
+            metric_rankings = ranker.rank_by_metrics(rank_metrics)
+        print_metric_rankings(metric_rankings, ranker.metric_timings)
+
+    # Tolerances only depend on the matches, so they are computed once (or loaded) here.
+    tolerance_table = None
+    if cached is not None and cached.tolerance_table is not None and cached.tolerance_table.mode == tolerance_mode:
+        tolerance_table = cached.tolerance_table
+    elif match_cache is not None or tolerance_mode != 'pointwise' or tolerance_table_path:
+        with metrics.stage("tolerance_table", rows=len(training_data)):
+            tolerance_table = load_or_build_tolerance_table(
+                tolerance_table_path, training_data, candidate_models, best_matches,
+                tolerance_func=calculate_tolerance, mode=tolerance_mode,
+                fingerprints=cache_hashes[:2] if cache_hashes else None)
+        if match_cache is not None:
+            match_cache.put(training_data, candidate_models, best_matches, tolerance_table, hashes=cache_hashes)
+
+    # STEP 3: Write the training data and candidate models to the database using SQLAlchemy
+    print("Training data shape:", training_data.shape)
+    print("Candidate models shape:", candidate_models.shape)
+    # The writers work on DataFrames; compact tables are converted just for the write.
+    with metrics.stage("write_training_data", rows=len(training_data)):
+        db_writer.write_training_data(as_frame(training_data))
+    with metrics.stage("write_ideal_functions", rows=len(candidate_models)):
+        ideal_frame = as_frame(candidate_models)
+        if ideal_format in ('wide', 'both'):
+            db_writer.write_ideal_functions(ideal_frame)
+        if ideal_format in ('long', 'both'):
+            db_writer.write_ideal_functions_long(ideal_frame)
+        del ideal_frame
+
+    # STEP 4: Assign test points to candidate models based on deviation criterion
+    # The assigner only needs the matched functions, not the whole catalog.
+    matched_cols = list(dict.fromkeys(match['ideal_col'] for match in best_matches))
+    if ideal_format == 'long':
+        # Read back from the long table, one range scan per matched function.
+        with metrics.stage("load_matched_functions", rows=len(matched_cols)):
+            db_writer.flush()
+            matched_functions = IdealFunctionStore(db_writer.engine).load_frame(matched_cols)
+            if dtype:
+                matched_functions = CompactTable.from_frame(matched_functions, dtype)
+    else:
+        matched_functions = candidate_models[['x'] + matched_cols]
+    assigner = TestAssigner(test_data, matched_functions, best_matches, training_data,
+                            tolerance_func=calculate_tolerance, engine=engine, interpolate=interpolate,
+                            tolerance_table=tolerance_table)
+    if workers and workers > 1:
+        from src.parallel_assigner import ParallelAssigner
+        assigner = ParallelAssigner(assigner, workers=workers)
+
+    if streaming:
+        from src.streaming import stream_assign
+        with metrics.stage("assign_and_write_matched_points") as stage:
+            summary = stream_assign(TestDataHandler(test_path), assigner, db_writer, chunk_size, exporter=exporter)
+            stage.rows = summary['total_points']
+        matched_points = None
+        total_test_points, matched_count = summary['total_points'], summary['matched_points']
+        result_summary = summary['result_summary']
+    else:
+        with metrics.stage("assign", rows=len(test_data)):
+            matched_points = assigner.assign()
+        print("Matched test points shape:", matched_points.shape)
+        with metrics.stage("write_matched_points", rows=len(matched_points)):
+            db_writer.write_matched_points(matched_points)
+        if exporter is not None:
+            with metrics.stage("export_matched_points", rows=len(matched_points)):
+                exporter.write_matched_points(matched_points)
+        total_test_points, matched_count = len(test_data), len(matched_points)
+        with metrics.stage("summarize", rows=len(matched_points)):
+            result_summary = ResultSummary.from_frame(matched_points, total_test_points)
+
+    if db_writer.run_id is not None:
+        # Like the batch runner, record which datasets and matches the run ID stands for.
+        db_writer.write_run(train_path=train_path, test_path=test_path, best_matches=best_matches,
+                            total_test_points=total_test_points, matched_points=matched_count)
+    with metrics.stage("flush_database_writes"):
+        db_writer.close()
+    db_metrics = db_writer.write_metrics()
+    if db_metrics is not None:
+        print(f"Database writes: {db_metrics['rows']} rows in {db_metrics['commits']} commits, "
+              f"lock wait {db_metrics['lock_wait_total'] * 1000:.1f} ms total "
+              f"(max {db_metrics['lock_wait_max'] * 1000:.1f} ms), commit latency "
+              f"p50 {db_metrics['commit_latency_p50'] * 1000:.1f} ms / p99 {db_metrics['commit_latency_p99'] * 1000:.1f} ms")
+
+    if exporter is not None:
+        with metrics.stage("export_run_metadata", rows=len(best_matches)):
+            exporter.write_best_matches(best_matches)
+            exporter.write_run_metadata(train_path=train_path, ideal_path=ideal_path, test_path=test_path,
+                                        db_path=db_path, matcher_mode=matcher_mode, engine=engine,
+                                        tolerance_mode=tolerance_mode, interpolate=interpolate,
+                                        total_test_points=total_test_points, matched_points_count=matched_count)
+        print(f"Exported {exporter.rows} matched points and run metadata to {os.path.abspath(export_dir)}")
+
+    # STEP 5 and 6: Visualize results using Matplotlib and Bokeh (imported only when requested)
+    outputs = []
+    if plots != 'none':
+        os.makedirs(output_dir, exist_ok=True)
+    if plots in ('matplotlib', 'all'):
+        from src.visualization import visualize_with_matplotlib, visualize_deviation_histogram
+        with metrics.stage("visualize_matplotlib", rows=matched_count):
+            outputs.append(visualize_with_matplotlib(as_frame(training_data), as_frame(candidate_models), best_matches,
+                                                     output_dir, show))
+            outputs.append(visualize_deviation_histogram(result_summary, output_dir, show))
+    if plots in ('bokeh', 'all'):
+        from src.visualization import visualize_with_bokeh
+        with metrics.stage("visualize_bokeh", rows=matched_count):
+            outputs.append(visualize_with_bokeh(as_frame(training_data), as_frame(candidate_models), best_matches,
+                                                matched_points, output_dir, show, summary=result_summary))
+
+    # STEP 7: Print efficiency metrics and summary
+    print_summary(total_test_points, summary=result_summary)
+    print("All steps completed successfully. Results have been written to the database.")
+    return {
+        'run_id': db_writer.run_id,
+        'best_matches': best_matches,
+        'matched_points': matched_points,
+        'total_test_points': total_test_points,
+        'matched_points_count': matched_count,
+        'summary': result_summary.as_dict(),
+        'metric_rankings': metric_rankings,
+        'db_metrics': db_metrics,
+        'outputs': [path for path in outputs if path],
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Match training functions to ideal functions and assign test points.")
+    parser.add_argument('--train', default=DEFAULT_TRAIN_PATH, help="training data CSV")
+    parser.add_argument('--ideal', default=DEFAULT_IDEAL_PATH, help="ideal functions (candidate models) CSV")
+    parser.add_argument('--test', default=DEFAULT_TEST_PATH, help="test data CSV")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite database file")
+    parser.add_argument('--plots', default='none', choices=PLOT_CHOICES,
+                        help="plots to render (default: none, i.e. headless)")
+    parser.add_argument('--show', action='store_true', help="open plot windows / the browser (blocking)")
+    parser.add_argument('--output-dir', default=".", help="directory for plot files")
+    parser.add_argument('--chunk-size', type=int, help="stream the test CSV in chunks of this many rows")
+    parser.add_argument('--workers', type=int, default=1, help="processes used for test point assignment")
+    parser.add_argument('--matcher-mode', default='loop', choices=FunctionMatcher.MODES)
+    parser.add_argument('--candidate-index',
+                        help="pruning index file for --matcher-mode indexed (default: next to the ideal CSV)")
+    parser.add_argument('--rank-metrics', type=lambda value: value.split(','),
+                        help=f"comma-separated metrics to rank candidates by ({', '.join(METRICS)})")
+    parser.add_argument('--engine', default='vectorized', choices=TestAssigner.ENGINES)
+    parser.add_argument('--dtype', choices=('float64', 'float32'), default='float64',
+                        help="value dtype of the in-memory datasets (float32: compact mode)")
+    parser.add_argument('--compact-report', action='store_true',
+                        help="in compact mode, compare memory and results with float64")
+    parser.add_argument('--interpolate', action='store_true',
+                        help="assign off-grid test x values using linear interpolation")
+    parser.add_argument('--tolerance-mode', default='pointwise', choices=TOLERANCE_MODES,
+                        help="pointwise deviation at each x, or the global maximum deviation per function")
+    parser.add_argument('--tolerance-table', help="save/reuse the precomputed tolerance table at this .npz path")
+    parser.add_argument('--no-match-cache', action='store_true', help="always recompute the best matches")
+    parser.add_argument('--clear-match-cache', action='store_true', help="drop all cached match results first")
+    parser.add_argument('--match-cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum number of cached match results kept in the database")
+    parser.add_argument('--cache-dir', help="binary cache directory for the training/ideal CSVs")
+    parser.add_argument('--bulk', action='store_true', help="use bulk executemany database writes")
+    parser.add_argument('--incremental', action='store_true',
+                        help="upsert training/ideal rows, skip unchanged tables and tag matches with a run ID")
+    parser.add_argument('--concurrent-writes', action='store_true',
+                        help="pooled WAL connections and batched commits for runs sharing one database")
+    parser.add_argument('--export-dir',
+                        help="also write matched points, best matches and run metadata as Parquet files here")
+    parser.add_argument('--run-id', help="run ID for the matched points (default: generated in incremental mode)")
+    parser.add_argument('--ideal-format', default='wide', choices=IDEAL_FORMATS,
+                        help="store ideal functions as columns, as (func_id, x, y) rows, or both")
+    parser.add_argument('--num-functions', type=int, default=50,
+                        help="number of y1..yN columns required in the ideal CSV (0 accepts any)")
+    parser.add_argument('--metrics', default='-', help="JSON lines file for stage metrics ('-' for stderr)")
+    parser.add_argument('--profile-dir', help="write a cProfile file per stage to this directory")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="record each stage's peak traced memory in the metrics (slows the run down)")
+    parser.add_argument('--memory-profile', metavar='REPORT_JSON',
+                        help="trace allocations per stage and write a JSON and a text report (slow)")
+    parser.add_argument('--memory-top', type=int, default=DEFAULT_TOP_SITES, help="allocation sites listed per stage")
+    parser.add_argument('--memory-frames', type=int, default=DEFAULT_TRACE_FRAMES,
+                        help="stack frames kept per allocation (fewer: faster, but sites may not reach src/)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    memory_profiler = None
+    if args.memory_profile:
+        label = os.path.splitext(os.path.basename(args.memory_profile))[0]
+        memory_profiler = MemoryProfiler(top=args.memory_top, frames=args.memory_frames, label=label)
+    # tracemalloc slows every allocation down, so peak memory is only traced on request.
+    metrics = StageMetrics(sink=sys.stderr if args.metrics == '-' else args.metrics, profile_dir=args.profile_dir,
+                           trace_memory=args.trace_memory or memory_profiler is not None,
+                           memory_profiler=memory_profiler)
+    try:
+        run_pipeline(args.train, args.ideal, args.test, args.db, plots=args.plots, output_dir=args.output_dir,
+                     show=args.show, chunk_size=args.chunk_size, workers=args.workers,
+                     matcher_mode=args.matcher_mode, engine=args.engine, interpolate=args.interpolate,
+                     tolerance_mode=args.tolerance_mode, tolerance_table_path=args.tolerance_table, cache_dir=args.cache_dir, bulk=args.bulk,
+                     incremental=args.incremental, run_id=args.run_id,
+                     use_match_cache=not args.no_match_cache, clear_match_cache=args.clear_match_cache,
+                     match_cache_size=args.match_cache_size, ideal_format=args.ideal_format,
+                     num_functions=args.num_functions or None, candidate_index_path=args.candidate_index,
+                     dtype=None if args.dtype == 'float64' else args.dtype, compact_report=args.compact_report,
+                     rank_metrics=args.rank_metrics, concurrent_writes=args.concurrent_writes,
+                     export_dir=args.export_dir,
+                     metrics=metrics)
+    except DataLoadError as e:
+        print("Failed to load one or more datasets. Please check file paths and formats.")
+        print(e)
+        return 1
+    finally:
+        if memory_profiler is not None:
+            memory_profiler.stop()
+    if memory_profiler is not None:
+        memory_profiler.write_report(args.memory_profile)
+        print(f"Memory profile written to {args.memory_profile} "
+              f"(text: {os.path.splitext(args.memory_profile)[0]}.txt)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
 
 # ------------ End of main.py ------------
@@ -0,0 +1,132 @@
+"""
+match_cache.py
+Persistent cache of matching results, stored in the SQLite database written by DatabaseWriter.
+Entries are keyed by content hashes of the training data and the candidate models, so a run
+whose train.csv and ideal.csv are unchanged goes straight to assignment, whatever the file
+names or timestamps. The number of stored entries is capped; the least recently used ones
+are evicted first.
+"""
+
+import json
+import time
+
+from src.data_loader import dataset_fingerprint
+from src.database_writer import create_schema
+from src.tolerance import ToleranceTable
+
+DEFAULT_MAX_ENTRIES = 32
+
+
+class CachedMatch:
+    """A cache hit: the best matches and, if stored, their tolerance table."""
+    def __init__(self, best_matches, tolerance_table=None):
+        self.best_matches = best_matches
+        self.tolerance_table = tolerance_table
+
+
+class MatchCache:
+    """
+    Stores best matches, SSEs and tolerance tables in the `match_cache` table.
+    Use the engine of a DatabaseWriter so the cache lives next to the results it produced.
+    A stored tolerance table is only returned to lookups with the tolerance function it was
+    computed with; tables of functions without a stable key (lambdas, closures) are not stored.
+    """
+    def __init__(self, engine, max_entries=DEFAULT_MAX_ENTRIES):
+        from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, Text
+
+        self.engine = engine
+        self.max_entries = max_entries
+        self.metadata = MetaData()
+        self.table = Table(
+            'match_cache', self.metadata,
+            Column('cache_key', String, primary_key=True),
+            Column('training_hash', String),
+            Column('candidate_hash', String),
+            Column('best_matches', Text),
+            Column('tolerance_table', LargeBinary),
+            Column('created_at', Float),
+            Column('last_used', Float),
+            Column('hits', Integer)
+        )
+        create_schema(self.metadata, self.engine)
+
+    @staticmethod
+    def hashes(training_data, candidate_models):
+        """Returns (training_hash, candidate_hash, cache_key) for a dataset pair."""
+        training_hash = dataset_fingerprint(training_data)
+        candidate_hash = dataset_fingerprint(candidate_models)
+        return training_hash, candidate_hash, f"{training_hash}:{candidate_hash}"
+
+    def get(self, training_data, candidate_models, hashes=None, tolerance_func=None):
+        """
+        Returns a CachedMatch for the dataset pair, or None on a miss. Its tolerance_table is
+        None unless the stored one was computed with tolerance_func (None: calculate_tolerance).
+        Pass the result of hashes() to avoid hashing the data again for a following put().
+        """
+        _, _, cache_key = hashes or self.hashes(training_data, candidate_models)
+        with self.engine.begin() as conn:
+            row = conn.execute(self.table.select().where(self.table.c.cache_key == cache_key)).first()
+            if row is None:
+                return None
+            conn.execute(self.table.update().where(self.table.c.cache_key == cache_key)
+                         .values(last_used=time.time(), hits=self.table.c.hits + 1))
+        tolerance_table = ToleranceTable.from_bytes(row.tolerance_table) if row.tolerance_table else None
+        if tolerance_table is not None and not tolerance_table.reusable_for(tolerance_func):
+            tolerance_table = None
+        return CachedMatch(json.loads(row.best_matches), tolerance_table)
+
+    def put(self, training_data, candidate_models, best_matches, tolerance_table=None, hashes=None):
+        """Stores (or replaces) the results for a dataset pair and evicts entries beyond max_entries."""
+        training_hash, candidate_hash, cache_key = hashes or self.hashes(training_data, candidate_models)
+        matches = [
+            {'train_col': m['train_col'], 'ideal_col': m['ideal_col'], 'min_sse': float(m['min_sse'])}
+            for m in best_matches
+        ]
+        if tolerance_table is not None and tolerance_table.tolerance_key is None:
+            tolerance_table = None
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.cache_key == cache_key))
+            conn.execute(self.table.insert(), {
+                'cache_key': cache_key,
+                'training_hash': training_hash,
+                'candidate_hash': candidate_hash,
+                'best_matches': json.dumps(matches),
+                'tolerance_table': tolerance_table.to_bytes() if tolerance_table is not None else None,
+                'created_at': now,
+                'last_used': now,
+                'hits': 0,
+            })
+            self._evict(conn)
+
+    def invalidate(self, training_data=None, candidate_models=None):
+        """
+        Removes the entries that use the given training data and/or candidate models;
+        with no arguments, removes every entry. Returns the number of removed entries.
+        """
+        condition = None
+        if training_data is not None:
+            condition = self.table.c.training_hash == dataset_fingerprint(training_data)
+        if candidate_models is not None:
+            candidate_condition = self.table.c.candidate_hash == dataset_fingerprint(candidate_models)
+            condition = candidate_condition if condition is None else condition & candidate_condition
+        statement = self.table.delete()
+        if condition is not None:
+            statement = statement.where(condition)
+        with self.engine.begin() as conn:
+            return conn.execute(statement).rowcount
+
+    def __len__(self):
+        from sqlalchemy import func, select
+
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar()
+
+    def _evict(self, conn):
+        from sqlalchemy import select
+
+        # Keep the max_entries most recently used entries.
+        keep = (select(self.table.c.cache_key)
+                .order_by(self.table.c.last_used.desc())
+                .limit(self.max_entries))
+        conn.execute(self.table.delete().where(self.table.c.cache_key.not_in(keep)))
@@ -0,0 +1,84 @@
+"""
+match_metrics.py
+Distance metrics for ranking candidate models against training functions.
+FunctionMatcher.rank_by_metrics() computes the deviations between the training columns and a
+block of candidate columns once and lets every requested metric reduce the same array, so any
+number of metrics costs a single pass over the catalog.
+
+A metric is an object with a `name` and a `reduce(diff)` method that maps deviations of shape
+(n_train, n_candidates, n_rows) to scores of shape (n_train, n_candidates); lower is better and
+NaN scores are never ranked first. New metrics can be added with register_metric().
+"""
+
+import numpy as np
+
+
+class Metric:
+    """Base class for matching metrics."""
+    name = None
+
+    def reduce(self, diff):
+        raise NotImplementedError
+
+
+class SSEMetric(Metric):
+    """Sum of squared errors, the criterion of FunctionMatcher.select_closest_function()."""
+    name = 'sse'
+
+    def reduce(self, diff):
+        # Summed along contiguous rows, so the values equal the loop mode bit for bit.
+        return np.sum(diff ** 2, axis=-1)
+
+
+class LInfMetric(Metric):
+    """Maximum absolute deviation, the quantity the assignment tolerance is based on."""
+    name = 'linf'
+
+    def reduce(self, diff):
+        return np.max(np.abs(diff), axis=-1, initial=0.0)
+
+
+class L1Metric(Metric):
+    """Sum of absolute deviations, less sensitive to single outliers than SSE."""
+    name = 'l1'
+
+    def reduce(self, diff):
+        return np.sum(np.abs(diff), axis=-1)
+
+
+class WeightedSSEMetric(Metric):
+    """
+    Sum of squared errors weighted per x value, e.g. with 1 / noise variance.
+    weights has shape (n_rows,), or (n_rows, n_train) for one weight column per training
+    function; without weights it equals SSE.
+    """
+    name = 'weighted_sse'
+
+    def __init__(self, weights=None):
+        self.weights = weights
+
+    def reduce(self, diff):
+        if self.weights is None:
+            return np.sum(diff ** 2, axis=-1)
+        weights = np.asarray(self.weights, dtype=float)
+        if weights.ndim == 2:
+            weights = weights.T[:, None, :]
+        return np.sum(weights * diff ** 2, axis=-1)
+
+
+METRICS = {cls.name: cls for cls in (SSEMetric, LInfMetric, L1Metric, WeightedSSEMetric)}
+
+
+def register_metric(cls):
+    """Adds a Metric subclass to the registry under its name; usable as a class decorator."""
+    METRICS[cls.name] = cls
+    return cls
+
+
+def get_metric(metric, **options):
+    """Returns a metric instance for a registered name (options go to its constructor) or a Metric."""
+    if isinstance(metric, Metric):
+        return metric
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {tuple(METRICS)}")
+    return METRICS[metric](**options)
@@ -0,0 +1,315 @@
+"""
+memory_profile.py
+Opt-in allocation profiling of the pipeline stages (`--memory-profile report.json`).
+MemoryProfiler hooks into the stages of StageMetrics. tracemalloc traces are cleared when a
+stage starts and snapshotted when it ends, so the snapshot holds exactly the blocks the stage
+allocated and kept. Per stage the report has:
+
+- the peak memory allocated during the stage (transient copies included),
+- the memory the stage retained, and the allocation sites behind it,
+- the process RSS after the stage and the peak RSS so far.
+
+Each allocation site is reported with the innermost line of this package that led to it (e.g.
+`src/data_loader.py:52`) and the line that actually allocated (often inside pandas or NumPy),
+so large copies can be traced back to the pipeline code. tracemalloc cannot attribute the
+peak to sites; the sites explain the retained memory only. Memory freed by a later stage is
+not subtracted there, the RSS columns show the process as a whole.
+
+Reports are written as JSON (for comparing runs) and as text (for tickets). Two reports,
+e.g. of two versions, are compared stage by stage and site by site with:
+
+    python -m src.memory_profile compare before.json after.json
+    python -m src.memory_profile show report.json
+
+tracemalloc slows allocation-heavy code down noticeably, so this is meant for diagnosing
+memory problems, not for timing runs.
+"""
+
+import argparse
+import json
+import linecache
+import os
+import platform
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from src.instrumentation import peak_rss_bytes
+
+DEFAULT_TOP_SITES = 10
+# Frames kept per allocation; enough to reach the pipeline code from inside pandas.
+DEFAULT_TRACE_FRAMES = 25
+# Only the largest tracebacks are attributed to sites; stages that import modules leave tens of
+# thousands of tiny ones that would take seconds to walk and never reach the top sites.
+MAX_SITE_TRACEBACKS = 5000
+REPORT_VERSION = 1
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(PACKAGE_DIR)
+MIB = 1024 * 1024
+
+
+def current_rss_bytes():
+    """Returns the current resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _short_path(filename, prefixes):
+    # Paths relative to the project or to sys.path, so reports of different checkouts compare.
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _frame_dict(frame, prefixes):
+    return {
+        'file': _short_path(frame.filename, prefixes),
+        'line': frame.lineno,
+        'code': ("(module import)" if frame.filename.startswith("<frozen importlib")
+                 else linecache.getline(frame.filename, frame.lineno).strip()),
+    }
+
+
+def _origin_frame(frames):
+    # Innermost frame inside the src package, or the innermost frame if there is none.
+    for frame in reversed(frames):
+        if frame.filename.startswith(PACKAGE_DIR + os.sep):
+            return frame
+    return frames[-1]
+
+
+def allocation_sites(snapshot, top=DEFAULT_TOP_SITES):
+    """
+    Returns the `top` allocation sites of a snapshot by size, as dicts with 'size', 'count',
+    'origin' (innermost frame in this package) and 'allocated_at' (innermost frame).
+    Sites are built from the MAX_SITE_TRACEBACKS largest tracebacks.
+    """
+    prefixes = [prefix.rstrip(os.sep) + os.sep for prefix in
+                [PROJECT_ROOT] + sorted((p for p in sys.path if p), key=len, reverse=True)]
+    sites = {}
+    for statistic in snapshot.statistics('traceback')[:MAX_SITE_TRACEBACKS]:
+        # Traceback frames are ordered from the oldest to the most recent call.
+        frames = list(statistic.traceback)
+        allocated_at = frames[-1]
+        if allocated_at.filename == tracemalloc.__file__:
+            continue
+        origin = _origin_frame(frames)
+        key = (origin.filename, origin.lineno, allocated_at.filename, allocated_at.lineno)
+        site = sites.setdefault(key, {'size': 0, 'count': 0, 'origin': origin, 'allocated_at': allocated_at})
+        site['size'] += statistic.size
+        site['count'] += statistic.count
+    largest = sorted(sites.values(), key=lambda site: site['size'], reverse=True)[:top]
+    return [dict(site, origin=_frame_dict(site['origin'], prefixes),
+                 allocated_at=_frame_dict(site['allocated_at'], prefixes)) for site in largest]
+
+
+class MemoryProfiler:
+    """
+    Per-stage allocation tracing, passed to StageMetrics(memory_profiler=...).
+    Tracing starts with the first stage (or start()) and is stopped by stop(); report()
+    returns the JSON-serialisable report of all stages so far.
+    """
+    def __init__(self, top=DEFAULT_TOP_SITES, frames=DEFAULT_TRACE_FRAMES, label=None):
+        self.top = top
+        self.frames = frames
+        self.label = label
+        self.stages = []
+        self.started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        self.start()
+        # Only blocks allocated from here on are traced; snapshots of everything allocated
+        # before (e.g. the imported modules) would make each stage cost seconds.
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            retained, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            self.stages.append({
+                'stage': name,
+                'peak_bytes': peak,
+                'retained_bytes': retained,
+                'rss_bytes': current_rss_bytes(),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'sites': allocation_sites(snapshot, self.top),
+            })
+
+    def report(self):
+        return {
+            'version': REPORT_VERSION,
+            'label': self.label,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'trace_frames': self.frames,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': list(self.stages),
+        }
+
+    def write_report(self, path):
+        """Writes the JSON report to path and the text report next to it (report.json -> report.txt)."""
+        report = self.report()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.splitext(path)[0] + '.txt', 'w') as f:
+            f.write(format_report(report))
+        return report
+
+
+def _mib(value):
+    return "n/a" if value is None else f"{value / MIB:.1f}"
+
+
+def _signed_mib(value):
+    return "n/a" if value is None else f"{value / MIB:+.1f}"
+
+
+def format_report(report):
+    """Returns a report as text: a per-stage table followed by the top sites of each stage."""
+    title = f"Memory profile {report['label']}" if report.get('label') else "Memory profile"
+    lines = [f"{title} ({report['created_at']}, Python {report['python']})",
+             f"Peak RSS: {_mib(report['peak_rss_bytes'])} MiB",
+             "",
+             f"{'stage':<32} {'peak MiB':>10} {'kept MiB':>10} {'RSS MiB':>10}"]
+    for stage in report['stages']:
+        lines.append(f"{stage['stage']:<32} {_mib(stage['peak_bytes']):>10} {_mib(stage['retained_bytes']):>10} "
+                     f"{_mib(stage['rss_bytes']):>10}")
+    for stage in report['stages']:
+        if not stage['sites']:
+            continue
+        lines += ["", f"{stage['stage']}: largest retained allocations"]
+        for site in stage['sites']:
+            origin, allocated_at = site['origin'], site['allocated_at']
+            lines.append(f"  {_mib(site['size']):>8} MiB {site['count']:>9} blocks  "
+                         f"{origin['file']}:{origin['line']}  {origin['code']}")
+            if allocated_at != origin:
+                lines.append(f"{'':>33}allocated at {allocated_at['file']}:{allocated_at['line']}")
+    return "\n".join(lines) + "\n"
+
+
+def _site_sizes(stage):
+    # Sites keyed by file and source text of their origin, so they still match when lines move.
+    sizes = {}
+    for site in stage['sites'] if stage else ():
+        key = f"{site['origin']['file']}  {site['origin']['code']}"
+        sizes[key] = sizes.get(key, 0) + site['size']
+    return sizes
+
+
+def compare_reports(base, new, top=DEFAULT_TOP_SITES):
+    """
+    Compares two reports stage by stage (matched by stage name). Each stage entry holds the
+    base and new value and the change of peak, retained and RSS bytes (None where a stage is
+    missing from a report), and the `top` origin sites whose retained size changed most.
+    """
+    base_stages = {stage['stage']: stage for stage in base['stages']}
+    new_stages = {stage['stage']: stage for stage in new['stages']}
+    names = list(new_stages) + [name for name in base_stages if name not in new_stages]
+
+    def change(key, old, current):
+        if old is None or current is None or old[key] is None or current[key] is None:
+            return None
+        return current[key] - old[key]
+
+    stages = []
+    for name in names:
+        old, current = base_stages.get(name), new_stages.get(name)
+        entry = {'stage': name}
+        for key in ('peak_bytes', 'retained_bytes', 'rss_bytes'):
+            entry[key] = {'base': old and old[key], 'new': current and current[key],
+                          'change': change(key, old, current)}
+        old_sites, new_sites = _site_sizes(old), _site_sizes(current)
+        sites = [{'site': site, 'base': old_sites.get(site, 0), 'new': new_sites.get(site, 0),
+                  'change': new_sites.get(site, 0) - old_sites.get(site, 0)}
+                 for site in dict.fromkeys(list(new_sites) + list(old_sites))]
+        entry['sites'] = sorted((site for site in sites if site['change']),
+                                key=lambda site: abs(site['change']), reverse=True)[:top]
+        stages.append(entry)
+    return {
+        'base': {'label': base.get('label'), 'created_at': base['created_at']},
+        'new': {'label': new.get('label'), 'created_at': new['created_at']},
+        'peak_rss_bytes': {'base': base['peak_rss_bytes'], 'new': new['peak_rss_bytes'],
+                           'change': change('peak_rss_bytes', base, new)},
+        'stages': stages,
+    }
+
+
+def format_comparison(comparison):
+    """Returns a comparison of compare_reports() as text."""
+    def name(side):
+        return side['label'] or side['created_at']
+
+    rss = comparison['peak_rss_bytes']
+    lines = [f"Memory comparison: {name(comparison['base'])} -> {name(comparison['new'])}",
+             f"Peak RSS: {_mib(rss['base'])} -> {_mib(rss['new'])} MiB ({_signed_mib(rss['change'])})",
+             "",
+             f"{'stage (MiB)':<32} {'peak base':>10} {'peak new':>10} {'change':>8} {'kept base':>10} "
+             f"{'kept new':>10} {'change':>8}"]
+    for stage in comparison['stages']:
+        peak, retained = stage['peak_bytes'], stage['retained_bytes']
+        lines.append(f"{stage['stage']:<32} {_mib(peak['base']):>10} {_mib(peak['new']):>10} "
+                     f"{_signed_mib(peak['change']):>8} {_mib(retained['base']):>10} {_mib(retained['new']):>10} "
+                     f"{_signed_mib(retained['change']):>8}")
+    for stage in comparison['stages']:
+        if not stage['sites']:
+            continue
+        lines += ["", f"{stage['stage']}: retained allocations that changed"]
+        for site in stage['sites']:
+            lines.append(f"  {_signed_mib(site['change']):>8} MiB ({_mib(site['base'])} -> {_mib(site['new'])})  "
+                         f"{site['site']}")
+    return "\n".join(lines) + "\n"
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show or compare memory profile reports (--memory-profile).")
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help="print a report as text")
+    show.add_argument('report')
+    compare = commands.add_parser('compare', help="compare two reports stage by stage")
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--top', type=int, default=DEFAULT_TOP_SITES, help="changed sites listed per stage")
+    compare.add_argument('--json', help="also write the comparison as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'show':
+        print(format_report(load_report(args.report)), end='')
+        return 0
+    comparison = compare_reports(load_report(args.base), load_report(args.new), top=args.top)
+    print(format_comparison(comparison), end='')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(comparison, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
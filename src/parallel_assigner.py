@@ -0,0 +1,157 @@
+"""
+parallel_assigner.py
+Multi-core test point assignment on top of the vectorized TestAssigner engine.
+The read-only grid and test arrays are written once to memory-mapped .npy files; worker
+processes map them instead of receiving pickled copies with every task, and only shard
+bounds and the (small) match results travel between processes.
+In a session (ParallelAssigner.session(), used by the streaming pipeline) the pool and the
+shared grid are set up once for many assign() calls; each call's test points then travel
+with the tasks.
+"""
+
+import os
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.test_assigner import AssignmentGrid
+
+# Test points handled by one task.
+DEFAULT_SHARD_SIZE = 250000
+
+# Per-process state set up by _init_worker.
+_worker_state = {}
+
+
+def _exchange_dir():
+    # Prefer a RAM-backed filesystem so the memory maps never touch the disk.
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _init_worker(directory, names, ideal_cols, grid_options):
+    # Arrays shared with the workers are stored as <name>.npy in the exchange directory.
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in names}
+    _worker_state['grid'] = AssignmentGrid(arrays['grid_x'], arrays['candidate_y'], arrays['tolerance'], ideal_cols,
+                                           training_y=arrays.get('training_y'), **grid_options)
+    # Sessions share only the grid; their test points come with the tasks.
+    _worker_state['x'] = arrays.get('test_x')
+    _worker_state['y'] = arrays.get('test_y')
+
+
+def _assign_shard(bounds):
+    start, stop = bounds
+    grid = _worker_state['grid']
+    rows, func_idx, delta = grid.assign(_worker_state['x'][start:stop], _worker_state['y'][start:stop])
+    return rows + start, func_idx, delta
+
+
+def _assign_points(task):
+    start, x, y = task
+    rows, func_idx, delta = _worker_state['grid'].assign(x, y)
+    return rows + start, func_idx, delta
+
+
+def _grid_arrays(grid):
+    shared = {
+        'grid_x': grid.x,
+        'candidate_y': grid.candidate_y,
+        'tolerance': grid.tolerance,
+    }
+    if grid.interpolate:
+        shared['training_y'] = grid.training_y
+    return shared
+
+
+def _start_pool(workers, directory, grid, shared):
+    # Small, picklable settings travel with the pool initializer instead of the memory maps.
+    grid_options = {
+        'tolerance_func': grid.tolerance_func,
+        'interpolate': grid.interpolate,
+        'global_tolerance': grid.global_tolerance,
+        'kernel': grid.kernel,
+    }
+    for name, array in shared.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+    return multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(directory, list(shared), grid.ideal_cols, grid_options))
+
+
+class ParallelAssigner:
+    """
+    Shards test points across a process pool and merges the results in input order.
+    The output is identical to TestAssigner.assign() with the vectorized engine.
+    """
+    def __init__(self, assigner, workers=None, shard_size=DEFAULT_SHARD_SIZE):
+        if shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+        self.assigner = assigner
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._pool = None
+
+    def assign(self, test_data=None):
+        """
+        Assigns test_data (defaults to the assigner's test data) and returns the usual
+        `['x', 'y', 'ideal_func', 'delta_y']` DataFrame.
+        """
+        test_data = self.assigner.test_data if test_data is None else test_data
+        grid = self.assigner.grid
+        x = np.asarray(test_data['x'], dtype=float)
+        y = np.asarray(test_data['y'], dtype=float)
+        shard_size = self.shard_size
+        if self._pool is not None:
+            # The pool is already running, so even a small call is spread over all workers.
+            shard_size = max(1, min(shard_size, -(-len(x) // self.workers)))
+        shards = [(start, min(start + shard_size, len(x))) for start in range(0, len(x), shard_size)]
+
+        if self.workers == 1 or len(shards) <= 1:
+            # Not worth starting processes; run the same shards in-process.
+            results = [self._assign_local(grid, x, y, bounds) for bounds in shards]
+        elif self._pool is not None:
+            results = list(self._pool.imap(_assign_points, [(start, x[start:stop], y[start:stop])
+                                                            for start, stop in shards]))
+        else:
+            results = self._assign_pooled(grid, x, y, shards)
+
+        if results:
+            rows, func_idx, delta = (np.concatenate(parts) for parts in zip(*results))
+        else:
+            rows, func_idx, delta = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+        return grid.to_frame(x, y, rows, func_idx, delta)
+
+    def assign_frame(self, test_frame):
+        # Same interface as TestAssigner, so the streaming pipeline can assign chunks in parallel.
+        return self.assign(test_frame)
+
+    @contextmanager
+    def session(self):
+        """
+        Keeps one worker pool, with the grid shared once, for all assign() calls inside the
+        block instead of starting a pool per call. Nested sessions reuse the outer one.
+        """
+        if self._pool is not None or self.workers == 1:
+            yield self
+            return
+        grid = self.assigner.grid
+        with tempfile.TemporaryDirectory(prefix='ideal_assign_', dir=_exchange_dir()) as directory:
+            with _start_pool(self.workers, directory, grid, _grid_arrays(grid)) as pool:
+                self._pool = pool
+                try:
+                    yield self
+                finally:
+                    self._pool = None
+
+    @staticmethod
+    def _assign_local(grid, x, y, bounds):
+        start, stop = bounds
+        rows, func_idx, delta = grid.assign(x[start:stop], y[start:stop])
+        return rows + start, func_idx, delta
+
+    def _assign_pooled(self, grid, x, y, shards):
+        shared = dict(_grid_arrays(grid), test_x=x, test_y=y)
+        with tempfile.TemporaryDirectory(prefix='ideal_assign_', dir=_exchange_dir()) as directory:
+            with _start_pool(self.workers, directory, grid, shared) as pool:
+                # imap keeps results in shard order, so the merge is deterministic.
+                return list(pool.imap(_assign_shard, shards))
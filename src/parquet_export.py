@@ -0,0 +1,161 @@
+"""
+parquet_export.py
+Export of the pipeline results to compressed Parquet files for downstream analytics.
+ParquetExporter writes, next to (not instead of) the SQLite database:
+
+    <export_dir>/matched_points/ideal_func=<func>/<run_id>-<part>-0.parquet
+    <export_dir>/best_matches/<run_id>.parquet
+    <export_dir>/runs/<run_id>.parquet
+
+Matched points are partitioned by ideal_func and sorted by x within each file, so readers can
+skip whole partitions and row groups. ParquetResults reads the files back with column
+projection and filters pushed down to the Parquet reader, e.g. for per-function summaries
+without a scan of the matched_points table.
+
+pyarrow is an optional dependency and is only imported when exporting or reading.
+"""
+
+import os
+from datetime import datetime, timezone
+
+from src.database_writer import generate_run_id
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+DEFAULT_COMPRESSION = 'zstd'
+PARTITION_COLUMN = 'ideal_func'
+
+# Column names and Arrow types of the three datasets; fixed, so files of all runs share one schema.
+MATCHED_POINTS_FIELDS = (('x', 'float64'), ('y', 'float64'), ('delta_y', 'float64'), ('run_id', 'string'),
+                         (PARTITION_COLUMN, 'string'))
+BEST_MATCHES_FIELDS = (('run_id', 'string'), ('train_col', 'string'), ('ideal_col', 'string'),
+                       ('min_sse', 'float64'))
+RUN_FIELDS = (('run_id', 'string'), ('created_at', 'string'), ('train_path', 'string'), ('ideal_path', 'string'),
+              ('test_path', 'string'), ('db_path', 'string'), ('matcher_mode', 'string'), ('engine', 'string'),
+              ('tolerance_mode', 'string'), ('interpolate', 'bool_'), ('total_test_points', 'int64'),
+              ('matched_points_count', 'int64'))
+DATASETS = {'matched_points': MATCHED_POINTS_FIELDS, 'best_matches': BEST_MATCHES_FIELDS, 'runs': RUN_FIELDS}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def _schema(fields):
+    pa = _pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in fields])
+
+
+class ParquetExporter:
+    """
+    Writes matched points, best matches and run metadata of one run to export_dir.
+    Has the same write_matched_points() method as DatabaseWriter, so it can be called once
+    per chunk in streaming mode; every call adds one file per ideal function.
+    """
+    def __init__(self, export_dir, run_id=None, compression=DEFAULT_COMPRESSION):
+        _pyarrow()  # fail before any work is done if pyarrow is missing
+        self.export_dir = export_dir
+        self.run_id = run_id or generate_run_id()
+        self.compression = compression
+        self.parts = 0
+        self.rows = 0
+
+    def _path(self, dataset):
+        path = os.path.join(self.export_dir, dataset)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def write_matched_points(self, matched_points_df):
+        """Appends matched points (x, y, ideal_func, delta_y) to the partitioned dataset."""
+        if matched_points_df.empty:
+            return
+        pa = _pyarrow()
+        frame = matched_points_df.assign(run_id=self.run_id).sort_values([PARTITION_COLUMN, 'x'], kind='stable')
+        schema = _schema(MATCHED_POINTS_FIELDS)
+        table = pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+        pa.parquet.write_to_dataset(table, self._path('matched_points'), partition_cols=[PARTITION_COLUMN],
+                                    basename_template=f"{self.run_id}-{self.parts:05d}-{{i}}.parquet",
+                                    existing_data_behavior='overwrite_or_ignore', compression=self.compression)
+        self.parts += 1
+        self.rows += len(frame)
+
+    def write_best_matches(self, best_matches):
+        """Writes the best-match entries of FunctionMatcher (train_col, ideal_col, min_sse)."""
+        frame = pd.DataFrame([{'run_id': self.run_id, 'train_col': match['train_col'],
+                               'ideal_col': match['ideal_col'], 'min_sse': float(match['min_sse'])}
+                              for match in best_matches], columns=[name for name, _ in BEST_MATCHES_FIELDS])
+        self._write_table('best_matches', frame, BEST_MATCHES_FIELDS)
+
+    def write_run_metadata(self, **fields):
+        """Writes one row describing the run; fields are RUN_FIELDS names, missing ones are null."""
+        unknown = set(fields) - {name for name, _ in RUN_FIELDS}
+        if unknown:
+            raise ValueError(f"Unknown run metadata fields: {sorted(unknown)}")
+        row = {name: fields.get(name) for name, _ in RUN_FIELDS}
+        row['run_id'] = self.run_id
+        row['created_at'] = row['created_at'] or datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self._write_table('runs', pd.DataFrame([row]), RUN_FIELDS)
+
+    def _write_table(self, dataset, frame, fields):
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(frame, schema=_schema(fields), preserve_index=False)
+        pa.parquet.write_table(table, os.path.join(self._path(dataset), f"{self.run_id}.parquet"),
+                               compression=self.compression)
+
+
+class ParquetResults:
+    """
+    Reads the datasets written by ParquetExporter, from any number of runs.
+
+    columns restricts the columns read from the files; filters is a pyarrow.dataset
+    expression or a list of (column, op, value) tuples, e.g.
+    [('ideal_func', '=', 'y42'), ('delta_y', '<', 0.1)]. Filters on ideal_func skip the
+    other partitions, filters on x or delta_y skip row groups by their statistics.
+    """
+    def __init__(self, export_dir):
+        self.export_dir = export_dir
+
+    def read_table(self, dataset, columns=None, filters=None):
+        """Returns a pyarrow Table of the selected columns and rows of dataset."""
+        pa = _pyarrow()
+        schema = _schema(DATASETS[dataset])
+        path = os.path.join(self.export_dir, dataset)
+        if not os.path.isdir(path):
+            table = schema.empty_table()
+            return table.select(columns) if columns else table
+        partitioning = None
+        if dataset == 'matched_points':
+            partitioning = pa.dataset.partitioning(pa.schema([schema.field(PARTITION_COLUMN)]), flavor='hive')
+        source = pa.dataset.dataset(path, schema=schema, format='parquet', partitioning=partitioning)
+        if filters is not None and not isinstance(filters, pa.dataset.Expression):
+            filters = pa.parquet.filters_to_expression(filters)
+        return source.to_table(columns=columns, filter=filters)
+
+    def matched_points(self, columns=None, filters=None):
+        return self.read_table('matched_points', columns, filters).to_pandas()
+
+    def best_matches(self, run_id=None):
+        return self.read_table('best_matches', filters=None if run_id is None else [('run_id', '=', run_id)]).to_pandas()
+
+    def runs(self):
+        return self.read_table('runs').to_pandas()
+
+    def summary(self, filters=None):
+        """
+        Returns points, mean and max delta_y per ideal function; only the ideal_func partition
+        values and the delta_y column are read.
+        """
+        table = self.read_table('matched_points', columns=[PARTITION_COLUMN, 'delta_y'], filters=filters)
+        grouped = table.group_by(PARTITION_COLUMN).aggregate(
+            [('delta_y', 'count'), ('delta_y', 'mean'), ('delta_y', 'max')]).to_pandas()
+        grouped = grouped.rename(columns={'delta_y_count': 'points', 'delta_y_mean': 'mean_delta_y',
+                                          'delta_y_max': 'max_delta_y'})
+        return grouped[[PARTITION_COLUMN, 'points', 'mean_delta_y', 'max_delta_y']] \
+            .sort_values(PARTITION_COLUMN).reset_index(drop=True)
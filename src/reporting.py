@@ -0,0 +1,164 @@
+"""
+reporting.py
+Summary statistics and plot data reduction for large result sets.
+ResultSummary collects the matching rate, deviation statistics, per-function counts and a
+deviation histogram with a few array reductions per batch of matched points. Summaries of
+chunks (streaming mode) or shards can be merged, so no statistic needs all points at once.
+decimate_minmax() reduces scatter data to the lowest and highest point per x bucket and
+function, so plots stay the same size however many points were matched.
+"""
+
+import numpy as np
+
+# Histogram bins over [0, upper edge]. The upper edge is a power of two and doubles (merging
+# neighbouring bins, hence an even count) when larger deviations arrive, so counts stay exact.
+HISTOGRAM_BINS = 32
+# x buckets per function kept by decimate_minmax(); at most two points per bucket are plotted.
+DECIMATION_BUCKETS = 500
+
+
+def _grow_histogram(counts, upper, target):
+    # Doubles the range of counts (merging bin pairs) until it reaches target.
+    counts = counts.copy()
+    while upper < target:
+        half = counts.reshape(-1, 2).sum(axis=1)
+        counts[:len(half)] = half
+        counts[len(half):] = 0
+        upper *= 2
+    return counts, upper
+
+
+class ResultSummary:
+    """
+    Mergeable summary of an assignment run. Feed it batches with update() (or combine
+    summaries with merge()) and read the statistics from the attributes or as_dict().
+    Deviation mean and variance are combined with Chan's parallel update, so chunked and
+    one-shot summaries agree up to rounding.
+    """
+    def __init__(self, bins=HISTOGRAM_BINS):
+        if bins < 2 or bins % 2:
+            raise ValueError(f"Histogram bins must be even, got {bins}")
+        self.total_points = 0
+        self.matched_points = 0
+        self.deviations = 0
+        self.mean_deviation = 0.0
+        self.min_deviation = np.inf
+        self.max_deviation = -np.inf
+        self._m2 = 0.0
+        self.function_counts = {}
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.histogram_upper = 0.0  # set by the first deviations
+
+    @classmethod
+    def from_frame(cls, matched_points, total_points):
+        summary = cls()
+        summary.update(matched_points, total_points)
+        return summary
+
+    def update(self, matched_points, total_points):
+        """
+        Adds the matched points of a batch of total_points test points; matched_points may be
+        None or lack the 'delta_y' / 'ideal_func' columns, in which case only counts are kept.
+        """
+        self.total_points += total_points
+        if matched_points is None or len(matched_points) == 0:
+            return self
+        self.matched_points += len(matched_points)
+        if 'ideal_func' in matched_points.columns:
+            funcs, counts = np.unique(np.asarray(matched_points['ideal_func'], dtype=str), return_counts=True)
+            for func, count in zip(funcs.tolist(), counts.tolist()):
+                self.function_counts[func] = self.function_counts.get(func, 0) + count
+        if 'delta_y' in matched_points.columns:
+            deltas = np.asarray(matched_points['delta_y'], dtype=float)
+            deltas = deltas[~np.isnan(deltas)]
+            if len(deltas):
+                mean = deltas.mean()
+                self._combine(len(deltas), mean, float(np.sum((deltas - mean) ** 2)), deltas.min(), deltas.max())
+                self._add_to_histogram(deltas)
+        return self
+
+    def merge(self, other):
+        """Adds the counts and statistics of another ResultSummary with the same bin count; returns self."""
+        self.total_points += other.total_points
+        self.matched_points += other.matched_points
+        for func, count in other.function_counts.items():
+            self.function_counts[func] = self.function_counts.get(func, 0) + count
+        if other.deviations:
+            self._combine(other.deviations, other.mean_deviation, other._m2, other.min_deviation, other.max_deviation)
+            upper = max(self.histogram_upper, other.histogram_upper)
+            mine, _ = _grow_histogram(self.histogram, self.histogram_upper or upper, upper)
+            theirs, _ = _grow_histogram(other.histogram, other.histogram_upper, upper)
+            self.histogram, self.histogram_upper = mine + theirs, upper
+        return self
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total = self.deviations + count
+        delta = mean - self.mean_deviation
+        self.mean_deviation += float(delta * count / total)
+        self._m2 += float(m2) + float(delta) ** 2 * self.deviations * count / total
+        self.deviations = total
+        self.min_deviation = min(self.min_deviation, float(minimum))
+        self.max_deviation = max(self.max_deviation, float(maximum))
+
+    def _add_to_histogram(self, deltas):
+        largest = float(deltas.max())
+        if self.histogram_upper == 0.0:
+            self.histogram_upper = 2.0 ** np.ceil(np.log2(largest)) if largest > 0 else 1.0
+        self.histogram, self.histogram_upper = _grow_histogram(self.histogram, self.histogram_upper, largest)
+        self.histogram += np.histogram(deltas, bins=len(self.histogram), range=(0.0, self.histogram_upper))[0]
+
+    @property
+    def matching_rate(self):
+        """Matched share of the test points in percent."""
+        return self.matched_points / self.total_points * 100 if self.total_points else 0.0
+
+    @property
+    def std_deviation(self):
+        """Population standard deviation of the deviations."""
+        return float(np.sqrt(self._m2 / self.deviations)) if self.deviations else float('nan')
+
+    @property
+    def histogram_edges(self):
+        return np.linspace(0.0, self.histogram_upper, len(self.histogram) + 1)
+
+    def as_dict(self):
+        """Plain Python values, e.g. for JSON output."""
+        has_deviations = self.deviations > 0
+        return {
+            'total_points': self.total_points,
+            'matched_points': self.matched_points,
+            'matching_rate': self.matching_rate,
+            'mean_deviation': self.mean_deviation if has_deviations else None,
+            'std_deviation': self.std_deviation if has_deviations else None,
+            'min_deviation': self.min_deviation if has_deviations else None,
+            'max_deviation': self.max_deviation if has_deviations else None,
+            'function_counts': dict(self.function_counts),
+            'histogram': self.histogram.tolist(),
+            'histogram_edges': self.histogram_edges.tolist(),
+        }
+
+
+def decimate_minmax(x, y, groups=None, buckets=DECIMATION_BUCKETS):
+    """
+    Returns the sorted row positions of a min/max decimation of the points (x, y): the x range
+    is split into `buckets` equal buckets and, per bucket and group (e.g. ideal function), only
+    the points with the lowest and highest y are kept. The envelope of every group is preserved
+    and at most 2 * buckets points per group remain. Small inputs are returned unchanged.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    codes = np.zeros(len(x), dtype=np.intp) if groups is None else \
+        np.unique(np.asarray(groups, dtype=str), return_inverse=True)[1].reshape(-1)
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    if len(x) <= 2 * buckets * max(n_groups, 1):
+        return np.arange(len(x))
+
+    low, high = x.min(), x.max()
+    span = (high - low) or 1.0
+    bucket = np.minimum(((x - low) / span * buckets).astype(np.intp), buckets - 1)
+    key = codes * buckets + bucket
+    order = np.lexsort((y, key))
+    sorted_key = key[order]
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
@@ -0,0 +1,401 @@
+"""
+service.py
+Long-running assignment service for continuous test point feeds.
+The matched functions and their tolerances are computed once at start-up and kept resident as an
+AssignmentGrid. Incoming "x,y" lines are collected into micro-batches (closed by size or by a
+short time window) and assigned with the vectorized engine; matches are handed to a background
+thread that writes them to SQLite, so ingestion latency does not depend on commit times.
+
+Run `python -m src.service --help` for the command line options. Points are read from stdin by
+default, with one reply line per point on stdout, or from clients of a local TCP or Unix socket,
+which get their reply lines on the connection. Matched points are stored under a run ID.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+if __package__ in (None, ''):
+    # Allow `python src/service.py` as well as `python -m src.service` from the repository root.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_handler import TrainingDataHandler, IdealFunctionHandler, DataLoadError
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+from src.database_writer import DatabaseWriter, generate_run_id
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# A micro-batch is assigned when it holds DEFAULT_MAX_BATCH points or its oldest point has
+# waited DEFAULT_MAX_DELAY seconds, whichever comes first.
+DEFAULT_MAX_BATCH = 1024
+DEFAULT_MAX_DELAY = 0.005
+# Number of most recent point latencies used for the percentiles.
+LATENCY_WINDOW = 100000
+
+
+class BackgroundWriter:
+    """
+    Writes matched points to the database on a separate thread.
+    Frames queued while a commit is running are combined into one write, so the number of
+    commits adapts to the database speed instead of the batch rate.
+    """
+    def __init__(self, db_writer):
+        self.db_writer = db_writer
+        self.queue = queue.Queue()
+        self.written = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='matched-points-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, frame):
+        self.queue.put(frame)
+
+    def close(self):
+        """Writes everything still queued, stops the thread and re-raises a write error, if any."""
+        self.queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            frames = [self.queue.get()]
+            while True:
+                try:
+                    frames.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(frame is None for frame in frames)
+            frames = [frame for frame in frames if frame is not None]
+            if not frames or self.error is not None:
+                continue
+            try:
+                combined = pd.concat(frames, ignore_index=True)
+                self.db_writer.write_matched_points(combined)
+                self.written += len(combined)
+            except Exception as e:
+                # Keep draining the queue so producers never block; the error surfaces in close().
+                self.error = e
+
+
+class AssignmentService:
+    """
+    Assigns points submitted from coroutines in micro-batches against a resident grid.
+    Results are (ideal_func, delta_y) tuples, or None for points outside every tolerance.
+    Use `async with service:` (or start()/stop()) around submissions. When the db_writer has a
+    run_id, stop() records the run in the `runs` table with run_info (train_path, best_matches).
+    """
+    def __init__(self, assigner, db_writer=None, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY,
+                 run_info=None):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.grid = assigner.grid
+        self.db_writer = db_writer
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.run_info = run_info or {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.points = 0
+        self.matched = 0
+        self.batches = 0
+        self.writer = None
+        self._queue = None
+        self._task = None
+        self._started = None
+        self._stopped = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+        if self.db_writer is not None:
+            self.writer = BackgroundWriter(self.db_writer)
+        self._started = time.perf_counter()
+
+    async def stop(self):
+        """Assigns the points still queued and waits until all matches and the run record are written."""
+        await self._queue.put(None)
+        await self._task
+        if self.writer is not None:
+            await asyncio.to_thread(self.writer.close)
+            if self.db_writer.run_id is not None:
+                await asyncio.to_thread(self.db_writer.write_run, total_test_points=self.points,
+                                        matched_points=self.matched, **self.run_info)
+        self._stopped = time.perf_counter()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def submit_nowait(self, x, y):
+        """Queues one point and returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((float(x), float(y), time.perf_counter(), future))
+        return future
+
+    async def submit(self, x, y):
+        return await self.submit_nowait(x, y)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    # Take whatever is already queued before waiting for the time window.
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._assign_batch(batch)
+
+    def _assign_batch(self, batch):
+        x = np.fromiter((item[0] for item in batch), dtype=float, count=len(batch))
+        y = np.fromiter((item[1] for item in batch), dtype=float, count=len(batch))
+        rows, func_idx, delta = self.grid.assign(x, y)
+        results = [None] * len(batch)
+        for row, idx, dev in zip(rows.tolist(), func_idx.tolist(), delta.tolist()):
+            results[row] = (self.grid.ideal_cols[idx], dev)
+        now = time.perf_counter()
+        for (_, _, received, future), result in zip(batch, results):
+            self.latencies.append(now - received)
+            if not future.done():
+                future.set_result(result)
+        self.points += len(batch)
+        self.matched += len(rows)
+        self.batches += 1
+        if self.writer is not None and len(rows):
+            self.writer.put(self.grid.to_frame(x, y, rows, func_idx, delta))
+
+    def stats(self):
+        """Returns point/batch counts, throughput and p50/p99 latency (milliseconds)."""
+        end = self._stopped or time.perf_counter()
+        seconds = end - self._started if self._started is not None else 0.0
+        latencies = np.fromiter(self.latencies, dtype=float) * 1000.0
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'), float('nan'))
+        return {
+            'points': self.points,
+            'matched_points': self.matched,
+            'batches': self.batches,
+            'seconds': seconds,
+            'points_per_sec': self.points / seconds if seconds > 0 else 0.0,
+            'p50_ms': float(p50),
+            'p99_ms': float(p99),
+        }
+
+    async def serve_lines(self, reader, writer=None, max_pending=None):
+        """
+        Reads "x,y" lines from an asyncio StreamReader until EOF and submits them.
+        With a StreamWriter, replies "x,y,ideal_func,delta_y" per point in input order
+        (the last two fields are empty for unmatched points, "error" replies malformed lines).
+        """
+        pending = asyncio.Queue(maxsize=max_pending or 4 * self.max_batch)
+        responder = asyncio.create_task(self._respond(pending, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode().strip()
+                if not text or text.startswith('#'):
+                    continue
+                try:
+                    x, y = (float(value) for value in text.split(','))
+                except ValueError:
+                    await pending.put((text, None))
+                    continue
+                # Back-pressure: a client can only be this many replies ahead of the service.
+                await pending.put((text, self.submit_nowait(x, y)))
+        finally:
+            await pending.put(None)
+            await responder
+
+    @staticmethod
+    async def _respond(pending, writer):
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            text, future = item
+            if future is None:
+                reply = f"error,{text}"
+            else:
+                result = await future
+                reply = f"{text},," if result is None else f"{text},{result[0]},{result[1]!r}"
+            if writer is not None:
+                writer.write(reply.encode() + b"\n")
+                await writer.drain()
+
+
+def build_service(train_path, ideal_path, db_path="db/ideal.db", tolerance_func=None, cache_dir=None,
+                  max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY, run_id=None):
+    """
+    Loads the training data and candidate models, matches them once and returns an
+    AssignmentService writing to db_path (None: results are not stored) under run_id
+    (generated if not given).
+    """
+    train_manager = TrainingDataHandler(train_path, cache_dir=cache_dir)
+    train_manager.load()
+    candidate_manager = IdealFunctionHandler(ideal_path, cache_dir=cache_dir)
+    candidate_manager.load()
+    best_matches = FunctionMatcher(train_manager.data, candidate_manager.data).best_ideal_matches()
+    assigner = TestAssigner(None, candidate_manager.data, best_matches, train_manager.data,
+                            tolerance_func=tolerance_func)
+    db_writer = DatabaseWriter(db_path=db_path, bulk=True, run_id=run_id or generate_run_id()) if db_path else None
+    return AssignmentService(assigner, db_writer, max_batch=max_batch, max_delay=max_delay,
+                             run_info={'train_path': train_path, 'best_matches': best_matches})
+
+
+def _stdin_reader():
+    # A thread feeds stdin into a StreamReader; unlike connect_read_pipe this also works for files.
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    fd = sys.stdin.fileno()
+
+    def pump():
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                loop.call_soon_threadsafe(reader.feed_eof)
+                return
+            loop.call_soon_threadsafe(reader.feed_data, data)
+
+    threading.Thread(target=pump, name='stdin-reader', daemon=True).start()
+    return reader
+
+
+class _ReplyWriter:
+    # The part of asyncio.StreamWriter used by serve_lines, for a binary file such as stdout.
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        self.stream.write(data)
+
+    async def drain(self):
+        self.stream.flush()
+
+
+def format_stats(stats):
+    return (f"{stats['points']} points, {stats['matched_points']} matched in {stats['batches']} batches, "
+            f"{stats['points_per_sec']:,.0f} points/s, latency p50 {stats['p50_ms']:.3f} ms, "
+            f"p99 {stats['p99_ms']:.3f} ms")
+
+
+async def _report_periodically(service, interval, report):
+    while True:
+        await asyncio.sleep(interval)
+        report(format_stats(service.stats()))
+
+
+async def run_service(service, socket_path=None, port=None, host='127.0.0.1', stats_interval=None,
+                      report=print, output=None):
+    """
+    Serves points from stdin (until EOF), replying to output (a binary file, default: stdout),
+    or from socket clients (until cancelled), and returns the final stats.
+    """
+    async with service:
+        reporter = None
+        if stats_interval:
+            reporter = asyncio.create_task(_report_periodically(service, stats_interval, report))
+        try:
+            if socket_path is None and port is None:
+                await service.serve_lines(_stdin_reader(), _ReplyWriter(output or sys.stdout.buffer))
+            else:
+                async def handle(reader, writer):
+                    try:
+                        await service.serve_lines(reader, writer)
+                    finally:
+                        writer.close()
+
+                if socket_path is not None:
+                    server = await asyncio.start_unix_server(handle, path=socket_path)
+                else:
+                    server = await asyncio.start_server(handle, host=host, port=port)
+                report(f"Listening on {socket_path or f'{host}:{port}'}")
+                async with server:
+                    try:
+                        await server.serve_forever()
+                    except asyncio.CancelledError:
+                        pass
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+    stats = service.stats()
+    report(format_stats(stats))
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Assign a continuous feed of test points to ideal functions.")
+    parser.add_argument('--train', default="data/train.csv", help="training data CSV")
+    parser.add_argument('--ideal', default="data/ideal.csv", help="ideal functions (candidate models) CSV")
+    parser.add_argument('--db', default="db/ideal.db",
+                        help="SQLite database file for the matched points ('' to only reply)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--socket', help="listen on this Unix socket instead of reading stdin")
+    source.add_argument('--port', type=int, help="listen on this TCP port (localhost) instead of reading stdin")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help="points per micro-batch")
+    parser.add_argument('--max-delay', type=float, default=DEFAULT_MAX_DELAY,
+                        help="seconds a point may wait for its micro-batch to fill")
+    parser.add_argument('--stats-interval', type=float, help="report latency and throughput every N seconds")
+    parser.add_argument('--run-id', help="run ID stored with the matched points (default: generated)")
+    parser.add_argument('--cache-dir', help="binary cache directory for the training/ideal CSVs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    def report(message):
+        print(message, file=sys.stderr, flush=True)
+
+    # stdout carries only the replies to stdin points; progress messages of the loaders and the
+    # database writer go to stderr with the service reports.
+    replies = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            service = build_service(args.train, args.ideal, args.db or None, cache_dir=args.cache_dir,
+                                    max_batch=args.max_batch, max_delay=args.max_delay, run_id=args.run_id)
+        except DataLoadError as e:
+            report(f"Failed to load one or more datasets: {e}")
+            return 1
+        if service.db_writer is not None:
+            report(f"Storing matched points under run ID {service.db_writer.run_id}")
+        try:
+            asyncio.run(run_service(service, socket_path=args.socket, port=args.port,
+                                    stats_interval=args.stats_interval, report=report, output=replies))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+streaming.py
+Streaming mode for the assignment pipeline.
+The test CSV is read in chunks, each chunk is assigned against the in-memory candidate/training
+grid and the matches are appended to the database right away, so peak memory depends on the
+chunk size instead of the size of the test feed.
+run_pipeline(chunk_size=...) in main.py (`--chunk-size` on the command line) runs the whole
+workflow this way.
+"""
+
+import time
+from contextlib import nullcontext
+
+from src.reporting import ResultSummary
+
+# Test points per chunk when no chunk size is given.
+DEFAULT_STREAM_CHUNK_SIZE = 100000
+
+
+def stream_assign(test_handler, assigner, db_writer, chunk_size=DEFAULT_STREAM_CHUNK_SIZE, report=print,
+                  exporter=None):
+    """
+    Assigns the test data of test_handler chunk by chunk and appends matches to matched_points
+    (and to the Parquet files of exporter, if given).
+    Progress and throughput are reported once per chunk through `report`.
+    Returns a summary dict with point counts, chunk count, elapsed seconds and the ResultSummary
+    of all chunks ('result_summary').
+    """
+    total_points = 0
+    total_matched = 0
+    chunks = 0
+    result_summary = ResultSummary()
+    start = time.perf_counter()
+    # A ParallelAssigner keeps one worker pool and one shared copy of the grid for all chunks.
+    with assigner.session() if hasattr(assigner, 'session') else nullcontext():
+        for chunk in test_handler.iter_chunks(chunk_size):
+            chunk_start = time.perf_counter()
+            matched = assigner.assign_frame(chunk)
+            if not matched.empty:
+                db_writer.write_matched_points(matched)
+                if exporter is not None:
+                    exporter.write_matched_points(matched)
+            result_summary.update(matched, len(chunk))
+            chunk_seconds = time.perf_counter() - chunk_start
+
+            chunks += 1
+            total_points += len(chunk)
+            total_matched += len(matched)
+            rate = len(chunk) / chunk_seconds if chunk_seconds > 0 else float('inf')
+            report(f"Chunk {chunks}: {len(chunk)} points, {len(matched)} matched, "
+                   f"{rate:,.0f} points/s ({total_points} points so far)")
+
+    return {
+        'chunks': chunks,
+        'total_points': total_points,
+        'matched_points': total_matched,
+        'seconds': time.perf_counter() - start,
+        'result_summary': result_summary,
+    }
+
@@ -4,33 +4,245 @@ Assigns each test point to the closest candidate model if within tolerance.
 Encapsulates assignment logic for clarity and future extension.
 """
 
-import pandas as pd
 import numpy as np
 
+from src.lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+ASSIGNMENT_COLUMNS = ['x', 'y', 'ideal_func', 'delta_y']
+
+
+def calculate_tolerance(max_deviation):
+    """
+    Returns the tolerance for assignment based on max deviation.
+    This makes the assignment logic flexible for future changes.
+    Works on scalars and arrays alike; it is the default tolerance_func everywhere.
+    """
+    return (2 ** 0.5) * max_deviation
+
+
+def _unique_grid(x_values):
+    """
+    Returns the sorted unique x values and the row of the first occurrence of each value.
+    Using the first occurrence mirrors the `.values[0]` lookup of the row-wise engine.
+    """
+    return np.unique(np.asarray(x_values, dtype=float), return_index=True)
+
+
+class AssignmentGrid:
+    """
+    Candidate and training values of the matched functions aligned on one sorted x grid.
+    The grid is built once per run, so every test point is matched with array operations
+    instead of rescanning the candidate and training tables.
+
+    With interpolate=True, test x values between grid points are also assigned: candidate and
+    training values are linearly interpolated at x and the tolerance is derived from them
+    (or taken from global_tolerance, one value per match, when a global table is used).
+    A pointwise table only caches the tolerances at the grid points, which are the same
+    derived values, so it does not change interpolated results.
+
+    kernel ('auto', 'numba' or 'numpy', see kernels.py) assigns grid points with a fused
+    first-hit kernel instead of comparing every point with every match; interpolated
+    assignment always uses the array comparison.
+    """
+    def __init__(self, x, candidate_y, tolerance, ideal_cols, training_y=None, tolerance_func=None,
+                 interpolate=False, global_tolerance=None, kernel=None):
+        if interpolate and training_y is None:
+            raise ValueError("Interpolating assignment needs the training values on the grid")
+        self.x = x                      # sorted grid, shape (m,)
+        self.candidate_y = candidate_y  # matched candidate values, shape (m, k)
+        self.tolerance = tolerance      # allowed deviation per grid point and match, shape (m, k)
+        self.ideal_cols = list(ideal_cols)
+        self.training_y = training_y    # matched training values, shape (m, k)
+        self.tolerance_func = tolerance_func or calculate_tolerance
+        self.interpolate = interpolate
+        self.global_tolerance = global_tolerance
+        self.kernel = kernel
+
+    @classmethod
+    def from_frames(cls, candidate_models, training_data, best_matches, tolerance_func=None, interpolate=False,
+                    tolerance_table=None, kernel=None):
+        """
+        Builds the grid from the candidate and training DataFrames.
+        Only x values present in both tables are kept, as the row-wise engine skips the rest;
+        in interpolation mode these shared x values are the interpolation nodes.
+        A precomputed ToleranceTable (see tolerance.py) replaces the tolerance computation.
+        """
+        tolerance_func = tolerance_func or calculate_tolerance
+        ideal_cols = [match['ideal_col'] for match in best_matches]
+        train_cols = [match['train_col'] for match in best_matches]
+
+        cand_x, cand_rows = _unique_grid(candidate_models['x'])
+        train_x, train_rows = _unique_grid(training_data['x'])
+        # Sorted-index join of the two x axes (NaN never matches, just like `==`).
+        grid_x, cand_idx, train_idx = np.intersect1d(cand_x, train_x, assume_unique=True, return_indices=True)
+
+        candidate_y = candidate_models[ideal_cols].to_numpy(dtype=float)[cand_rows[cand_idx]]
+        train_y = training_data[train_cols].to_numpy(dtype=float)[train_rows[train_idx]]
+        global_tolerance = None
+        if tolerance_table is not None:
+            if not tolerance_table.matches(best_matches):
+                raise ValueError("Tolerance table was built for different best matches")
+            tolerance = tolerance_table.on_grid(grid_x)
+            if tolerance_table.mode == 'global':
+                global_tolerance = tolerance_table.tolerance
+        else:
+            max_dev = np.abs(train_y - candidate_y)
+            tolerance = np.broadcast_to(np.asarray(tolerance_func(max_dev), dtype=float), max_dev.shape)
+        return cls(grid_x, candidate_y, tolerance, ideal_cols, training_y=train_y, tolerance_func=tolerance_func,
+                   interpolate=interpolate, global_tolerance=global_tolerance, kernel=kernel)
+
+    def locate(self, x):
+        """
+        Maps test x values onto grid positions with a binary search.
+        Returns the positions and a mask telling which x values exist on the grid.
+        """
+        x = np.asarray(x, dtype=float)
+        if len(self.x) == 0:
+            return np.zeros(len(x), dtype=np.intp), np.zeros(len(x), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.x, x), len(self.x) - 1)
+        found = self.x[pos] == x
+        return pos, found
+
+    def interpolate_at(self, x, *arrays):
+        """
+        Locates x values between grid nodes with a binary search and linearly interpolates the
+        given (m, k) grid arrays there (default: candidate and training values). Returns (rows
+        inside the grid range, *interpolated arrays). Values at a node are returned exactly,
+        without rounding.
+        """
+        arrays = arrays or (self.candidate_y, self.training_y)
+        x = np.asarray(x, dtype=float)
+        if len(self.x) < 2:
+            # Nothing to interpolate between; only exact hits remain.
+            pos, found = self.locate(x)
+            rows = np.nonzero(found)[0]
+            return (rows, *(values[pos[rows]] for values in arrays))
+        rows = np.nonzero((x >= self.x[0]) & (x <= self.x[-1]))[0]
+        x = x[rows]
+        right = np.clip(np.searchsorted(self.x, x, side='right'), 1, len(self.x) - 1)
+        left = right - 1
+        weight = ((x - self.x[left]) / (self.x[right] - self.x[left]))[:, None]
+
+        def lerp(values):
+            low, high = values[left], values[right]
+            mixed = low + weight * (high - low)
+            return np.where(weight == 0, low, np.where(weight == 1, high, mixed))
+
+        return (rows, *(lerp(values) for values in arrays))
+
+    def assign(self, x, y):
+        """
+        Assigns test points given as arrays.
+        Returns the indices of the matched points, the index of the chosen match for each
+        of them and the corresponding deviations. The first match (in best_matches order)
+        within tolerance wins, exactly like the row-wise engine.
+        """
+        y = np.asarray(y, dtype=float)
+        if self.interpolate:
+            if self.global_tolerance is not None:
+                rows, candidate_y = self.interpolate_at(x, self.candidate_y)
+                tolerance = self.global_tolerance
+            else:
+                rows, candidate_y, training_y = self.interpolate_at(x)
+                max_dev = np.abs(training_y - candidate_y)
+                tolerance = np.broadcast_to(np.asarray(self.tolerance_func(max_dev), dtype=float), max_dev.shape)
+        elif self.kernel is not None:
+            from src.kernels import first_hit
+            pos, found = self.locate(x)
+            return first_hit(y, np.where(found, pos, -1), self.candidate_y, self.tolerance, self.kernel)
+        else:
+            pos, found = self.locate(x)
+            rows = np.nonzero(found)[0]
+            pos = pos[rows]
+            candidate_y, tolerance = self.candidate_y[pos], self.tolerance[pos]
+        delta = np.abs(y[rows, None] - candidate_y)
+        within = delta <= tolerance
+        hit = within.any(axis=1)
+        func_idx = within.argmax(axis=1)[hit]
+        rows = rows[hit]
+        return rows, func_idx, delta[hit, func_idx]
+
+    def to_frame(self, x, y, rows, func_idx, delta):
+        """Builds the `['x', 'y', 'ideal_func', 'delta_y']` result frame for matched points."""
+        return pd.DataFrame({
+            'x': np.asarray(x)[rows],
+            'y': np.asarray(y)[rows],
+            'ideal_func': np.asarray(self.ideal_cols, dtype=object)[func_idx],
+            'delta_y': delta,
+        }, columns=ASSIGNMENT_COLUMNS)
+
+
 class TestAssigner:
     """
     Assigns test points to candidate models based on deviation tolerance.
     Modular design allows for easy changes to assignment logic.
+
+    engine='vectorized' (default) aligns all test points to the candidate grid at once;
+    engine='rowwise' keeps the original per-point lookups for reference and debugging.
+    engine='fused' is the vectorized engine with the first-hit kernel of kernels.py (compiled
+    with numba when installed), which stops at the first match within tolerance per point.
+    interpolate=True (vectorized engine only) also assigns test points whose x lies between
+    grid values, using linearly interpolated candidate and training values.
+    tolerance_table (a ToleranceTable from tolerance.py) reuses precomputed tolerances.
     """
-    def __init__(self, test_data, candidate_models, best_matches, training_data, tolerance_func=None):
+    ENGINES = ('vectorized', 'rowwise', 'fused')
+
+    def __init__(self, test_data, candidate_models, best_matches, training_data, tolerance_func=None,
+                 engine='vectorized', interpolate=False, tolerance_table=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown assignment engine '{engine}', expected one of {self.ENGINES}")
+        if engine == 'rowwise' and (interpolate or tolerance_table is not None):
+            raise ValueError("Interpolation and tolerance tables require the vectorized engine")
         self.test_data = test_data
         self.candidate_models = candidate_models
         self.best_matches = best_matches
         self.training_data = training_data
         self.tolerance_func = tolerance_func
+        self.engine = engine
+        self.interpolate = interpolate
+        self.tolerance_table = tolerance_table
+        self._grid = None
+
+    @property
+    def grid(self):
+        # Built lazily and reused, so chunked callers pay the alignment cost only once.
+        if self._grid is None:
+            self._grid = AssignmentGrid.from_frames(
+                self.candidate_models, self.training_data, self.best_matches, self.tolerance_func,
+                interpolate=self.interpolate, tolerance_table=self.tolerance_table,
+                kernel='auto' if self.engine == 'fused' else None
+            )
+        return self._grid
 
     def assign(self):
         """
         Assigns each test point to a candidate model if deviation is within tolerance.
         Returns a DataFrame of matched points.
         """
+        if self.engine == 'rowwise':
+            return self._assign_rowwise()
+        return self.assign_frame(self.test_data)
+
+    def assign_frame(self, test_frame):
+        """
+        Assigns the points of any DataFrame (or CompactTable) with 'x' and 'y' columns using the
+        vectorized engine. Matched points keep their input order.
+        """
+        x = np.asarray(test_frame['x'], dtype=float)
+        y = np.asarray(test_frame['y'], dtype=float)
+        rows, func_idx, delta = self.grid.assign(x, y)
+        return self.grid.to_frame(x, y, rows, func_idx, delta)
+
+    def _assign_rowwise(self):
         assigned = []
         for idx, row in self.test_data.iterrows():
             x_val, y_val = row['x'], row['y']
             match_info = self._find_assignment(x_val, y_val)
             if match_info:
                 assigned.append(match_info)
-        return pd.DataFrame(assigned, columns=['x', 'y', 'ideal_func', 'delta_y'])
+        return pd.DataFrame(assigned, columns=ASSIGNMENT_COLUMNS)
 
     def _find_assignment(self, x_val, y_val):
         """
@@ -50,7 +262,7 @@ class TestAssigner:
                 continue
             train_y = train_row[train_col].values[0]
             max_dev = abs(train_y - candidate_y)
-            tolerance = self.tolerance_func(max_dev) if self.tolerance_func else (2 ** 0.5) * max_dev
+            tolerance = (self.tolerance_func or calculate_tolerance)(max_dev)
             if delta_y <= tolerance:
                 return {'x': x_val, 'y': y_val, 'ideal_func': candidate_col, 'delta_y': delta_y}
-        return None
\ No newline at end of file
+        return None
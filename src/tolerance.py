@@ -0,0 +1,174 @@
+"""
+tolerance.py
+Precomputed tolerance tables for the assignment step.
+The allowed deviation of every matched function only depends on the training data and the
+chosen candidate, so it is computed once after matching instead of once per test point.
+Tables can be saved together with the match results and reused by later assignment runs;
+they carry the content fingerprints of the training and candidate data they were built from
+and a key of the tolerance function that computed them.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from src.data_loader import dataset_fingerprint
+from src.test_assigner import AssignmentGrid, calculate_tolerance
+
+TOLERANCE_MODES = ('pointwise', 'global')
+
+
+def tolerance_func_key(tolerance_func):
+    """
+    Identifies a tolerance function for reusing saved tables: 'default' for calculate_tolerance
+    (or None), the qualified name and a bytecode hash for other module-level functions, and None
+    for lambdas, closures and callables without code, whose tables are never reused.
+    """
+    if tolerance_func is None or tolerance_func is calculate_tolerance:
+        return 'default'
+    code = getattr(tolerance_func, '__code__', None)
+    qualname = getattr(tolerance_func, '__qualname__', '')
+    if code is None or '<' in qualname:
+        return None
+    digest = hashlib.sha256(code.co_code + repr(code.co_consts).encode()).hexdigest()[:16]
+    return f"{tolerance_func.__module__}.{qualname}:{digest}"
+
+
+def _match_key(best_matches):
+    # The parts of a match that define a tolerance table (min_sse is informational only).
+    return [(match['train_col'], match['ideal_col']) for match in best_matches]
+
+
+class ToleranceTable:
+    """
+    Tolerances for each (training column, ideal column) pair in best_matches.
+
+    mode='pointwise' keeps tolerance_func(|train_y - ideal_y|) for every shared x value,
+    which is what TestAssigner uses by default.
+    mode='global' keeps a single tolerance_func(max |train_y - ideal_y|) per match, the
+    maximum deviation over the whole training range.
+    fingerprints is (training fingerprint, candidate fingerprint) of the data the table was
+    built from and tolerance_key the tolerance_func_key() of its tolerance function (None for
+    tables of unknown origin, which are never reused).
+    """
+    def __init__(self, best_matches, mode, x, tolerance, fingerprints=None, tolerance_key=None):
+        if mode not in TOLERANCE_MODES:
+            raise ValueError(f"Unknown tolerance mode '{mode}', expected one of {TOLERANCE_MODES}")
+        self.best_matches = best_matches
+        self.mode = mode
+        self.x = x                  # shared x grid, shape (m,)
+        self.tolerance = tolerance  # shape (m, k) for pointwise, (k,) for global
+        self.fingerprints = tuple(fingerprints) if fingerprints is not None else None
+        self.tolerance_key = tolerance_key
+
+    @classmethod
+    def build(cls, training_data, candidate_models, best_matches, tolerance_func=None, mode='pointwise',
+              fingerprints=None):
+        """
+        Computes the table from the training data and candidate models of a matching run.
+        Pass fingerprints if the dataset fingerprints of both are already known.
+        """
+        fingerprints = fingerprints or data_fingerprints(training_data, candidate_models)
+        grid = AssignmentGrid.from_frames(candidate_models, training_data, best_matches, tolerance_func)
+        if mode == 'global':
+            tolerance_func = tolerance_func or calculate_tolerance
+            max_dev = np.nanmax(np.abs(grid.training_y - grid.candidate_y), axis=0, initial=0.0)
+            tolerance = np.asarray(tolerance_func(max_dev), dtype=float)
+        else:
+            tolerance = np.ascontiguousarray(grid.tolerance)
+        return cls(best_matches, mode, grid.x, tolerance, fingerprints, tolerance_func_key(tolerance_func))
+
+    def matches(self, best_matches, fingerprints=None):
+        """
+        True if this table was built for the same training/ideal column pairs and, if
+        fingerprints are given, from the same training and candidate data.
+        """
+        if fingerprints is not None and self.fingerprints != tuple(fingerprints):
+            return False
+        return _match_key(self.best_matches) == _match_key(best_matches)
+
+    def reusable_for(self, tolerance_func):
+        """True if the table was computed with tolerance_func (None: calculate_tolerance)."""
+        return self.tolerance_key is not None and self.tolerance_key == tolerance_func_key(tolerance_func)
+
+    def on_grid(self, grid_x):
+        """
+        Returns the tolerances aligned to grid_x as an (m, k) array (a broadcast view in
+        global mode). Grid x values the table does not cover get NaN, i.e. never match.
+        """
+        grid_x = np.asarray(grid_x, dtype=float)
+        if self.mode == 'global':
+            return np.broadcast_to(self.tolerance, (len(grid_x), len(self.tolerance)))
+        aligned = np.full((len(grid_x), self.tolerance.shape[1]), np.nan)
+        if len(self.x):
+            pos = np.minimum(np.searchsorted(self.x, grid_x), len(self.x) - 1)
+            found = self.x[pos] == grid_x
+            aligned[found] = self.tolerance[pos[found]]
+        return aligned
+
+    def save(self, path):
+        """Saves the table and the match results it belongs to as a compressed .npz file."""
+        with open(path, 'wb') as f:
+            self._write(f)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a table saved with save(); the match results are available as .best_matches."""
+        with open(path, 'rb') as f:
+            return cls._read(f)
+
+    def to_bytes(self):
+        """Serialises the table like save(), for storage in a database column."""
+        buffer = io.BytesIO()
+        self._write(buffer)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload):
+        return cls._read(io.BytesIO(payload))
+
+    def _write(self, f):
+        matches = [
+            {'train_col': m['train_col'], 'ideal_col': m['ideal_col'], 'min_sse': float(m.get('min_sse', np.nan))}
+            for m in self.best_matches
+        ]
+        np.savez_compressed(f, x=self.x, tolerance=self.tolerance, mode=np.array(self.mode),
+                            best_matches=np.array(json.dumps(matches)),
+                            fingerprints=np.array(json.dumps(self.fingerprints)),
+                            tolerance_key=np.array(json.dumps(self.tolerance_key)))
+
+    @classmethod
+    def _read(cls, f):
+        with np.load(f) as data:
+            # Tables saved before fingerprints were stored have none and are rebuilt on reuse.
+            fingerprints = json.loads(str(data['fingerprints'])) if 'fingerprints' in data.files else None
+            tolerance_key = json.loads(str(data['tolerance_key'])) if 'tolerance_key' in data.files else None
+            return cls(json.loads(str(data['best_matches'])), str(data['mode']), data['x'], data['tolerance'],
+                       fingerprints, tolerance_key)
+
+
+def data_fingerprints(training_data, candidate_models):
+    """Returns the (training, candidate) dataset fingerprints a tolerance table is keyed by."""
+    return dataset_fingerprint(training_data), dataset_fingerprint(candidate_models)
+
+
+def load_or_build_tolerance_table(path, training_data, candidate_models, best_matches, tolerance_func=None,
+                                  mode='pointwise', fingerprints=None):
+    """
+    Returns the tolerance table saved at path if it belongs to the same best matches, mode,
+    training/candidate data (by content fingerprint) and tolerance function; otherwise builds a
+    new one and saves it there (path may be None to skip saving). Pass fingerprints if they are
+    already known.
+    """
+    fingerprints = fingerprints or data_fingerprints(training_data, candidate_models)
+    if path and os.path.exists(path):
+        table = ToleranceTable.load(path)
+        if table.mode == mode and table.matches(best_matches, fingerprints) and table.reusable_for(tolerance_func):
+            return table
+    table = ToleranceTable.build(training_data, candidate_models, best_matches, tolerance_func, mode, fingerprints)
+    if path:
+        table.save(path)
+    return table
@@ -0,0 +1,166 @@
+"""
+visualization.py
+Static (Matplotlib) and interactive (Bokeh) plots of the matching and assignment results.
+Both libraries are imported inside the functions, so headless runs that skip plotting never
+pay their import or render cost. Plots are written to files; blocking windows and browser
+tabs are only opened when show=True.
+Histograms are drawn from the binned counts of a ResultSummary and the Bokeh scatter from a
+min/max decimation of the matched points, so report size and render time do not grow with the
+number of test points.
+"""
+
+import os
+
+import numpy as np
+
+from src.reporting import DECIMATION_BUCKETS, ResultSummary, decimate_minmax
+
+MATPLOTLIB_OVERLAY_FILE = "matplotlib_overlays.png"
+MATPLOTLIB_HISTOGRAM_FILE = "matplotlib_deviation_histogram.png"
+BOKEH_REPORT_FILE = "ideal_function_bokeh_visualizations.html"
+
+
+def _pyplot(show):
+    import matplotlib
+    if not show:
+        # A non-interactive backend never opens windows and starts faster.
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def visualize_with_matplotlib(training_data, candidate_models, best_matches, output_dir=".", show=False):
+    """
+    Visualizes training functions vs. candidate models and deviation histogram.
+    This helps users understand the matching and assignment quality.
+    Returns the path of the saved figure.
+    """
+    plt = _pyplot(show)
+    n_rows = max(1, (len(best_matches) + 1) // 2)
+    fig, axes = plt.subplots(n_rows, 2, figsize=(12, 4 * n_rows))
+    axes = np.atleast_1d(axes).flatten()
+    for ax, ideal_info in zip(axes, best_matches):
+        train_col = ideal_info['train_col']
+        ax.plot(training_data['x'], training_data[train_col], 'o-', label=f'Training {train_col}')
+        candidate_col = ideal_info.get('ideal_col')
+        if candidate_col and candidate_col in candidate_models.columns:
+            ax.plot(candidate_models['x'], candidate_models[candidate_col], '--', label=f'Candidate {candidate_col}')
+            ax.set_title(f'Matplotlib Overlay: {train_col} vs. {candidate_col}')
+        else:
+            ax.set_title(f"Column {candidate_col} not found")
+            continue
+        ax.set_xlabel('x')
+        ax.set_ylabel('y')
+        ax.legend()
+    plt.tight_layout()
+    path = os.path.join(output_dir, MATPLOTLIB_OVERLAY_FILE)
+    fig.savefig(path)
+    if show:
+        plt.show()
+    plt.close(fig)
+    return path
+
+
+def visualize_deviation_histogram(summary, output_dir=".", show=False):
+    """
+    Plots histogram of deviations to show assignment quality.
+    summary is a ResultSummary (a matched points DataFrame is summarised first).
+    Returns the path of the saved figure, or None if there is nothing to plot.
+    """
+    if not isinstance(summary, ResultSummary):
+        if 'delta_y' not in summary.columns:
+            print("Column 'delta_y' not found in matched_points. Histogram skipped.")
+            return None
+        summary = ResultSummary.from_frame(summary, len(summary))
+    if not summary.deviations:
+        print("No deviations to plot. Histogram skipped.")
+        return None
+    plt = _pyplot(show)
+    fig = plt.figure(figsize=(7, 4))
+    plt.stairs(summary.histogram, summary.histogram_edges, fill=True, color='skyblue', edgecolor='black')
+    plt.title('Matplotlib Histogram: Test Point Deviations')
+    plt.xlabel('Deviation (|y_test - y_candidate|)')
+    plt.ylabel('Count')
+    plt.tight_layout()
+    path = os.path.join(output_dir, MATPLOTLIB_HISTOGRAM_FILE)
+    fig.savefig(path)
+    if show:
+        plt.show()
+    plt.close(fig)
+    return path
+
+
+def visualize_with_bokeh(training_data, candidate_models, best_matches, matched_points, output_dir=".", show=False,
+                         summary=None, decimation_buckets=DECIMATION_BUCKETS):
+    """
+    Builds the interactive Bokeh report: overlays, assignment scatter and deviation histogram.
+    The scatter shows at most 2 * decimation_buckets points per ideal function (the lowest and
+    highest y per x bucket); the histogram comes from summary (built from matched_points if None).
+    The report is saved as HTML; show=True also opens it in a browser.
+    Returns the path of the HTML file.
+    """
+    from bokeh.plotting import figure, output_file, save
+    from bokeh.plotting import show as show_in_browser
+    from bokeh.layouts import gridplot, column
+    from bokeh.palettes import Category10
+    from bokeh.models import ColumnDataSource, Div
+
+    path = os.path.join(output_dir, BOKEH_REPORT_FILE)
+    output_file(path)
+
+    plots = []
+    for ideal_info in best_matches:
+        train_col = ideal_info['train_col']
+        candidate_col = ideal_info.get('ideal_col')
+        p = figure(title=f"Bokeh Overlay: {train_col} vs. {candidate_col}", width=400, height=300, x_axis_label='x', y_axis_label='y')
+        p.line(training_data['x'], training_data[train_col], legend_label=f"Training {train_col}", color="blue", line_width=2)
+        if candidate_col and candidate_col in candidate_models.columns:
+            p.line(candidate_models['x'], candidate_models[candidate_col], legend_label=f"Candidate {candidate_col}", color="red", line_dash="dashed", line_width=2)
+        p.legend.location = "top_left"
+        plots.append(p)
+    grid = gridplot([plots[i:i + 2] for i in range(0, len(plots), 2)])
+
+    if matched_points is not None and 'ideal_func' in matched_points.columns:
+        unique_funcs = matched_points['ideal_func'].unique()
+        color_map = {func: Category10[10][i % 10] for i, func in enumerate(unique_funcs)}
+        # Only the decimated points are embedded in the HTML file.
+        shown = matched_points.iloc[decimate_minmax(matched_points['x'], matched_points['y'],
+                                                    matched_points['ideal_func'], decimation_buckets)]
+        source = ColumnDataSource(data=dict(
+            x=shown['x'],
+            y=shown['y'],
+            ideal_func=shown['ideal_func'],
+            color=shown['ideal_func'].map(color_map)
+        ))
+        title = "Bokeh Scatter: Test Point Assignments"
+        if len(shown) < len(matched_points):
+            title += f" ({len(shown)} of {len(matched_points)} points, min/max per x bucket)"
+        p_scatter = figure(title=title, width=600, height=400, x_axis_label='x', y_axis_label='y', tools="pan,wheel_zoom,box_zoom,reset,hover")
+        p_scatter.scatter('x', 'y', color='color', legend_field='ideal_func', source=source, size=8)
+        p_scatter.legend.title = "Candidate Model"
+        p_scatter.legend.location = "top_left"
+    else:
+        p_scatter = Div(text="<b>Bokeh Scatter: Test Point Assignments</b><br>Column 'ideal_func' not found in matched_points. Scatter plot skipped.")
+
+    if summary is None and matched_points is not None:
+        summary = ResultSummary.from_frame(matched_points, len(matched_points))
+    if summary is not None and summary.deviations:
+        hist, edges = summary.histogram, summary.histogram_edges
+        p_hist = figure(title="Bokeh Histogram: Test Point Deviations", width=600, height=400, x_axis_label='Deviation', y_axis_label='Count')
+        p_hist.quad(top=hist, bottom=0, left=edges[:-1], right=edges[1:], fill_color="skyblue", line_color="black")
+    else:
+        p_hist = Div(text="<b>Bokeh Histogram: Test Point Deviations</b><br>No deviations to plot. Histogram skipped.")
+
+    layout = column(
+        Div(text="<h2>Bokeh Overlay: Training vs. Candidate Models</h2>"),
+        grid,
+        Div(text="<h2>Bokeh Scatter: Test Point Assignments</h2>"),
+        p_scatter,
+        Div(text="<h2>Bokeh Histogram: Test Point Deviations</h2>"),
+        p_hist
+    )
+    if show:
+        show_in_browser(layout)
+    else:
+        save(layout)
+    return path
@@ -0,0 +1,12 @@
+import pandas as pd
+import pytest
+from src.function_matcher import FunctionMatcher
+
+@pytest.fixture
+def sample_data():
+    """The bundled training, ideal and test data with their best matches."""
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    return train, ideal, test, matches
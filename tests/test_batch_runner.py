@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import sqlite3
+import pandas as pd
+import pytest
+from src import batch_runner
+from src.batch_runner import read_manifest, run_batch
+from src.data_handler import IdealFunctionHandler
+
+DATA_DIR = os.path.abspath("data")
+
+def read_table(db_path, query):
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql_query(query, conn)
+
+@pytest.fixture
+def manifest(tmp_path):
+    # Two pairs with the sample data: the second uses a subset of the test points.
+    shutil.copy(os.path.join(DATA_DIR, "train.csv"), tmp_path / "train.csv")
+    shutil.copy(os.path.join(DATA_DIR, "test.csv"), tmp_path / "test.csv")
+    pd.read_csv(tmp_path / "test.csv").head(40).to_csv(tmp_path / "test_small.csv", index=False)
+    path = tmp_path / "manifest.csv"
+    path.write_text("name,train,test,run_id\nfull,train.csv,test.csv,run-full\nsmall,train.csv,test_small.csv,\n")
+    return str(path)
+
+def test_read_manifest_resolves_paths_and_fills_defaults(tmp_path, manifest):
+    jobs = read_manifest(manifest)
+    assert [job['name'] for job in jobs] == ['full', 'small']
+    assert jobs[0]['run_id'] == 'run-full' and jobs[1]['run_id']
+    assert jobs[1]['test'] == os.path.join(str(tmp_path), "test_small.csv")
+
+    json_manifest = tmp_path / "manifest.json"
+    json_manifest.write_text(json.dumps([{'train': 'train.csv', 'test': 'test.csv'}]))
+    assert read_manifest(str(json_manifest))[0]['name'] == 'job-1'
+
+    json_manifest.write_text(json.dumps([{'train': 'train.csv'}]))
+    with pytest.raises(ValueError, match="entry 1"):
+        read_manifest(str(json_manifest))
+
+def test_sequential_batch_loads_catalog_once(tmp_path, manifest, monkeypatch):
+    loads = []
+    load_compact = IdealFunctionHandler.load_compact
+    monkeypatch.setattr(IdealFunctionHandler, 'load_compact',
+                        lambda self, *args: loads.append(self.filepath) or load_compact(self, *args))
+    db_path = str(tmp_path / "batch.db")
+    summary = run_batch(manifest, os.path.join(DATA_DIR, "ideal.csv"), db_path, report=lambda line: None)
+
+    assert len(loads) == 1
+    assert summary['failed'] == 0
+    full, small = summary['jobs']
+    assert full['total_test_points'] == 100 and small['total_test_points'] == 40
+    counts = read_table(db_path, "SELECT run_id, COUNT(*) AS n FROM matched_points GROUP BY run_id")
+    assert dict(zip(counts['run_id'], counts['n'])) == {'run-full': full['matched_points'],
+                                                        small['run_id']: small['matched_points']}
+    runs = read_table(db_path, "SELECT * FROM runs WHERE run_id = 'run-full'")
+    assert json.loads(runs['best_matches'][0]) == json.loads(json.dumps(full['best_matches']))
+    assert len(read_table(db_path, "SELECT * FROM ideal_functions")) == 400
+
+def test_parallel_batch_matches_sequential_and_reports_failures(tmp_path, manifest):
+    ideal_path = os.path.join(DATA_DIR, "ideal.csv")
+    entries = read_manifest(manifest) + [{'name': 'missing', 'train': str(tmp_path / "nope.csv"),
+                                         'test': str(tmp_path / "test.csv"), 'run_id': 'run-missing'}]
+    lines = []
+    parallel = run_batch(entries, ideal_path, str(tmp_path / "parallel.db"), workers=2, report=lines.append)
+    sequential = run_batch(entries, ideal_path, str(tmp_path / "sequential.db"), report=lambda line: None)
+
+    assert parallel['failed'] == sequential['failed'] == 1
+    assert [job['name'] for job in parallel['jobs']] == ['full', 'small', 'missing']
+    assert 'error' in parallel['jobs'][2] and lines[-1].startswith("missing: FAILED")
+    for ours, theirs in zip(parallel['jobs'][:2], sequential['jobs'][:2]):
+        assert ours['best_matches'] == theirs['best_matches']
+        assert ours['matched_points'] == theirs['matched_points']
+    runs = read_table(str(tmp_path / "parallel.db"), "SELECT run_id FROM runs ORDER BY run_id")
+    assert sorted(runs['run_id']) == sorted(job['run_id'] for job in parallel['jobs'][:2])
+
+def test_job_errors_do_not_stop_the_batch(tmp_path, manifest):
+    # 200 training rows do not fit the 400-row catalog: the matcher raises ValueError.
+    pd.read_csv(tmp_path / "train.csv").head(200).to_csv(tmp_path / "train_short.csv", index=False)
+    entries = [{'name': 'short', 'train': str(tmp_path / "train_short.csv"), 'test': str(tmp_path / "test.csv")}] \
+        + read_manifest(manifest)
+    summary = run_batch(entries, os.path.join(DATA_DIR, "ideal.csv"), str(tmp_path / "batch.db"),
+                        report=lambda line: None)
+    assert summary['failed'] == 1
+    assert summary['jobs'][0]['error'].startswith("ValueError: Training data has 200 rows")
+    assert [job['total_test_points'] for job in summary['jobs'][1:]] == [100, 40]
+
+def test_catalog_precomputes_candidate_matrix():
+    catalog = batch_runner.CandidateCatalog.load(os.path.join(DATA_DIR, "ideal.csv"))
+    assert catalog.matrix is not None and catalog.matrix.norms.shape == (50,)
+    assert batch_runner.CandidateCatalog.load(os.path.join(DATA_DIR, "ideal.csv"), matcher_mode='loop').matrix is None
+
+def test_cli_returns_failure_for_failed_jobs(tmp_path, manifest, monkeypatch):
+    monkeypatch.setattr(batch_runner, 'run_batch', lambda *args, **kwargs: {'jobs': [{}], 'failed': 1, 'seconds': 0.0})
+    assert batch_runner.main([manifest, '--db', str(tmp_path / "cli.db")]) == 1
@@ -0,0 +1,50 @@
+import json
+from benchmarks.synthetic import make_datasets
+from benchmarks.bench_pipeline import run_benchmark, compare_results, main, measure
+from benchmarks import bench_kernels
+from src.function_matcher import FunctionMatcher
+
+def test_make_datasets_shapes_and_planted_functions():
+    train, ideal, test, planted = make_datasets(n_rows=120, n_candidates=30, n_test=500, noise=0.1, seed=1)
+    assert train.shape == (120, 5)
+    assert ideal.shape == (120, 31)
+    assert test.shape == (500, 2)
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    assert {m['train_col']: m['ideal_col'] for m in matches} == planted
+
+def test_run_benchmark_reports_all_stages(tmp_path):
+    result = run_benchmark(rows=80, candidates=20, test_points=300, workdir=str(tmp_path))
+    assert [stage['stage'] for stage in result['stages']] == ['load', 'match', 'assign', 'persist']
+    assert all(stage['seconds'] >= 0 and stage['peak_memory_bytes'] > 0 for stage in result['stages'])
+    assert result['quality']['planted_functions_recovered'] == 4
+    json.dumps(result)
+
+def test_measure_times_stage_without_tracemalloc():
+    import tracemalloc
+    tracing = []
+    def stage():
+        tracing.append(tracemalloc.is_tracing())
+        return bytearray(1000000)
+    result, record = measure('stage', stage, 10)
+    # The timed run comes first and untraced; a second run measures peak memory.
+    assert tracing == [False, True] and not tracemalloc.is_tracing()
+    assert len(result) == 1000000 and record['peak_memory_bytes'] >= 1000000
+
+def test_compare_results_flags_regressions():
+    baseline = {'stages': [{'stage': 'match', 'seconds': 1.0}, {'stage': 'assign', 'seconds': 1.0}]}
+    current = {'stages': [{'stage': 'match', 'seconds': 1.05}, {'stage': 'assign', 'seconds': 2.0}]}
+    flags = {row['stage']: row['regression'] for row in compare_results(current, baseline)}
+    assert flags == {'match': False, 'assign': True}
+
+def test_main_writes_json(tmp_path):
+    output = tmp_path / "result.json"
+    assert main(['--rows', '60', '--candidates', '10', '--test-points', '50', '-o', str(output)]) == 0
+    assert json.loads(output.read_text())['config']['candidates'] == 10
+
+def test_kernel_benchmark_checks_and_times_every_kernel():
+    result = bench_kernels.run_benchmark(grid_points=100, functions=16, test_points=5000, repeat=1)
+    kernels = [record['kernel'] for record in result['kernels']]
+    assert kernels[:2] == ['vectorized', 'numpy']
+    assert ('numba' in kernels) == result['environment']['numba']
+    assert 0 < result['matched_points'] < 5000
+    json.dumps(result)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import make_datasets
+from src.candidate_index import CandidateIndex, load_or_build_index
+from src.function_matcher import FunctionMatcher
+
+@pytest.fixture(scope="module")
+def large_catalog():
+    train, ideal, _, planted = make_datasets(n_rows=200, n_candidates=3000, seed=11)
+    return train, ideal, planted
+
+def test_indexed_matches_exhaustive_search(large_catalog):
+    train, ideal, planted = large_catalog
+    matcher = FunctionMatcher(train, ideal, mode='indexed')
+    indexed = matcher.best_ideal_matches()
+    assert indexed == FunctionMatcher(train, ideal).best_ideal_matches()
+    assert {m['train_col']: m['ideal_col'] for m in indexed} == planted
+    # Most candidates are pruned by their lower bound.
+    assert matcher.index.scored < 0.25 * len(train.columns[1:]) * len(ideal.columns[1:])
+
+def test_indexed_top_k_matches_matrix_mode(large_catalog):
+    train, ideal, _ = large_catalog
+    indexed = FunctionMatcher(train, ideal, mode='indexed').top_k_matches(k=5)
+    matrix = FunctionMatcher(train, ideal, mode='matrix').top_k_matches(k=5)
+    assert [m['ideal_cols'] for m in indexed] == [m['ideal_cols'] for m in matrix]
+    assert np.allclose([m['sses'] for m in indexed], [m['sses'] for m in matrix])
+
+def test_ties_and_missing_values_follow_loop_mode():
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [1.0, 2.0, 3.0]})
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [np.nan, 2.0, 3.0], 'y2': [1.0, 2.0, 4.0],
+                          'y3': [1.0, 2.0, 2.0], 'y4': [1.0, 2.0, 4.0]})
+    indexed = FunctionMatcher(train, ideal, mode='indexed').best_ideal_matches()
+    assert indexed == FunctionMatcher(train, ideal).best_ideal_matches()
+    assert indexed[0]['ideal_col'] == 'y2'
+
+def test_training_column_with_missing_values_has_no_match():
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [1.0, np.nan, 3.0], 'y2': [1.0, 2.0, 4.0]})
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [1.0, 2.0, 3.0], 'y2': [1.0, 2.0, 4.0]})
+    indexed = FunctionMatcher(train, ideal, mode='indexed').best_ideal_matches()
+    assert indexed == FunctionMatcher(train, ideal).best_ideal_matches()
+    assert (indexed[0]['ideal_col'], indexed[0]['min_sse']) == (None, float('inf'))
+    assert indexed[1]['ideal_col'] == 'y2'
+
+def test_saved_index_is_reused_until_data_changes(tmp_path, large_catalog):
+    train, ideal, _ = large_catalog
+    path = tmp_path / "ideal.index.npz"
+    built = load_or_build_index(str(path), ideal)
+    loaded = load_or_build_index(str(path), ideal)
+    assert np.array_equal(loaded.projections, built.projections)
+    assert FunctionMatcher(train, ideal, mode='indexed', index=loaded).best_ideal_matches() == \
+        FunctionMatcher(train, ideal).best_ideal_matches()
+    changed = ideal.assign(y1=ideal['y1'] + 1.0)
+    rebuilt = load_or_build_index(str(path), changed)
+    assert rebuilt.fingerprint != built.fingerprint
+    assert CandidateIndex.load(str(path)).fingerprint == rebuilt.fingerprint
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.compact import CompactTable, compare_with_float64
+from src.data_handler import TrainingDataHandler, IdealFunctionHandler, TestDataHandler, DataLoadError
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+
+@pytest.fixture
+def frames():
+    return pd.read_csv("data/train.csv"), pd.read_csv("data/ideal.csv"), pd.read_csv("data/test.csv")
+
+def test_handlers_load_contiguous_compact_tables(frames):
+    train, ideal, test = frames
+    tables = [handler.load_compact() for handler in (TrainingDataHandler("data/train.csv"),
+                                                     IdealFunctionHandler("data/ideal.csv"),
+                                                     TestDataHandler("data/test.csv"))]
+    for table, frame in zip(tables, frames):
+        assert table.dtype == np.float32 and table.values.flags['F_CONTIGUOUS']
+        assert table.x.dtype == np.float64 and table.columns == list(frame.columns)
+        assert table.nbytes < frame.memory_usage(index=True).sum()
+        pdt.assert_frame_equal(table.to_frame(), frame.astype({col: np.float32 for col in frame.columns[1:]})
+                               .astype(float))
+    with pytest.raises(DataLoadError):
+        IdealFunctionHandler("data/train.csv").load_compact()
+
+@pytest.mark.parametrize("mode", FunctionMatcher.MODES)
+def test_compact_sse_is_accumulated_in_float64(frames, mode):
+    train, ideal, _ = frames
+    compact_train, compact_ideal = CompactTable.from_frame(train), CompactTable.from_frame(ideal)
+    matches = FunctionMatcher(compact_train, compact_ideal, mode=mode).best_ideal_matches()
+    assert [m['ideal_col'] for m in matches] == [m['ideal_col'] for m in FunctionMatcher(train, ideal).best_ideal_matches()]
+    for match in matches:
+        widened = compact_train[match['train_col']].astype(float) - compact_ideal[match['ideal_col']].astype(float)
+        assert match['min_sse'] == pytest.approx(np.sum(widened ** 2), rel=1e-12)
+
+def test_compact_assignment_and_report(frames):
+    train, ideal, test = frames
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    compact = TestAssigner(CompactTable.from_frame(test), CompactTable.from_frame(ideal), matches,
+                           CompactTable.from_frame(train)).assign()
+    full = TestAssigner(test, ideal, matches, train).assign()
+    assert list(compact['ideal_func']) == list(full['ideal_func'])
+    report = compare_with_float64(train, ideal, test)
+    assert report['same_matches'] and report['assignment_differences'] == 0
+    assert report['bytes_saved'] > 0.4 * report['float64_bytes']
+    assert 0 < report['max_sse_relative_error'] < 1e-5
+
+def test_compact_report_uses_the_run_matcher_mode(tmp_path, monkeypatch):
+    from src import compact, main
+    modes = []
+    compare = compact.compare_with_float64
+    monkeypatch.setattr(main, 'compare_with_float64',
+                        lambda *frames, **options: modes.append(options['matcher_mode']) or compare(*frames, **options))
+    main.run_pipeline(db_path=str(tmp_path / "compact.db"), dtype='float32', compact_report=True,
+                      matcher_mode='indexed', use_match_cache=False)
+    assert modes == ['indexed']
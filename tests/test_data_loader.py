@@ -0,0 +1,63 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from src.data_loader import load_csv
+
+def cache_files(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+def is_memory_mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+def test_cached_load_matches_csv(tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = load_csv("data/ideal.csv", cache_dir=str(cache_dir))
+    assert len(cache_files(cache_dir)) == 2
+    second = load_csv("data/ideal.csv", cache_dir=str(cache_dir))
+    # The second load is served from the memory-mapped cache.
+    assert is_memory_mapped(second['y1'].to_numpy())
+    assert not is_memory_mapped(first['y1'].to_numpy())
+    pd.testing.assert_frame_equal(first, pd.read_csv("data/ideal.csv"))
+    pd.testing.assert_frame_equal(second, first)
+
+def test_cached_frame_is_editable_like_uncached(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    frames = [load_csv("data/train.csv", cache_dir=cache_dir) for _ in range(2)]
+    for df in frames:
+        df.loc[0, 'y1'] = -1.0
+        df['y2'] *= 2
+        df.to_numpy()[1, 3] = 7.0
+    pd.testing.assert_frame_equal(frames[1], frames[0])
+    # The edits never reach the cache file.
+    pd.testing.assert_frame_equal(load_csv("data/train.csv", cache_dir=cache_dir), pd.read_csv("data/train.csv"))
+
+def test_stale_cache_is_replaced(tmp_path):
+    csv_path = tmp_path / "train.csv"
+    cache_dir = tmp_path / "cache"
+    shutil.copy("data/train.csv", csv_path)
+    load_csv(str(csv_path), cache_dir=str(cache_dir))
+    old_files = cache_files(cache_dir)
+
+    pd.DataFrame({'x': [1.0, 2.0], 'y1': [3.0, 4.0]}).to_csv(csv_path, index=False)
+    os.utime(csv_path, ns=(0, 10 ** 9))
+    reloaded = load_csv(str(csv_path), cache_dir=str(cache_dir))
+    assert reloaded['y1'].tolist() == [3.0, 4.0]
+    assert len(cache_files(cache_dir)) == 2
+    assert cache_files(cache_dir) != old_files
+
+def test_cached_load_validates_columns(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_csv("data/test.csv", cache_dir=cache_dir)
+    with pytest.raises(ValueError):
+        load_csv("data/test.csv", expected_columns=['x', 'y', 'z'], cache_dir=cache_dir)
+
+def test_mixed_dtypes_are_not_cached(tmp_path):
+    csv_path = tmp_path / "mixed.csv"
+    pd.DataFrame({'x': [1, 2], 'y': [0.5, 1.5]}).to_csv(csv_path, index=False)
+    df = load_csv(str(csv_path), cache_dir=str(tmp_path / "cache"))
+    assert df['x'].dtype == np.int64
+    assert not (tmp_path / "cache").exists()
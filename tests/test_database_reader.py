@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.database_reader import IdealFunctionStore
+from src.database_writer import DatabaseWriter
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+
+@pytest.fixture
+def ideal():
+    return pd.read_csv("data/ideal.csv")
+
+def test_long_format_round_trip_loads_selected_functions(tmp_path, ideal):
+    db_writer = DatabaseWriter(db_path=str(tmp_path / "long.db"))
+    assert db_writer.write_ideal_functions_long(ideal) == len(ideal) * 50
+    store = IdealFunctionStore(db_writer.engine)
+    assert len(store.function_ids()) == 50
+    x, values = store.load_arrays(['y42', 'y7'])
+    assert np.array_equal(x, ideal['x'].to_numpy())
+    assert np.array_equal(values, ideal[['y42', 'y7']].to_numpy())
+
+def test_assignment_from_long_format_matches_wide(tmp_path, ideal):
+    train = pd.read_csv("data/train.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    db_writer = DatabaseWriter(db_path=str(tmp_path / "long.db"))
+    db_writer.write_ideal_functions_long(ideal)
+    candidates = IdealFunctionStore(db_writer.engine).load_frame(m['ideal_col'] for m in matches)
+    pdt.assert_frame_equal(TestAssigner(test, candidates, matches, train).assign(),
+                           TestAssigner(test, ideal, matches, train).assign())
+
+def test_functions_on_different_grids_are_aligned(tmp_path):
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'f': [1.0, np.nan, 3.0], 'g': [4.0, 5.0, 6.0]})
+    db_writer = DatabaseWriter(db_path=str(tmp_path / "long.db"), incremental=True)
+    assert db_writer.write_ideal_functions_long(ideal) == 5
+    assert db_writer.write_ideal_functions_long(ideal) == 0
+    store = IdealFunctionStore(db_writer.engine)
+    pdt.assert_frame_equal(store.load_frame(['f']), pd.DataFrame({'x': [0.0, 2.0], 'f': [1.0, 3.0]}))
+    pdt.assert_frame_equal(store.load_frame(['f', 'g']), ideal)
+    with pytest.raises(ValueError):
+        store.load_arrays(['missing'])
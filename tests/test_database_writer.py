@@ -0,0 +1,231 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.database_writer import DatabaseWriter
+
+@pytest.fixture
+def matched_points():
+    return pd.DataFrame({
+        'x': [0.0, 1.0, 2.0],
+        'y': [0.5, 1.5, 2.5],
+        'ideal_func': ['y1', 'y2', 'y1'],
+        'delta_y': [0.1, 0.2, 0.3]
+    })
+
+def read_table(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+
+def test_bulk_write_reports_inserted_rows(tmp_path):
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    db_path = tmp_path / "bulk.db"
+    db_writer = DatabaseWriter(db_path=str(db_path), bulk=True, chunk_size=64)
+    assert db_writer.write_training_data(train) == len(train)
+    assert db_writer.write_ideal_functions(ideal) == len(ideal)
+    stored = read_table(db_path, "ideal_functions")
+    pd.testing.assert_frame_equal(stored, ideal)
+    # The connect hook switched the database to WAL.
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+def test_bulk_write_matches_default_path(tmp_path, matched_points):
+    bulk_path, default_path = tmp_path / "bulk.db", tmp_path / "default.db"
+    DatabaseWriter(db_path=str(bulk_path), bulk=True, chunk_size=2).write_matched_points(matched_points)
+    DatabaseWriter(db_path=str(default_path)).write_matched_points(matched_points)
+    pd.testing.assert_frame_equal(read_table(bulk_path, "matched_points"), read_table(default_path, "matched_points"))
+
+def test_bulk_write_fills_missing_columns_with_null(tmp_path):
+    db_path = tmp_path / "partial.db"
+    ideal = pd.DataFrame({'x': [0.0, 1.0], 'y1': [1.0, 2.0]})
+    DatabaseWriter(db_path=str(db_path), bulk=True).write_ideal_functions(ideal)
+    stored = read_table(db_path, "ideal_functions")
+    assert stored['y1'].tolist() == [1.0, 2.0]
+    assert stored['y50'].isna().all()
+
+def test_incremental_writes_are_idempotent(tmp_path, matched_points):
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    db_path = tmp_path / "incremental.db"
+    first = DatabaseWriter(db_path=str(db_path), incremental=True, run_id="run-1")
+    assert first.write_training_data(train) == len(train)
+    assert first.write_ideal_functions(ideal) == len(ideal)
+    first.write_matched_points(matched_points)
+
+    # A second run with unchanged data skips both tables and only appends its matches.
+    second = DatabaseWriter(db_path=str(db_path), incremental=True)
+    assert second.run_id is not None and second.run_id != "run-1"
+    assert second.write_training_data(train) == 0
+    assert second.write_ideal_functions(ideal) == 0
+    second.write_matched_points(matched_points)
+
+    assert len(read_table(db_path, "training_data")) == len(train)
+    stored = read_table(db_path, "matched_points")
+    assert stored.groupby('run_id').size().to_dict() == {"run-1": 3, second.run_id: 3}
+
+def test_incremental_upsert_only_touches_changed_rows(tmp_path):
+    db_path = tmp_path / "upsert.db"
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [1.0, 2.0, 3.0], 'y2': 0.0, 'y3': 0.0, 'y4': 0.0})
+    DatabaseWriter(db_path=str(db_path), incremental=True).write_training_data(train)
+    changed = pd.concat([train.assign(y1=[1.0, 5.0, 3.0]),
+                         pd.DataFrame({'x': [3.0], 'y1': [4.0], 'y2': 0.0, 'y3': 0.0, 'y4': 0.0})])
+    assert DatabaseWriter(db_path=str(db_path), incremental=True).write_training_data(changed) == 2
+    assert read_table(db_path, "training_data")['y1'].tolist() == [1.0, 5.0, 3.0, 4.0]
+
+def test_incremental_write_deletes_rows_missing_from_new_data(tmp_path):
+    db_path = tmp_path / "shrunk.db"
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [1.0, 2.0, 3.0], 'y2': [4.0, 5.0, 6.0]})
+    first = DatabaseWriter(db_path=str(db_path), incremental=True)
+    first.write_ideal_functions(ideal)
+    first.write_ideal_functions_long(ideal)
+    shrunk = ideal.iloc[:2][['x', 'y1']]
+    second = DatabaseWriter(db_path=str(db_path), incremental=True)
+    # Wide: y2 of two rows set to NULL, one row deleted; long: the four y2 and x=2 rows deleted.
+    assert second.write_ideal_functions(shrunk) == 3
+    assert second.write_ideal_functions_long(shrunk) == 4
+    assert read_table(db_path, "ideal_functions")['x'].tolist() == [0.0, 1.0]
+    stored = read_table(db_path, "ideal_functions_long")
+    assert sorted(zip(stored['func_id'], stored['x'])) == [('y1', 0.0), ('y1', 1.0)]
+
+def test_existing_database_is_migrated(tmp_path, matched_points):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE matched_points (x FLOAT, y FLOAT, ideal_func VARCHAR, delta_y FLOAT)")
+    DatabaseWriter(db_path=str(db_path), incremental=True, run_id="run-1").write_matched_points(matched_points)
+    with sqlite3.connect(db_path) as conn:
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(matched_points)")}
+    assert {'ix_matched_points_run_id_ideal_func', 'ix_matched_points_x'} <= indexes
+    assert read_table(db_path, "matched_points")['run_id'].tolist() == ["run-1"] * 3
+
+def test_concurrent_producers_share_engine_and_batch_commits(tmp_path, matched_points):
+    import threading
+    db_path = str(tmp_path / "concurrent.db")
+    writers = [DatabaseWriter(db_path=db_path, concurrent=True, run_id=f"run-{i}") for i in range(8)]
+    assert len({id(writer.engine) for writer in writers}) == 1
+    assert len({id(writer.batched_writer) for writer in writers}) == 1
+
+    def produce(writer):
+        for _ in range(25):
+            writer.write_matched_points(matched_points)
+
+    threads = [threading.Thread(target=produce, args=(writer,)) for writer in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writers[0].close()
+    stored = read_table(db_path, "matched_points")
+    assert len(stored) == 8 * 25 * len(matched_points)
+    assert stored.groupby('run_id').size().tolist() == [25 * len(matched_points)] * 8
+    metrics = writers[0].write_metrics()
+    assert metrics['submissions'] == 8 * 25 and metrics['rows'] == len(stored)
+    assert metrics['commits'] < metrics['submissions']
+    assert metrics['lock_wait_max'] >= 0 and metrics['commit_latency_p99'] >= metrics['commit_latency_p50']
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+def test_parallel_pipeline_runs_share_one_database(tmp_path):
+    import subprocess
+    import sys
+    db_path = str(tmp_path / "shared.db")
+    code = ("import sys; from src.main import main; "
+            f"sys.exit(main(['--db', {db_path!r}, '--concurrent-writes', '--metrics', {str(tmp_path)!r} + '/m' + sys.argv[1]]))")
+    runs = [subprocess.Popen([sys.executable, "-c", code, str(i)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            for i in range(4)]
+    outputs = [run.communicate() for run in runs]
+    assert [run.returncode for run in runs] == [0] * 4, outputs
+    assert all(b"commit latency" in out for out, _ in outputs)
+    assert len(read_table(db_path, "training_data")) == 400
+    assert len(read_table(db_path, "matched_points")) % 4 == 0
+
+def _start_writer(db_path, barrier, matched_points):
+    # All processes open the fresh database at once, so they race to create the schema.
+    barrier.wait()
+    writer = DatabaseWriter(db_path=db_path, concurrent=True)
+    writer.write_matched_points(matched_points)
+    writer.close()
+
+def test_processes_create_schema_of_fresh_database_concurrently(tmp_path, matched_points):
+    import multiprocessing
+    import sqlalchemy  # noqa: F401 -- imported before forking, so the children start at the same time
+    context = multiprocessing.get_context('fork')
+    # The race is timing dependent, so several fresh databases are started.
+    for round_ in range(5):
+        db_path = str(tmp_path / f"fresh{round_}.db")
+        barrier = context.Barrier(8)
+        processes = [context.Process(target=_start_writer, args=(db_path, barrier, matched_points))
+                     for _ in range(8)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        assert [process.exitcode for process in processes] == [0] * 8
+        assert len(read_table(db_path, "matched_points")) == 8 * len(matched_points)
+
+def test_failed_batch_is_reported_to_its_producer_only(tmp_path, matched_points):
+    import threading
+    db_path = str(tmp_path / "failures.db")
+    good, bad = (DatabaseWriter(db_path=db_path, concurrent=True, run_id=name) for name in ("good", "bad"))
+    # A dict cannot be bound as an SQLite parameter, so the bad writer's rows fail to commit.
+    broken = matched_points.assign(ideal_func=[{'y': 1}] * len(matched_points))
+    threads = [threading.Thread(target=good.write_matched_points, args=(matched_points,)),
+               threading.Thread(target=bad.write_matched_points, args=(broken,))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    good.flush()
+    with pytest.raises(sqlite3.Error):
+        bad.flush()
+    # The error is raised once; the shared writer keeps accepting rows from both producers.
+    bad.write_matched_points(matched_points)
+    bad.close()
+    good.close()
+    stored = read_table(db_path, "matched_points")
+    assert stored.groupby('run_id').size().to_dict() == {'bad': 3, 'good': 3}
+    assert good.write_metrics()['failed_submissions'] == 1
+
+class LockedConnection:
+    # A DB-API connection whose BEGIN IMMEDIATE fails `locked` times before it succeeds.
+    def __init__(self, locked):
+        self.locked = locked
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        if sql == "BEGIN IMMEDIATE" and self.locked:
+            self.locked -= 1
+            raise sqlite3.OperationalError("database is locked")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class LockedEngine:
+    def __init__(self, locked):
+        self.locked = locked
+
+    def raw_connection(self):
+        return LockedConnection(self.locked)
+
+def test_busy_retries_back_off_per_commit(monkeypatch):
+    from src import database_writer
+    sleeps = []
+    monkeypatch.setattr(database_writer.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(database_writer, 'BUSY_RETRIES', 3)
+    writer = database_writer.BatchedWriter(LockedEngine(3))
+    writer._commit([])
+    writer._commit([])
+    # Each commit gets the full retry budget; the lifetime counter is only a metric.
+    assert writer.metrics()['busy_retries'] == 6 and writer.metrics()['commits'] == 2
+    base = database_writer.BUSY_BACKOFF_SECONDS
+    assert all(base * 2 ** (i % 3) / 2 <= delay <= base * 2 ** (i % 3) for i, delay in enumerate(sleeps))
+    writer.engine = LockedEngine(4)
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        writer._commit([])
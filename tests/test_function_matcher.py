@@ -28,4 +28,73 @@ def test_select_closest_function(sample_training_data, sample_candidate_models):
     matcher = FunctionMatcher(sample_training_data, sample_candidate_models)
     matches = matcher.select_closest_function()
     assert isinstance(matches, list), "Matches should be a list"
-    assert all('train_col' in m and 'ideal_col' in m for m in matches), "Each match should have train_col and ideal_col"
\ No newline at end of file
+    assert all('train_col' in m and 'ideal_col' in m for m in matches), "Each match should have train_col and ideal_col"
+
+def test_matrix_mode_matches_loop_mode(sample_training_data, sample_candidate_models):
+    loop = FunctionMatcher(sample_training_data, sample_candidate_models).select_closest_function()
+    matrix = FunctionMatcher(sample_training_data, sample_candidate_models, mode='matrix').select_closest_function()
+    assert [m['ideal_col'] for m in matrix] == [m['ideal_col'] for m in loop]
+    assert all(abs(a['min_sse'] - b['min_sse']) < 1e-9 for a, b in zip(matrix, loop))
+
+def test_top_k_matches_with_small_memory_budget(sample_training_data, sample_candidate_models):
+    # A tiny budget forces one candidate column per block.
+    matcher = FunctionMatcher(sample_training_data, sample_candidate_models, mode='matrix', memory_budget=1)
+    top = matcher.top_k_matches(k=2)
+    assert [t['train_col'] for t in top] == ['y1', 'y2', 'y3', 'y4']
+    assert top[0]['ideal_cols'] == ['y1', 'y2']
+    assert top[0]['sses'][0] <= top[0]['sses'][1]
+
+def test_unknown_mode_rejected(sample_training_data, sample_candidate_models):
+    with pytest.raises(ValueError):
+        FunctionMatcher(sample_training_data, sample_candidate_models, mode='magic')
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matrix_mode_near_ties_at_large_offset_match_loop_mode(seed):
+    # Values around 1e4 and candidates differing by 1e-4: the uncentred expansion cancels
+    # these differences away and used to shortlist the wrong candidate.
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    base = 1e4 + rng.normal(size=400)
+    train = pd.DataFrame({'x': np.arange(400.0), 'y1': base})
+    candidates = pd.DataFrame({f'y{j + 1}': base + rng.normal(scale=1e-4, size=400) for j in range(200)})
+    candidates.insert(0, 'x', np.arange(400.0))
+    expected = FunctionMatcher(train, candidates).best_ideal_matches()
+    for memory_budget in (256 * 1024 ** 2, 8 * 401 * 16):
+        assert FunctionMatcher(train, candidates, mode='matrix', memory_budget=memory_budget) \
+            .best_ideal_matches() == expected
+
+def test_matrix_mode_with_precomputed_candidate_matrix(sample_training_data, sample_candidate_models):
+    from src.function_matcher import CandidateMatrix
+    matrix = CandidateMatrix(sample_candidate_models)
+    expected = FunctionMatcher(sample_training_data, sample_candidate_models).top_k_matches(k=2)
+    for memory_budget in (256 * 1024 ** 2, 1):
+        matcher = FunctionMatcher(sample_training_data, sample_candidate_models, mode='matrix',
+                                  memory_budget=memory_budget, candidate_matrix=matrix)
+        assert matcher.top_k_matches(k=2) == expected
+
+def test_training_column_with_missing_values_has_no_match_in_any_mode(sample_training_data,
+                                                                      sample_candidate_models):
+    import numpy as np
+    from src.function_matcher import CandidateMatrix
+    train = sample_training_data.assign(y2=[2.0, np.nan, 4.0])
+    loop = FunctionMatcher(train, sample_candidate_models).best_ideal_matches()
+    assert (loop[1]['ideal_col'], loop[1]['min_sse']) == (None, float('inf'))
+    for candidate_matrix in (None, CandidateMatrix(sample_candidate_models)):
+        matcher = FunctionMatcher(train, sample_candidate_models, mode='matrix', candidate_matrix=candidate_matrix)
+        assert matcher.best_ideal_matches() == loop
+        assert matcher.top_k_matches(k=2)[1] == {'train_col': 'y2', 'ideal_cols': [], 'sses': []}
+
+def test_matrix_mode_stays_within_memory_budget():
+    import tracemalloc
+    from benchmarks.synthetic import make_datasets
+    train, ideal, _, _ = make_datasets(n_rows=400, n_candidates=3000, seed=1)
+    budget = 4 * 1024 ** 2
+    matcher = FunctionMatcher(train, ideal, mode='matrix', memory_budget=budget)
+    tracemalloc.start()
+    try:
+        matches = matcher.top_k_matches(k=1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= budget
+    assert [m['ideal_cols'] for m in matches] == [[m['ideal_col']] for m in FunctionMatcher(train, ideal).best_ideal_matches()]
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+# Cold start budget for `import src.main` (seconds). Measured at about 0.15 s, almost all of it
+# NumPy; the margin absorbs slow CI machines. Override with the IMPORT_BUDGET_SECONDS variable.
+IMPORT_BUDGET_SECONDS = float(os.environ.get('IMPORT_BUDGET_SECONDS', 1.0))
+HEAVY_MODULES = ('pandas', 'sqlalchemy', 'matplotlib', 'bokeh', 'pyarrow')
+
+def _run(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _import_times(statement):
+    # -X importtime lines: "import time: <self us> | <cumulative us> | <indented module name>"
+    times = {}
+    for line in _run('-X', 'importtime', '-c', statement).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name[1:].startswith(' '):  # top-level imports only, so nothing is counted twice
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+def test_import_main_stays_within_budget():
+    times = _import_times("import src.main")
+    loaded = [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+    assert loaded == []
+    assert sum(times.values()) < IMPORT_BUDGET_SECONDS
+
+def test_headless_matching_does_not_load_database_or_plotting_libraries():
+    code = (
+        "import sys\n"
+        "from src import FunctionMatcher, IdealFunctionHandler, TrainingDataHandler\n"
+        "train, ideal = TrainingDataHandler('data/train.csv'), IdealFunctionHandler('data/ideal.csv')\n"
+        "train.load(); ideal.load()\n"
+        "print(FunctionMatcher(train.data, ideal.data, mode='matrix').best_ideal_matches()[0]['ideal_col'])\n"
+        "print(sorted(m for m in ('sqlalchemy', 'matplotlib', 'bokeh') if m in sys.modules))\n"
+    )
+    assert _run('-c', code).stdout.splitlines() == ['y42', '[]']
+
+def test_package_cli_help():
+    assert '--matcher-mode' in _run('-m', 'src', '--help').stdout
@@ -0,0 +1,30 @@
+import io
+import json
+import os
+from src.instrumentation import StageMetrics
+
+def test_stage_metrics_emit_json_lines():
+    sink = io.StringIO()
+    metrics = StageMetrics(sink=sink, run_id="run-1")
+    with metrics.stage("load") as stage:
+        data = [0.0] * 100000
+        stage.rows = len(data)
+    with metrics.stage("match", rows=4):
+        sum(range(1000))
+    lines = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert [line['stage'] for line in lines] == ['load', 'match']
+    assert lines[0]['rows'] == 100000
+    assert lines[0]['peak_memory_bytes'] >= 800000
+    assert all(line['wall_seconds'] >= 0 and line['cpu_seconds'] >= 0 for line in lines)
+    assert all(line['run_id'] == "run-1" for line in lines)
+
+def test_stage_metrics_profile_and_file_sink(tmp_path):
+    sink = tmp_path / "metrics.jsonl"
+    profile_dir = tmp_path / "profiles"
+    metrics = StageMetrics(sink=str(sink), trace_memory=False, profile_dir=str(profile_dir))
+    with metrics.stage("assign"):
+        sorted(range(1000), reverse=True)
+    record = json.loads(sink.read_text())
+    assert record['peak_memory_bytes'] is None
+    assert os.path.exists(profile_dir / "assign.prof")
+    assert metrics.summary()[0]['stage'] == 'assign'
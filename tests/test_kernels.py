@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.function_matcher import FunctionMatcher
+from src.kernels import first_hit, resolve_backend
+from src.test_assigner import AssignmentGrid, TestAssigner
+from src.tolerance import ToleranceTable
+
+BACKENDS = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(
+    resolve_backend('auto') != 'numba', reason="numba is not installed"))]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_first_hit_matches_vectorized_assignment(backend):
+    rng = np.random.default_rng(3)
+    grid_x = np.arange(50.0)
+    candidate_y = rng.normal(size=(50, 6))
+    candidate_y[7, 2] = np.nan
+    tolerance = np.abs(rng.normal(size=(50, 6)))
+    grid = AssignmentGrid(grid_x, candidate_y, tolerance, [f'y{i}' for i in range(6)])
+    # Off-grid x values and NaN test values are never assigned.
+    x = np.concatenate([rng.integers(0, 50, 5000).astype(float), [0.5, 60.0, 3.0]])
+    y = np.concatenate([rng.normal(size=5000), [0.0, 0.0, np.nan]])
+
+    expected = grid.assign(x, y)
+    pos, found = grid.locate(x)
+    for actual, wanted in zip(first_hit(y, np.where(found, pos, -1), candidate_y, tolerance, backend), expected):
+        assert np.array_equal(actual, wanted)
+
+@pytest.mark.parametrize("tolerance_mode", ['pointwise', 'global'])
+def test_fused_engine_matches_vectorized(tolerance_mode):
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    table = ToleranceTable.build(train, ideal, matches, mode=tolerance_mode)
+    expected = TestAssigner(test, ideal, matches, train, tolerance_table=table).assign()
+    fused = TestAssigner(test, ideal, matches, train, engine='fused', tolerance_table=table)
+    pdt.assert_frame_equal(fused.assign(), expected)
+    assert fused.grid.kernel == 'auto'
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        first_hit(np.zeros(1), np.zeros(1, dtype=np.intp), np.zeros((1, 1)), np.zeros((1, 1)), backend='cuda')
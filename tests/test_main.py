@@ -74,3 +74,107 @@ def test_database_writer(tmp_path):
     db_writer.write_ideal_functions(ideal)
     db_writer.write_matched_points(matched)
     assert db_path.exists()
+
+def test_run_pipeline_headless(tmp_path):
+    """Test the importable pipeline entry point without plots."""
+    from src.main import run_pipeline
+    result = run_pipeline(db_path=str(tmp_path / "ideal.db"), plots='none')
+    assert result['total_test_points'] == 100
+    assert result['matched_points_count'] == len(result['matched_points'])
+    assert result['outputs'] == []
+
+def test_run_pipeline_streaming(tmp_path):
+    """Test the pipeline in streaming mode, where matches only go to the database."""
+    from src.main import run_pipeline
+    result = run_pipeline(db_path=str(tmp_path / "ideal.db"), chunk_size=30)
+    assert result['matched_points'] is None
+    assert result['total_test_points'] == 100
+
+def test_cli_headless_run_skips_plotting_imports(tmp_path):
+    """A headless CLI run must not import matplotlib or bokeh."""
+    import subprocess
+    import sys
+    code = (
+        "import sys; from src.main import main; "
+        f"rc = main(['--db', {str(tmp_path / 'cli.db')!r}, '--metrics', {str(tmp_path / 'metrics.jsonl')!r}]); "
+        "assert rc == 0; "
+        "assert 'matplotlib' not in sys.modules and 'bokeh' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    assert (tmp_path / "metrics.jsonl").read_text().count("\n") >= 5
+
+def test_cli_traces_memory_only_on_request(tmp_path):
+    """Stage metrics carry peak memory only with --trace-memory (or --memory-profile)."""
+    import json
+    from src.main import main
+    for flags, traced in (([], False), (['--trace-memory'], True)):
+        sink = tmp_path / f"metrics{len(flags)}.jsonl"
+        assert main(['--db', str(tmp_path / f"cli{len(flags)}.db"), '--metrics', str(sink)] + flags) == 0
+        records = [json.loads(line) for line in sink.read_text().splitlines()]
+        assert all((record['peak_memory_bytes'] is not None) == traced for record in records)
+
+def test_run_pipeline_incremental_reruns_use_match_cache(tmp_path):
+    """Repeated incremental runs succeed and reuse the cached matches."""
+    from src.main import run_pipeline
+    from src.instrumentation import StageMetrics
+    db_path = str(tmp_path / "ideal.db")
+    first = run_pipeline(db_path=db_path, incremental=True)
+    metrics = StageMetrics(trace_memory=False)
+    second = run_pipeline(db_path=db_path, incremental=True, metrics=metrics)
+    stages = [record['stage'] for record in metrics.summary()]
+    assert 'match' not in stages and 'tolerance_table' not in stages
+    assert second['best_matches'] == [
+        {'train_col': m['train_col'], 'ideal_col': m['ideal_col'], 'min_sse': float(m['min_sse'])}
+        for m in first['best_matches']
+    ]
+    pd.testing.assert_frame_equal(second['matched_points'], first['matched_points'])
+    assert first['run_id'] != second['run_id']
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        runs = dict(conn.execute("SELECT run_id, matched_points FROM runs"))
+    assert runs == {first['run_id']: first['matched_points_count'], second['run_id']: second['matched_points_count']}
+
+def test_ideal_function_handler_accepts_any_catalog_size(tmp_path):
+    """With num_functions=None, catalogs other than y1..y50 load as well."""
+    path = tmp_path / "ideal.csv"
+    pd.DataFrame({'x': [0.0, 1.0], 'y1': [1.0, 2.0], 'y2': [3.0, 4.0]}).to_csv(path, index=False)
+    with pytest.raises(DataLoadError):
+        IdealFunctionHandler(str(path)).load()
+    handler = IdealFunctionHandler(str(path), num_functions=None)
+    handler.load()
+    assert list(handler.data.columns) == ['x', 'y1', 'y2']
+
+def test_run_pipeline_long_ideal_format(tmp_path, monkeypatch):
+    """In long format the matched functions are read back from the database, with the same assignment."""
+    from src.main import run_pipeline
+    from src.database_reader import IdealFunctionStore
+    loaded = []
+    load_frame = IdealFunctionStore.load_frame
+    monkeypatch.setattr(IdealFunctionStore, 'load_frame',
+                        lambda self, func_ids: loaded.append(list(func_ids)) or load_frame(self, func_ids))
+    wide = run_pipeline(db_path=str(tmp_path / "wide.db"))
+    assert loaded == []
+    long = run_pipeline(db_path=str(tmp_path / "long.db"), ideal_format='long')
+    assert loaded == [list(dict.fromkeys(match['ideal_col'] for match in long['best_matches']))]
+    pd.testing.assert_frame_equal(long['matched_points'], wide['matched_points'])
+    compact = run_pipeline(db_path=str(tmp_path / "compact.db"), ideal_format='long', dtype='float32',
+                           concurrent_writes=True)
+    assert compact['matched_points_count'] == long['matched_points_count']
+
+def test_run_pipeline_indexed_matcher(tmp_path):
+    """The indexed matcher saves its index and finds the same matches."""
+    from src.main import run_pipeline
+    index_path = tmp_path / "ideal.index.npz"
+    indexed = run_pipeline(db_path=str(tmp_path / "indexed.db"), matcher_mode='indexed',
+                           candidate_index_path=str(index_path), use_match_cache=False)
+    loop = run_pipeline(db_path=str(tmp_path / "loop.db"), use_match_cache=False)
+    assert index_path.exists()
+    assert indexed['best_matches'] == loop['best_matches']
+
+def test_run_pipeline_compact_mode(tmp_path):
+    """Float32 datasets give the same assignment as the default float64 run."""
+    from src.main import run_pipeline
+    compact = run_pipeline(db_path=str(tmp_path / "compact.db"), dtype='float32', compact_report=True)
+    full = run_pipeline(db_path=str(tmp_path / "full.db"))
+    assert [m['ideal_col'] for m in compact['best_matches']] == [m['ideal_col'] for m in full['best_matches']]
+    assert list(compact['matched_points']['ideal_func']) == list(full['matched_points']['ideal_func'])
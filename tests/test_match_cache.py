@@ -0,0 +1,63 @@
+import time
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from src.function_matcher import FunctionMatcher
+from src.match_cache import MatchCache, dataset_fingerprint
+from src.tolerance import ToleranceTable
+
+@pytest.fixture
+def datasets():
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    return train, ideal, FunctionMatcher(train, ideal).best_ideal_matches()
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+
+def test_fingerprint_depends_on_content_only(datasets):
+    train, ideal, _ = datasets
+    assert dataset_fingerprint(train) == dataset_fingerprint(train.copy())
+    changed = train.copy()
+    changed.loc[0, 'y1'] += 1e-9
+    assert dataset_fingerprint(changed) != dataset_fingerprint(train)
+
+def test_put_and_get(datasets, engine):
+    train, ideal, matches = datasets
+    cache = MatchCache(engine)
+    assert cache.get(train, ideal) is None
+    table = ToleranceTable.build(train, ideal, matches, mode='global')
+    cache.put(train, ideal, matches, table)
+
+    hit = MatchCache(engine).get(train.copy(), ideal.copy())
+    assert [m['ideal_col'] for m in hit.best_matches] == [m['ideal_col'] for m in matches]
+    assert [m['min_sse'] for m in hit.best_matches] == pytest.approx([m['min_sse'] for m in matches])
+    assert hit.tolerance_table.mode == 'global'
+    assert hit.tolerance_table.matches(matches)
+    # The matches are reused with any tolerance function, the table only with its own.
+    other = MatchCache(engine).get(train, ideal, tolerance_func=abs)
+    assert other.best_matches == hit.best_matches and other.tolerance_table is None
+
+def test_invalidate(datasets, engine):
+    train, ideal, matches = datasets
+    cache = MatchCache(engine)
+    cache.put(train, ideal, matches)
+    assert cache.invalidate(training_data=train.iloc[:10]) == 0
+    assert cache.invalidate(training_data=train) == 1
+    assert cache.get(train, ideal) is None
+
+def test_lru_eviction(datasets, engine):
+    train, ideal, matches = datasets
+    cache = MatchCache(engine, max_entries=2)
+    variants = [train.assign(y1=train['y1'] + i) for i in range(3)]
+    cache.put(variants[0], ideal, matches)
+    time.sleep(0.01)
+    cache.put(variants[1], ideal, matches)
+    time.sleep(0.01)
+    cache.get(variants[0], ideal)  # touch, so variant 1 becomes the oldest
+    time.sleep(0.01)
+    cache.put(variants[2], ideal, matches)
+    assert len(cache) == 2
+    assert cache.get(variants[1], ideal) is None
+    assert cache.get(variants[0], ideal) is not None
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import make_datasets
+from src.function_matcher import FunctionMatcher
+from src.match_metrics import METRICS, Metric, WeightedSSEMetric, get_metric, register_metric
+
+@pytest.fixture
+def catalog():
+    train, ideal, _, _ = make_datasets(n_rows=120, n_candidates=300, seed=5)
+    return train, ideal
+
+def test_sse_ranking_matches_loop_mode(catalog):
+    train, ideal = catalog
+    # A small memory budget forces many blocks.
+    matcher = FunctionMatcher(train, ideal, memory_budget=64 * 1024)
+    rankings = matcher.rank_by_metrics(['sse'], k=1)['sse']
+    for ranking, match in zip(rankings, FunctionMatcher(train, ideal).best_ideal_matches()):
+        assert ranking['ideal_cols'] == [match['ideal_col']]
+        assert ranking['scores'] == [match['min_sse']]
+
+def test_all_metrics_in_one_pass_match_brute_force(catalog):
+    train, ideal = catalog
+    weights = np.linspace(0.5, 2.0, len(train))
+    matcher = FunctionMatcher(train, ideal, memory_budget=64 * 1024)
+    rankings = matcher.rank_by_metrics(['linf', 'l1', WeightedSSEMetric(weights)], k=4)
+    assert set(matcher.metric_timings) == {'deviations', 'linf', 'l1', 'weighted_sse'}
+    candidates = ideal.drop(columns='x').to_numpy()
+    reducers = {
+        'linf': lambda d: np.abs(d).max(axis=0),
+        'l1': lambda d: np.abs(d).sum(axis=0),
+        'weighted_sse': lambda d: (weights[:, None] * d ** 2).sum(axis=0),
+    }
+    for name, reduce in reducers.items():
+        for entry in rankings[name]:
+            scores = reduce(train[entry['train_col']].to_numpy()[:, None] - candidates)
+            order = np.argsort(scores, kind='stable')[:4]
+            assert entry['ideal_cols'] == [ideal.columns[1 + j] for j in order]
+            assert np.allclose(entry['scores'], scores[order])
+
+def test_custom_metric_registration():
+    @register_metric
+    class MaxSquaredMetric(Metric):
+        name = 'max_squared'
+
+        def reduce(self, diff):
+            return np.max(diff ** 2, axis=-1)
+
+    train = pd.DataFrame({'x': [0.0, 1.0], 'y1': [0.0, 0.0]})
+    ideal = pd.DataFrame({'x': [0.0, 1.0], 'y1': [3.0, 0.0], 'y2': [2.0, 2.0], 'y3': [np.nan, 0.0]})
+    try:
+        rankings = FunctionMatcher(train, ideal).rank_by_metrics(['max_squared', 'sse'], k=3)
+    finally:
+        METRICS.pop('max_squared')
+    assert rankings['max_squared'][0]['ideal_cols'] == ['y2', 'y1', 'y3']
+    assert rankings['sse'][0]['ideal_cols'] == ['y2', 'y1', 'y3']
+    assert rankings['sse'][0]['scores'] == [8.0, 9.0, np.inf]
+    with pytest.raises(ValueError):
+        get_metric('unknown')
@@ -0,0 +1,68 @@
+import json
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src.compact import CompactTable
+from src.instrumentation import StageMetrics
+from src.memory_profile import MemoryProfiler, compare_reports, format_comparison, format_report, main
+
+def _allocate(frame):
+    # The values array is allocated in src/compact.py, the origin reported for this package.
+    return CompactTable.from_frame(frame, np.float64)
+
+def _profile(label, n, tmp_path):
+    profiler = MemoryProfiler(top=5, frames=5, label=label)
+    metrics = StageMetrics(memory_profiler=profiler)
+    frame = pd.DataFrame({'x': np.zeros(n), 'y1': np.ones(n)})
+    with metrics.stage("load"):
+        kept = _allocate(frame)
+    with metrics.stage("transient"):
+        _allocate(frame).values.sum()
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+    del kept
+    path = str(tmp_path / f"{label}.json")
+    profiler.write_report(path)
+    return metrics, path
+
+def test_stage_reports_peak_retained_and_sites(tmp_path):
+    metrics, path = _profile("base", 500000, tmp_path)
+    report = json.load(open(path))
+    load, transient = report['stages']
+    assert load['retained_bytes'] >= 4000000 and load['peak_bytes'] >= load['retained_bytes']
+    assert transient['peak_bytes'] >= 4000000 and transient['retained_bytes'] < 100000
+    site = load['sites'][0]
+    assert site['size'] >= 4000000
+    assert site['origin']['file'] == "src/compact.py"
+    assert "np.empty" in site['origin']['code']
+    # StageMetrics still measures its own peak inside the traced stages.
+    assert metrics.records[0].peak_memory_bytes >= 4000000
+    text = (tmp_path / "base.txt").read_text()
+    assert text.startswith("Memory profile base") and "load: largest retained allocations" in text
+    assert format_report(report) == text
+
+def test_compare_reports_between_versions(tmp_path, capsys):
+    _, base = _profile("base", 100000, tmp_path)
+    _, new = _profile("new", 600000, tmp_path)
+    comparison = compare_reports(json.load(open(base)), json.load(open(new)))
+    load = comparison['stages'][0]
+    assert load['stage'] == "load"
+    assert 3500000 < load['retained_bytes']['change'] < 4500000
+    assert load['sites'][0]['site'].startswith("src/compact.py")
+    assert "Memory comparison: base -> new" in format_comparison(comparison)
+
+    assert main(['compare', base, new, '--json', str(tmp_path / "diff.json")]) == 0
+    assert "retained allocations that changed" in capsys.readouterr().out
+    assert json.load(open(tmp_path / "diff.json"))['stages'][1]['stage'] == "transient"
+
+def test_cli_memory_profile_reports_pipeline_stages(tmp_path, capsys):
+    from src.main import main as run_cli
+    report_path = tmp_path / "profile" / "run.json"
+    assert run_cli(['--db', str(tmp_path / "cli.db"), '--metrics', str(tmp_path / "metrics.jsonl"),
+                    '--matcher-mode', 'matrix', '--bulk', '--memory-profile', str(report_path), '--memory-top', '3', '--memory-frames', '5']) == 0
+    assert not tracemalloc.is_tracing()
+    report = json.load(open(report_path))
+    stages = {stage['stage']: stage for stage in report['stages']}
+    assert {'load_datasets', 'match', 'assign', 'write_ideal_functions'} <= set(stages)
+    assert all(len(stage['sites']) <= 3 for stage in report['stages'])
+    assert report['label'] == "run" and (tmp_path / "profile" / "run.txt").exists()
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+from src.parallel_assigner import ParallelAssigner
+
+@pytest.fixture
+def assigner():
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    # Repeat the sample test points so there are several shards.
+    test = pd.concat([pd.read_csv("data/test.csv")] * 5, ignore_index=True)
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    return TestAssigner(test, ideal, matches, train)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_matches_serial(assigner, workers):
+    parallel = ParallelAssigner(assigner, workers=workers, shard_size=37).assign()
+    pdt.assert_frame_equal(parallel, assigner.assign())
+
+def test_parallel_empty_test_data(assigner):
+    empty = pd.DataFrame({'x': np.empty(0), 'y': np.empty(0)})
+    result = ParallelAssigner(assigner, workers=2).assign(empty)
+    assert result.empty
+    assert list(result.columns) == ['x', 'y', 'ideal_func', 'delta_y']
+
+def test_session_reuses_pool_across_calls(assigner):
+    parallel = ParallelAssigner(assigner, workers=3)
+    halves = [assigner.test_data.iloc[:250], assigner.test_data.iloc[250:]]
+    with parallel.session():
+        pool = parallel._pool
+        with parallel.session():
+            results = [parallel.assign(half) for half in halves]
+        assert parallel._pool is pool
+    assert parallel._pool is None
+    for half, result in zip(halves, results):
+        pdt.assert_frame_equal(result, assigner.assign_frame(half))
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.function_matcher import FunctionMatcher
+from src.main import run_pipeline
+from src.parquet_export import ParquetExporter, ParquetResults
+from src.test_assigner import TestAssigner
+
+@pytest.fixture
+def assignment():
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    return matches, TestAssigner(test, ideal, matches, train).assign()
+
+def test_matched_points_partitioned_with_projection_and_filters(tmp_path, assignment):
+    matches, matched = assignment
+    exporter = ParquetExporter(str(tmp_path), run_id="run-1")
+    # Two chunks, as in streaming mode.
+    exporter.write_matched_points(matched.iloc[:40])
+    exporter.write_matched_points(matched.iloc[40:])
+    assert exporter.rows == len(matched)
+    assert sorted(os.listdir(tmp_path / "matched_points")) == \
+        sorted(f"ideal_func={func}" for func in matched['ideal_func'].unique())
+
+    results = ParquetResults(str(tmp_path))
+    stored = results.matched_points(columns=['x', 'y', 'ideal_func', 'delta_y'])
+    pdt.assert_frame_equal(stored.sort_values(['x', 'y']).reset_index(drop=True),
+                           matched.sort_values(['x', 'y']).reset_index(drop=True))
+
+    func = matches[0]['ideal_col']
+    selected = results.matched_points(columns=['x', 'delta_y'],
+                                      filters=[('ideal_func', '=', func), ('delta_y', '<', 0.1)])
+    assert list(selected.columns) == ['x', 'delta_y']
+    expected = matched[(matched['ideal_func'] == func) & (matched['delta_y'] < 0.1)]
+    assert sorted(selected['x']) == sorted(expected['x'])
+
+def test_summary_matches_pandas(tmp_path, assignment):
+    _, matched = assignment
+    ParquetExporter(str(tmp_path)).write_matched_points(matched)
+    summary = ParquetResults(str(tmp_path)).summary()
+    expected = matched.groupby('ideal_func')['delta_y'].agg(['count', 'mean', 'max']).reset_index()
+    assert list(summary['ideal_func']) == list(expected['ideal_func'])
+    assert list(summary['points']) == list(expected['count'])
+    assert summary['mean_delta_y'].to_numpy() == pytest.approx(expected['mean'].to_numpy())
+    assert list(summary['max_delta_y']) == list(expected['max'])
+    assert ParquetResults(str(tmp_path / "missing")).summary().empty
+
+@pytest.mark.parametrize("chunk_size", [None, 30])
+def test_run_pipeline_exports_run(tmp_path, chunk_size):
+    export_dir = str(tmp_path / "export")
+    db_path = str(tmp_path / "ideal.db")
+    first = run_pipeline(db_path=db_path, chunk_size=chunk_size, incremental=True, export_dir=export_dir)
+    second = run_pipeline(db_path=db_path, chunk_size=chunk_size, incremental=True, export_dir=export_dir)
+    assert first['run_id'] != second['run_id']
+
+    results = ParquetResults(export_dir)
+    runs = results.runs()
+    assert sorted(runs['run_id']) == sorted([first['run_id'], second['run_id']])
+    assert list(runs['matched_points_count']) == [first['matched_points_count']] * 2
+    best = results.best_matches(run_id=first['run_id'])
+    assert list(best['ideal_col']) == [match['ideal_col'] for match in first['best_matches']]
+
+    exported = results.matched_points(filters=[('run_id', '=', second['run_id'])])
+    assert len(exported) == second['matched_points_count']
+    # The database rows carry the same run ID as the exported files.
+    with sqlite3.connect(db_path) as conn:
+        stored = pd.read_sql_query("SELECT COUNT(*) AS n FROM matched_points WHERE run_id = ?", conn,
+                                   params=(second['run_id'],))
+    assert stored['n'][0] == len(exported)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.reporting import ResultSummary, decimate_minmax
+
+def _matched(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'x': rng.uniform(-20, 20, n),
+        'y': rng.normal(size=n),
+        'ideal_func': rng.choice(['y11', 'y41', 'y42'], n),
+        'delta_y': rng.exponential(0.3, n),
+    })
+
+def test_chunked_summary_matches_one_pass():
+    matched = _matched(10000)
+    whole = ResultSummary.from_frame(matched, 40000)
+    chunked = ResultSummary()
+    # Later chunks reach larger deviations, so the histogram range has to grow.
+    ordered = matched.sort_values('delta_y')
+    for rows in np.array_split(np.arange(len(ordered)), 7):
+        chunked.update(ordered.iloc[rows], 40000 // 7)
+    chunked.update(None, 40000 - 7 * (40000 // 7))
+
+    deltas = matched['delta_y'].to_numpy()
+    for summary in (whole, chunked):
+        assert summary.matching_rate == pytest.approx(25.0)
+        assert summary.mean_deviation == pytest.approx(deltas.mean())
+        assert summary.std_deviation == pytest.approx(deltas.std())
+        assert (summary.min_deviation, summary.max_deviation) == (deltas.min(), deltas.max())
+        assert summary.function_counts == matched['ideal_func'].value_counts().to_dict()
+    assert np.array_equal(chunked.histogram, whole.histogram)
+    assert np.array_equal(whole.histogram, np.histogram(deltas, bins=whole.histogram_edges)[0])
+
+def test_merge_of_shards():
+    shards = [_matched(500, seed) for seed in range(4)]
+    shards[2]['delta_y'] *= 10
+    merged = ResultSummary()
+    for shard in shards:
+        merged.merge(ResultSummary.from_frame(shard, 1000))
+    expected = ResultSummary.from_frame(pd.concat(shards), 4000)
+    merged, expected = merged.as_dict(), expected.as_dict()
+    for key in ('mean_deviation', 'std_deviation'):
+        assert merged.pop(key) == pytest.approx(expected.pop(key))
+    assert merged == expected
+    assert ResultSummary().merge(ResultSummary()).as_dict()['mean_deviation'] is None
+
+def test_decimate_minmax_keeps_envelope_per_function():
+    matched = _matched(200000)
+    kept = decimate_minmax(matched['x'], matched['y'], matched['ideal_func'], buckets=100)
+    assert len(kept) <= 2 * 100 * 3
+    shown = matched.iloc[kept]
+    for func, group in matched.groupby('ideal_func'):
+        assert shown.loc[shown['ideal_func'] == func, 'y'].max() == group['y'].max()
+        assert shown.loc[shown['ideal_func'] == func, 'y'].min() == group['y'].min()
+    assert np.array_equal(decimate_minmax([1.0, 2.0], [3.0, 4.0]), [0, 1])
@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import subprocess
+import sys
+import pandas as pd
+from src.database_writer import DatabaseWriter
+from src.function_matcher import FunctionMatcher
+from src.service import AssignmentService, run_service
+from src.test_assigner import TestAssigner
+
+def make_assigner():
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    return TestAssigner(test, ideal, matches, train), test
+
+def count_matched_points(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM matched_points").fetchone()[0]
+
+def test_service_matches_batch_assignment(tmp_path):
+    assigner, test = make_assigner()
+    expected = assigner.assign()
+    db_path = tmp_path / "service.db"
+    service = AssignmentService(assigner, DatabaseWriter(db_path=str(db_path), bulk=True), max_batch=16)
+
+    async def feed():
+        async with service:
+            return await asyncio.gather(*(service.submit(x, y) for x, y in zip(test['x'], test['y'])))
+
+    results = asyncio.run(feed())
+    matched = [(x, y, r[0], r[1]) for x, y, r in zip(test['x'], test['y'], results) if r is not None]
+    pd.testing.assert_frame_equal(pd.DataFrame(matched, columns=expected.columns), expected)
+    stats = service.stats()
+    assert stats['points'] == len(test) and stats['matched_points'] == len(expected)
+    assert stats['batches'] >= len(test) // 16
+    assert stats['p50_ms'] <= stats['p99_ms']
+    assert count_matched_points(db_path) == len(expected)
+
+def test_socket_clients_get_replies_in_order(tmp_path):
+    assigner, test = make_assigner()
+    expected = assigner.assign()
+    socket_path = str(tmp_path / "service.sock")
+    service = AssignmentService(assigner)
+
+    async def client():
+        server = asyncio.create_task(run_service(service, socket_path=socket_path, report=lambda message: None))
+        while not (tmp_path / "service.sock").exists():
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        lines = [f"{x},{y}" for x, y in zip(test['x'], test['y'])] + ["not a point"]
+        writer.write(("\n".join(lines) + "\n").encode())
+        await writer.drain()
+        writer.write_eof()
+        replies = [line.decode().rstrip("\n") async for line in reader]
+        writer.close()
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        return replies
+
+    replies = asyncio.run(client())
+    assert len(replies) == len(test) + 1
+    assert replies[-1] == "error,not a point"
+    matched = [reply.split(",") for reply in replies[:-1] if not reply.endswith(",,")]
+    assert [fields[2] for fields in matched] == list(expected['ideal_func'])
+
+def test_cli_reads_points_from_stdin(tmp_path):
+    assigner, test = make_assigner()
+    db_path = tmp_path / "cli.db"
+    lines = "".join(f"{x},{y}\n" for x, y in zip(test['x'], test['y']))
+    completed = subprocess.run([sys.executable, "-m", "src.service", "--db", str(db_path)],
+                               input=lines, capture_output=True, text=True, check=True)
+    assert f"{len(test)} points" in completed.stderr and "p99" in completed.stderr
+    expected = assigner.assign()
+    assert count_matched_points(db_path) == len(expected)
+    # One reply per point on stdout, in input order; nothing else is printed there.
+    replies = completed.stdout.splitlines()
+    assert len(replies) == len(test)
+    matched = [reply.split(",") for reply in replies if not reply.endswith(",,")]
+    assert [fields[2] for fields in matched] == list(expected['ideal_func'])
+    with sqlite3.connect(db_path) as conn:
+        run_ids = [row[0] for row in conn.execute("SELECT DISTINCT run_id FROM matched_points")]
+        run = conn.execute("SELECT total_test_points, matched_points FROM runs WHERE run_id = ?",
+                           (run_ids[0],)).fetchone()
+    assert len(run_ids) == 1 and run_ids[0] and f"run ID {run_ids[0]}" in completed.stderr
+    assert run == (len(test), len(expected))
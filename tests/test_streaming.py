@@ -0,0 +1,61 @@
+import sqlite3
+import pandas as pd
+from src.data_handler import TestDataHandler
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+from src.database_writer import DatabaseWriter
+from src.streaming import stream_assign
+
+def test_test_data_handler_iter_chunks():
+    chunks = list(TestDataHandler("data/test.csv").iter_chunks(30))
+    assert [len(chunk) for chunk in chunks] == [30, 30, 30, 10]
+
+def test_stream_assign_matches_batch_assignment(tmp_path):
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    test = pd.read_csv("data/test.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    assigner = TestAssigner(test, ideal, matches, train)
+    expected = assigner.assign()
+
+    db_path = tmp_path / "stream.db"
+    messages = []
+    summary = stream_assign(TestDataHandler("data/test.csv"), assigner,
+                            DatabaseWriter(db_path=str(db_path), bulk=True), chunk_size=16,
+                            report=messages.append)
+    assert summary['chunks'] == 7
+    assert summary['total_points'] == len(test)
+    assert summary['matched_points'] == len(expected)
+    assert len(messages) == 7
+    with sqlite3.connect(db_path) as conn:
+        stored = pd.read_sql_query("SELECT x, y, ideal_func, delta_y FROM matched_points", conn)
+    pd.testing.assert_frame_equal(stored, expected)
+
+def test_run_pipeline_streams_in_chunks(tmp_path):
+    from src.main import run_pipeline
+    db_path = tmp_path / "stream.db"
+    result = run_pipeline(db_path=str(db_path), chunk_size=50)
+    assert result['matched_points'] is None and len(result['best_matches']) == 4
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM matched_points").fetchone()[0]
+    assert stored == result['matched_points_count'] > 0
+
+def test_parallel_stream_assign_starts_one_pool(tmp_path, monkeypatch):
+    from src import parallel_assigner
+    from src.parallel_assigner import ParallelAssigner
+    train = pd.read_csv("data/train.csv")
+    ideal = pd.read_csv("data/ideal.csv")
+    matches = FunctionMatcher(train, ideal).best_ideal_matches()
+    assigner = TestAssigner(pd.read_csv("data/test.csv"), ideal, matches, train)
+    pools = []
+    start_pool = parallel_assigner._start_pool
+    monkeypatch.setattr(parallel_assigner, '_start_pool', lambda *args: pools.append(args) or start_pool(*args))
+
+    db_path = tmp_path / "stream.db"
+    summary = stream_assign(TestDataHandler("data/test.csv"), ParallelAssigner(assigner, workers=2),
+                            DatabaseWriter(db_path=str(db_path), bulk=True), chunk_size=16,
+                            report=lambda message: None)
+    assert summary['chunks'] == 7 and len(pools) == 1
+    with sqlite3.connect(db_path) as conn:
+        stored = pd.read_sql_query("SELECT x, y, ideal_func, delta_y FROM matched_points", conn)
+    pd.testing.assert_frame_equal(stored, assigner.assign())
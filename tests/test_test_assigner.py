@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+from src.test_assigner import TestAssigner
+
+def test_vectorized_matches_rowwise(sample_data):
+    train, ideal, test, matches = sample_data
+    vectorized = TestAssigner(test, ideal, matches, train).assign()
+    rowwise = TestAssigner(test, ideal, matches, train, engine='rowwise').assign()
+    assert len(vectorized) > 0
+    pdt.assert_frame_equal(vectorized, rowwise)
+
+def test_vectorized_skips_points_missing_from_grid():
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [0.0, 1.0, 2.0]})
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0, 2.0], 'y1': [0.5, 1.5, 2.5, 9.0], 'y2': [0.0, 1.1, 2.0, 2.0]})
+    test = pd.DataFrame({'x': [2.0, 3.0, 1.0, 0.5, 0.0], 'y': [2.1, 3.0, 9.0, 0.5, 0.2]})
+    matches = [{'train_col': 'y1', 'ideal_col': 'y2'}, {'train_col': 'y1', 'ideal_col': 'y1'}]
+    vectorized = TestAssigner(test, ideal, matches, train, tolerance_func=lambda d: 2 * d).assign()
+    rowwise = TestAssigner(test, ideal, matches, train, tolerance_func=lambda d: 2 * d, engine='rowwise').assign()
+    pdt.assert_frame_equal(vectorized, rowwise)
+    assert list(vectorized['x']) == [2.0, 0.0]
+    assert list(vectorized['ideal_func']) == ['y1', 'y1']
+    assert np.allclose(vectorized['delta_y'], [0.4, 0.3])
+
+def test_unknown_engine_rejected(sample_data):
+    train, ideal, test, matches = sample_data
+    with pytest.raises(ValueError):
+        TestAssigner(test, ideal, matches, train, engine='magic')
+
+def test_interpolation_matches_exact_mode_on_grid(sample_data):
+    train, ideal, test, matches = sample_data
+    exact = TestAssigner(test, ideal, matches, train).assign()
+    interpolated = TestAssigner(test, ideal, matches, train, interpolate=True).assign()
+    pdt.assert_frame_equal(interpolated, exact)
+
+def test_interpolation_assigns_off_grid_points():
+    train = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [0.0, 1.0, 3.0]})
+    ideal = pd.DataFrame({'x': [0.0, 1.0, 2.0], 'y1': [0.0, 2.0, 2.0]})
+    # x=0.5: candidate 1.0, training 0.5 -> tolerance 2 * 0.5; x=2.5 is outside the grid.
+    test = pd.DataFrame({'x': [0.5, 1.5, 2.5, 1.0 + 1e-12], 'y': [1.9, 2.0, 2.0, 2.0]})
+    matches = [{'train_col': 'y1', 'ideal_col': 'y1'}]
+    exact = TestAssigner(test, ideal, matches, train, tolerance_func=lambda d: 2 * d).assign()
+    interpolated = TestAssigner(test, ideal, matches, train, tolerance_func=lambda d: 2 * d,
+                                interpolate=True).assign()
+    assert exact.empty
+    assert list(interpolated['x']) == [0.5, 1.5, 1.0 + 1e-12]
+    assert np.allclose(interpolated['delta_y'], [0.9, 0.0, 0.0])
+
+def test_parallel_interpolation_matches_serial(sample_data):
+    from src.parallel_assigner import ParallelAssigner
+    train, ideal, test, matches = sample_data
+    jittered = test.assign(x=test['x'] + 0.013)
+    assigner = TestAssigner(jittered, ideal, matches, train, interpolate=True)
+    serial = assigner.assign()
+    assert len(serial) > 0
+    pdt.assert_frame_equal(ParallelAssigner(assigner, workers=2, shard_size=25).assign(), serial)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas.testing as pdt
+import pytest
+from src.function_matcher import FunctionMatcher
+from src.test_assigner import TestAssigner
+from src.tolerance import ToleranceTable, load_or_build_tolerance_table, tolerance_func_key
+
+def double_tolerance(max_dev):
+    return 2 * max_dev
+
+def test_pointwise_table_reproduces_default_assignment(sample_data):
+    train, ideal, test, matches = sample_data
+    table = ToleranceTable.build(train, ideal, matches)
+    expected = TestAssigner(test, ideal, matches, train).assign()
+    pdt.assert_frame_equal(TestAssigner(test, ideal, matches, train, tolerance_table=table).assign(), expected)
+
+def test_global_table_uses_max_deviation(sample_data):
+    train, ideal, test, matches = sample_data
+    table = ToleranceTable.build(train, ideal, matches, mode='global')
+    max_dev = [np.abs(train[m['train_col']] - ideal[m['ideal_col']]).max() for m in matches]
+    assert np.allclose(table.tolerance, np.sqrt(2) * np.array(max_dev))
+    matched = TestAssigner(test, ideal, matches, train, tolerance_table=table).assign()
+    # A global tolerance is never smaller than the pointwise one, so no match is lost.
+    assert len(matched) >= len(TestAssigner(test, ideal, matches, train).assign())
+    assert (matched['delta_y'] <= table.tolerance.max()).all()
+
+def test_pointwise_table_does_not_change_interpolated_assignment(sample_data):
+    from src.parallel_assigner import ParallelAssigner
+    train, ideal, test, matches = sample_data
+    shifted = test.assign(x=test['x'] + 0.05)
+    table = ToleranceTable.build(train, ideal, matches)
+    expected = TestAssigner(shifted, ideal, matches, train, interpolate=True).assign()
+    assigner = TestAssigner(shifted, ideal, matches, train, interpolate=True, tolerance_table=table)
+    assert len(expected) > 0
+    pdt.assert_frame_equal(assigner.assign(), expected)
+    pdt.assert_frame_equal(ParallelAssigner(assigner, workers=2, shard_size=25).assign(), expected)
+
+def test_save_and_reuse(tmp_path, sample_data):
+    train, ideal, test, matches = sample_data
+    path = tmp_path / "tolerance.npz"
+    built = load_or_build_tolerance_table(str(path), train, ideal, matches, mode='global')
+    loaded = ToleranceTable.load(str(path))
+    assert loaded.mode == 'global'
+    assert loaded.matches(matches)
+    assert [m['min_sse'] for m in loaded.best_matches] == pytest.approx([m['min_sse'] for m in matches])
+    np.testing.assert_array_equal(loaded.tolerance, built.tolerance)
+    # Different matches invalidate the saved table.
+    other = [dict(matches[0], ideal_col='y1')] + matches[1:]
+    rebuilt = load_or_build_tolerance_table(str(path), train, ideal, other, mode='global')
+    assert rebuilt.matches(other)
+    assert ToleranceTable.load(str(path)).matches(other)
+
+def test_table_for_other_matches_rejected(sample_data):
+    train, ideal, test, matches = sample_data
+    table = ToleranceTable.build(train, ideal, matches[:2])
+    with pytest.raises(ValueError):
+        TestAssigner(test, ideal, matches, train, tolerance_table=table).assign()
+
+def test_saved_table_rebuilt_when_data_changes(tmp_path, sample_data):
+    train, ideal, test, matches = sample_data
+    path = str(tmp_path / "tolerance.npz")
+    load_or_build_tolerance_table(path, train, ideal, matches, mode='global')
+    # Shifting the training data keeps the same best matches but changes every deviation.
+    shifted = train.assign(**{col: train[col] + 0.3 for col in train.columns if col != 'x'})
+    shifted_matches = FunctionMatcher(shifted, ideal).best_ideal_matches()
+    assert [m['ideal_col'] for m in shifted_matches] == [m['ideal_col'] for m in matches]
+    reused = load_or_build_tolerance_table(path, shifted, ideal, shifted_matches, mode='global')
+    expected = ToleranceTable.build(shifted, ideal, shifted_matches, mode='global')
+    np.testing.assert_allclose(reused.tolerance, expected.tolerance)
+    assert ToleranceTable.load(path).fingerprints == expected.fingerprints
+
+def test_saved_table_rebuilt_for_other_tolerance_function(tmp_path, sample_data):
+    train, ideal, test, matches = sample_data
+    path = str(tmp_path / "tolerance.npz")
+    load_or_build_tolerance_table(path, train, ideal, matches, mode='global')
+    doubled = load_or_build_tolerance_table(path, train, ideal, matches, tolerance_func=double_tolerance,
+                                            mode='global')
+    expected = ToleranceTable.build(train, ideal, matches, tolerance_func=double_tolerance, mode='global')
+    np.testing.assert_allclose(doubled.tolerance, expected.tolerance)
+    assert ToleranceTable.load(path).reusable_for(double_tolerance)
+    # Lambdas have no stable key, so their tables are never reused.
+    assert tolerance_func_key(lambda d: 3 * d) is None
+    tripled = load_or_build_tolerance_table(path, train, ideal, matches, tolerance_func=lambda d: 3 * d,
+                                            mode='global')
+    assert not tripled.reusable_for(lambda d: 3 * d)
+    np.testing.assert_allclose(tripled.tolerance, 1.5 * expected.tolerance)